@@ -1,19 +1,25 @@
+import functools
 import os
-import shutil
-import tarfile
-import urllib.request
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Union
-import boto3
 import botocore.exceptions
 from benchmark import DATASETS_DIR
+from benchmark.download import (
+    DownloadScheduler,
+    RateLimiter,
+    download_s3,
+    download_url,
+    extract_s3,
+    extract_url,
+)
 from dataset_reader.ann_compound_reader import AnnCompoundReader
 from dataset_reader.ann_h5_reader import AnnH5Reader
 from dataset_reader.ann_h5_multi_reader import AnnH5MultiReader
 from dataset_reader.base_reader import BaseReader
 from dataset_reader.json_reader import JSONReader
-from tqdm import tqdm
+from dataset_reader.synthetic import SyntheticConfig, SyntheticGenerator
 from pathlib import Path
+from tqdm import tqdm
 
 
 @dataclass
@@ -27,8 +33,15 @@ class DatasetConfig:
     ]  # Now path is expected to handle multi-file structure for h5-multi
     link: Optional[Dict[str, List[Dict[str, str]]]] = None
     schema: Optional[Dict[str, str]] = field(default_factory=dict)
+    # `<algorithm>:<hex digest>` of the downloaded file, e.g. sha256:9f86d0...
+    checksum: Optional[str] = None
+    # Parameters of a synthetic dataset, generated locally instead of downloaded
+    synthetic: Optional[dict] = None
 
 
+# Multi-file datasets: return from download once the first data part is ready
+DOWNLOAD_IN_BACKGROUND = bool(int(os.getenv("DOWNLOAD_IN_BACKGROUND", 1)))
+
 READER_TYPE = {
     "h5": AnnH5Reader,
     "h5-multi": AnnH5MultiReader,
@@ -37,23 +50,6 @@ READER_TYPE = {
 }
 
 
-# Progress bar for urllib downloads
-def show_progress(block_num, block_size, total_size):
-    percent = round(block_num * block_size / total_size * 100, 2)
-    print(f"{percent} %", end="\r")
-
-
-# Progress handler for S3 downloads
-class S3Progress(tqdm):
-    def __init__(self, total_size):
-        super().__init__(
-            total=total_size, unit="B", unit_scale=True, desc="Downloading from S3"
-        )
-
-    def __call__(self, bytes_amount):
-        self.update(bytes_amount)
-
-
 class Dataset:
     def __init__(
         self,
@@ -68,40 +64,55 @@ class Dataset:
         self.skip_search = skip_search
         self.upload_start_idx = upload_start_idx
         self.upload_end_idx = upload_end_idx
-
-    def download(self):
+        self.downloads = None
+
+    def download(self, background: bool = DOWNLOAD_IN_BACKGROUND):
+        """
+        For multi-file datasets, the files are downloaded concurrently. The
+        query files and the first data part are downloaded first, and if
+        `background` is set, the method returns once they are ready, while the
+        remaining parts are still downloading. The reader waits for every part
+        before reading it.
+        """
         if isinstance(self.config.path, dict):  # Handle multi-file datasets
+            self.downloads = DownloadScheduler()
             if self.skip_search is False:
                 # Download query files
                 for query in self.config.path.get("queries", []):
-                    self._download_file(query["path"], query["link"])
+                    self._schedule_download(query, priority=0)
             else:
                 print(
                     f"skipping to download query file given skip_search={self.skip_search}"
                 )
             if self.skip_upload is False:
                 # Download data files
+                priority = 1
                 for data in self.config.path.get("data", []):
                     start_idx = data["start_idx"]
                     end_idx = data["end_idx"]
                     data_path = data["path"]
-                    data_link = data["link"]
+                    data_link = data.get("link", "the local file")
                     if self.upload_start_idx >= end_idx:
                         print(
                             f"skipping downloading {data_path} from {data_link} given {self.upload_start_idx}>{end_idx}"
                         )
                         continue
-                    if self.upload_end_idx < start_idx:
+                    if 0 <= self.upload_end_idx <= start_idx:
                         print(
-                            f"skipping downloading {data_path} from {data_link} given {self.upload_end_idx}<{start_idx}"
+                            f"skipping downloading {data_path} from {data_link} given {self.upload_end_idx}<={start_idx}"
                         )
                         continue
-                    self._download_file(data["path"], data["link"])
+                    self._schedule_download(data, priority)
+                    # Upload may start once the first part is downloaded
+                    priority = 2
             else:
                 print(
                     f"skipping to download data/upload files given skip_upload={self.skip_upload}"
                 )
 
+            self.downloads.start()
+            self.downloads.wait(max_priority=1 if background else None)
+
         else:  # Handle single-file datasets
             target_path = DATASETS_DIR / self.config.path
 
@@ -109,61 +120,91 @@ class Dataset:
                 print(f"{target_path} already exists")
                 return
 
-            if self.config.link:
-                downloaded_withboto = False
-                if is_s3_link(self.config.link):
-                    print("Use boto3 to download from S3. Faster!")
-                    try:
-                        self._download_from_s3(self.config.link, target_path)
-                        downloaded_withboto = True
-                    except botocore.exceptions.NoCredentialsError:
-                        print("Credentials not found, downloading without boto3")
-                if not downloaded_withboto:
-                    print(f"Downloading from URL {self.config.link}...")
-                    tmp_path, _ = urllib.request.urlretrieve(
-                        self.config.link, None, show_progress
-                    )
-                    self._extract_or_move_file(tmp_path, target_path)
+            if self.config.synthetic is not None:
+                print(f"Generating synthetic dataset {self.config.name}")
+                SyntheticGenerator(
+                    SyntheticConfig(**self.config.synthetic),
+                    self.config.vector_size,
+                    self.config.distance,
+                ).generate(target_path)
+            elif self.config.link:
+                self._download_file(
+                    self.config.path, self.config.link, self.config.checksum
+                )
+
+    def _schedule_download(self, file: Dict[str, str], priority: int):
+        if "link" not in file:
+            # Parts split locally, e.g. a manifest written without a link prefix
+            target_path = DATASETS_DIR / file["path"]
+            if not target_path.exists():
+                raise FileNotFoundError(
+                    f"{target_path} does not exist and has no link to download it from"
+                )
+            return
+        self.downloads.add(
+            DATASETS_DIR / file["path"],
+            functools.partial(
+                self._download_file, file["path"], file["link"], file.get("checksum")
+            ),
+            priority,
+        )
+
+    def wait_for_file(self, path: Path):
+        if self.downloads is not None:
+            self.downloads.wait_for(path)
+
+    def wait_for_downloads(self):
+        if self.downloads is not None:
+            self.downloads.wait()
 
-    def _download_file(self, relative_path: str, url: str):
+    def _download_file(
+        self,
+        relative_path: str,
+        url: str,
+        checksum: str = None,
+        progress: Optional[tqdm] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
         target_path = DATASETS_DIR / relative_path
         if target_path.exists():
             print(f"{target_path} already exists")
             return
 
-        print(f"Downloading from {url} to {target_path}")
-        tmp_path, _ = urllib.request.urlretrieve(url, None, show_progress)
-        self._extract_or_move_file(tmp_path, target_path)
-
-    def _extract_or_move_file(self, tmp_path, target_path):
-        if tmp_path.endswith(".tgz") or tmp_path.endswith(".tar.gz"):
-            print(f"Extracting: {tmp_path} -> {target_path}")
-            (DATASETS_DIR / self.config.path).mkdir(exist_ok=True, parents=True)
-            with tarfile.open(tmp_path) as file:
-                file.extractall(target_path)
-            os.remove(tmp_path)
-        else:
-            print(f"Moving: {tmp_path} -> {target_path}")
-            Path(target_path).parent.mkdir(exist_ok=True)
-            shutil.copy2(tmp_path, target_path)
-            os.remove(tmp_path)
+        downloaded_withboto = False
+        if is_s3_link(url):
+            print("Use boto3 to download from S3. Faster!")
+            try:
+                self._download_from_s3(url, target_path, checksum, progress, limiter)
+                downloaded_withboto = True
+            except botocore.exceptions.NoCredentialsError:
+                print("Credentials not found, downloading without boto3")
+        if not downloaded_withboto:
+            if is_archive(url):
+                # Archives are extracted while downloading, without storing them
+                extract_url(url, target_path, checksum, progress, limiter)
+            else:
+                download_url(
+                    url, target_path, checksum, progress=progress, limiter=limiter
+                )
 
-    def _download_from_s3(self, link, target_path):
-        s3 = boto3.client("s3")
+    def _download_from_s3(
+        self, link, target_path, checksum: str = None, progress=None, limiter=None
+    ):
         bucket_name, s3_key = parse_s3_url(link)
-        tmp_path = f"/tmp/{os.path.basename(s3_key)}"
-
         print(
             f"Downloading from S3: {link}... bucket_name={bucket_name}, s3_key={s3_key}"
         )
-        object_info = s3.head_object(Bucket=bucket_name, Key=s3_key)
-        total_size = object_info["ContentLength"]
-
-        with open(tmp_path, "wb") as f:
-            progress = S3Progress(total_size)
-            s3.download_fileobj(bucket_name, s3_key, f, Callback=progress)
-
-        self._extract_or_move_file(tmp_path, target_path)
+        if is_archive(link):
+            extract_s3(bucket_name, s3_key, target_path, checksum, progress, limiter)
+        else:
+            download_s3(
+                bucket_name,
+                s3_key,
+                target_path,
+                checksum,
+                progress=progress,
+                limiter=limiter,
+            )
 
     def get_reader(self, normalize: bool) -> BaseReader:
         reader_class = READER_TYPE[self.config.type]
@@ -180,12 +221,17 @@ class Dataset:
                 normalize=normalize,
                 skip_upload=self.skip_upload,
                 skip_search=self.skip_search,
+                wait_for_file=self.wait_for_file,
             )
         else:
             # For single-file datasets
             return reader_class(DATASETS_DIR / self.config.path, normalize=normalize)
 
 
+def is_archive(link):
+    return link.endswith(".tgz") or link.endswith(".tar.gz")
+
+
 def is_s3_link(link):
     return link.startswith("s3://") or "s3.amazonaws.com" in link
 
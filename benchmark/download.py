@@ -0,0 +1,530 @@
+import contextlib
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from tqdm import tqdm
+
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", 8))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 64 * 1024 * 1024))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", 3))
+# Seconds to wait for the connection and for each read of the HTTP downloads
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", 60))
+# Number of files of a multi-file dataset downloaded at the same time
+DOWNLOAD_PARALLEL_FILES = int(os.getenv("DOWNLOAD_PARALLEL_FILES", 4))
+# Total bandwidth of all the downloads, in bytes per second, 0 means unlimited
+DOWNLOAD_RATE_LIMIT = int(os.getenv("DOWNLOAD_RATE_LIMIT", 0))
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all the download threads, which allows bursts of
+    up to one second worth of data.
+    """
+
+    def __init__(self, bytes_per_second: int):
+        self.rate = bytes_per_second
+        self._available = float(bytes_per_second)
+        self._last = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        with self._lock:
+            now = time.perf_counter()
+            self._available = min(
+                self._available + (now - self._last) * self.rate, self.rate
+            )
+            self._last = now
+            self._available -= amount
+            delay = -self._available / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+@contextlib.contextmanager
+def _progress(
+    progress: Optional[tqdm], size: Optional[int], initial: int = 0
+) -> Iterator[tqdm]:
+    """
+    Progress bar of a single file, or the shared bar of all the files
+    downloaded at the same time.
+    """
+    if progress is None:
+        with tqdm(total=size, initial=initial, unit="B", unit_scale=True) as own:
+            yield own
+        return
+    with progress.get_lock():
+        progress.total = (progress.total or 0) + (size or 0)
+    progress.update(initial)
+    yield progress
+
+
+def partial_path(target_path: Path) -> Path:
+    return target_path.with_name(target_path.name + ".partial")
+
+
+def state_path(target_path: Path) -> Path:
+    return target_path.with_name(target_path.name + ".partial.json")
+
+
+def _probe(url: str) -> Tuple[Optional[int], bool, Optional[str]]:
+    """
+    Returns the size of the file, whether the server accepts Range requests
+    and the ETag of the file. Servers which reject HEAD, e.g. presigned URLs
+    signed for GET only, are probed with a GET closed after the headers.
+    """
+    try:
+        response = urllib.request.urlopen(
+            urllib.request.Request(url, method="HEAD"), timeout=DOWNLOAD_TIMEOUT
+        )
+    except urllib.error.HTTPError as e:
+        print(f"HEAD request to {url} failed with {e.code}, probing with GET")
+        response = urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT)
+    with response:
+        size = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "") == "bytes"
+        return (
+            int(size) if size is not None else None,
+            accepts_ranges,
+            response.headers.get("ETag"),
+        )
+
+
+def verify_file(path: Path, size: Optional[int] = None, checksum: str = None):
+    """
+    Checks the size of the file and its checksum, given as
+    `<algorithm>:<hex digest>`, e.g. `sha256:9f86d0...`.
+    """
+    if size is not None and path.stat().st_size != size:
+        raise DownloadError(
+            f"Size of {path} is {path.stat().st_size} bytes, expected {size}"
+        )
+    if checksum is None:
+        return
+    algorithm, expected = checksum.split(":", 1)
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as fd:
+        for block in iter(lambda: fd.read(READ_BUFFER_SIZE), b""):
+            digest.update(block)
+    if digest.hexdigest() != expected.lower():
+        raise DownloadError(f"Checksum of {path} does not match {checksum}")
+
+
+class RangeDownload:
+    """
+    Downloads a file with concurrent Range requests, writing every chunk at its
+    offset of a preallocated `.partial` file. Finished chunks are stored in a
+    state file next to it, so an interrupted download only fetches the missing
+    chunks.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        target_path: Path,
+        size: int,
+        etag: Optional[str],
+        connections: int,
+        chunk_size: int,
+        progress: Optional[tqdm] = None,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.url = url
+        self.target_path = target_path
+        self.size = size
+        self.etag = etag
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.chunks: List[Tuple[int, int]] = [
+            (start, min(start + chunk_size, size) - 1)
+            for start in range(0, size, chunk_size)
+        ]
+        self.done = set()
+        self.progress = progress
+        self.limiter = limiter
+        self._lock = threading.Lock()
+
+    def _state(self) -> dict:
+        return {
+            "url": self.url,
+            "size": self.size,
+            "etag": self.etag,
+            "chunk_size": self.chunk_size,
+        }
+
+    def _load_state(self):
+        path = state_path(self.target_path)
+        if not path.exists() or not partial_path(self.target_path).exists():
+            return
+        with open(path) as fd:
+            state = json.load(fd)
+        if {key: state.get(key) for key in self._state()} == self._state():
+            self.done = set(state["done"])
+            print(f"Resuming {self.target_path}, {len(self.done)} chunks done")
+
+    def _save_state(self):
+        path = state_path(self.target_path)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as fd:
+            json.dump({**self._state(), "done": sorted(self.done)}, fd)
+        os.replace(tmp_path, path)
+
+    def _download_chunk(self, index: int, fd: int, progress: tqdm):
+        start, end = self.chunks[index]
+        for attempt in range(DOWNLOAD_RETRIES):
+            offset = start
+            try:
+                request = urllib.request.Request(
+                    self.url, headers={"Range": f"bytes={start}-{end}"}
+                )
+                with urllib.request.urlopen(
+                    request, timeout=DOWNLOAD_TIMEOUT
+                ) as response:
+                    if response.status != 206:
+                        raise DownloadError(
+                            f"Range request to {self.url} returned {response.status}"
+                        )
+                    for block in iter(lambda: response.read(READ_BUFFER_SIZE), b""):
+                        if self.limiter is not None:
+                            self.limiter.consume(len(block))
+                        os.pwrite(fd, block, offset)
+                        offset += len(block)
+                        progress.update(len(block))
+                if offset != end + 1:
+                    raise DownloadError(f"Chunk {start}-{end} of {self.url} truncated")
+                break
+            # URLError, connection errors and timeouts are OSErrors, a
+            # connection closed in the middle of the body is an IncompleteRead
+            except (OSError, http.client.IncompleteRead, DownloadError) as e:
+                progress.update(start - offset)
+                if attempt + 1 == DOWNLOAD_RETRIES:
+                    raise e
+                print(f"Chunk {start}-{end} failed, retrying: {e}")
+        with self._lock:
+            self.done.add(index)
+            self._save_state()
+
+    def run(self):
+        self._load_state()
+        path = partial_path(self.target_path)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+        try:
+            os.truncate(fd, self.size)
+            done_bytes = sum(
+                end - start + 1
+                for index, (start, end) in enumerate(self.chunks)
+                if index in self.done
+            )
+            missing = [i for i in range(len(self.chunks)) if i not in self.done]
+            with _progress(
+                self.progress, self.size, done_bytes
+            ) as progress, ThreadPoolExecutor(self.connections) as executor:
+                futures = [
+                    executor.submit(self._download_chunk, index, fd, progress)
+                    for index in missing
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            os.close(fd)
+
+
+def _download_stream(
+    url: str,
+    target_path: Path,
+    progress: Optional[tqdm] = None,
+    limiter: Optional[RateLimiter] = None,
+):
+    """
+    Single connection download, continued from the end of the `.partial` file
+    if the server accepts Range requests.
+    """
+    path = partial_path(target_path)
+    offset = path.stat().st_size if path.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
+    try:
+        response = urllib.request.urlopen(
+            urllib.request.Request(url, headers=headers), timeout=DOWNLOAD_TIMEOUT
+        )
+    except urllib.error.HTTPError as e:
+        if e.code == 416:
+            # The partial file is already complete
+            return
+        raise
+    with response as r:
+        if offset > 0 and r.status != 206:
+            offset = 0
+        total = r.headers.get("Content-Length")
+        with open(path, "r+b" if offset > 0 else "wb") as fd, _progress(
+            progress, int(total) + offset if total is not None else None, offset
+        ) as progress:
+            fd.seek(offset)
+            for block in iter(lambda: r.read(READ_BUFFER_SIZE), b""):
+                if limiter is not None:
+                    limiter.consume(len(block))
+                fd.write(block)
+                progress.update(len(block))
+
+
+def download_url(
+    url: str,
+    target_path: Path,
+    checksum: Optional[str] = None,
+    connections: int = DOWNLOAD_CONNECTIONS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress: Optional[tqdm] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> Path:
+    """
+    Downloads the url to the target path. Data is written to `.partial` next
+    to the target, which is renamed once the size and the checksum are verified.
+    """
+    target_path = Path(target_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    size, accepts_ranges, etag = _probe(url)
+    print(f"Downloading from {url} to {target_path}")
+    if accepts_ranges and size is not None and size > 0 and connections > 1:
+        RangeDownload(
+            url, target_path, size, etag, connections, chunk_size, progress, limiter
+        ).run()
+    else:
+        _download_stream(url, target_path, progress, limiter)
+
+    path = partial_path(target_path)
+    try:
+        verify_file(path, size, checksum)
+    except DownloadError:
+        # A corrupted file can't be resumed
+        path.unlink()
+        state_path(target_path).unlink(missing_ok=True)
+        raise
+    os.replace(path, target_path)
+    state_path(target_path).unlink(missing_ok=True)
+    return target_path
+
+
+def download_s3(
+    bucket_name: str,
+    s3_key: str,
+    target_path: Path,
+    checksum: Optional[str] = None,
+    connections: int = DOWNLOAD_CONNECTIONS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    progress: Optional[tqdm] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> Path:
+    """
+    Multipart download with boto3, written directly to the target directory.
+    The rate limiter is shared with the other files, so it throttles the
+    transfer threads from the progress callback, instead of the per-transfer
+    `max_bandwidth` of boto3.
+    """
+    target_path = Path(target_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    s3 = boto3.client("s3")
+    size = s3.head_object(Bucket=bucket_name, Key=s3_key)["ContentLength"]
+    config = TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=connections,
+    )
+    path = partial_path(target_path)
+    with _progress(progress, size) as p:
+
+        def callback(amount: int):
+            # Called by the transfer threads after every read, negative amounts
+            # roll back the progress of a retried part
+            if limiter is not None and amount > 0:
+                limiter.consume(amount)
+            p.update(amount)
+
+        s3.download_file(
+            bucket_name, s3_key, str(path), Config=config, Callback=callback
+        )
+    verify_file(path, size, checksum)
+    os.replace(path, target_path)
+    return target_path
+
+
+class _StreamReader:
+    """
+    File-like wrapper of the response, which updates the progress and the
+    checksum of the archive while it is being read by tarfile.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        progress: tqdm,
+        limiter: Optional[RateLimiter],
+        checksum: Optional[str],
+    ):
+        self.stream = stream
+        self.progress = progress
+        self.limiter = limiter
+        self.checksum = checksum
+        self.digest = hashlib.new(checksum.split(":", 1)[0]) if checksum else None
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        block = self.stream.read(size)
+        if self.limiter is not None:
+            self.limiter.consume(len(block))
+        self.size += len(block)
+        self.progress.update(len(block))
+        if self.digest is not None:
+            self.digest.update(block)
+        return block
+
+    def verify(self, expected_size: Optional[int]):
+        # Reads the rest of the stream, e.g. the padding after the last member
+        while self.read(READ_BUFFER_SIZE):
+            pass
+        if expected_size is not None and self.size != expected_size:
+            raise DownloadError(f"Archive truncated at {self.size} bytes")
+        if self.digest is not None:
+            expected = self.checksum.split(":", 1)[1].lower()
+            if self.digest.hexdigest() != expected:
+                raise DownloadError(
+                    f"Checksum of the archive does not match {expected}"
+                )
+
+
+def _extract_stream(
+    stream: BinaryIO,
+    size: Optional[int],
+    target_path: Path,
+    checksum: Optional[str],
+    progress: Optional[tqdm],
+    limiter: Optional[RateLimiter],
+):
+    """
+    Extracts the compressed tar stream member by member, so the archive itself
+    is never stored. The members are extracted to `.partial` directory, which
+    is renamed once the whole archive is verified.
+    """
+    target_path = Path(target_path)
+    path = partial_path(target_path)
+    if path.exists():
+        # Streams can't be resumed
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    extract_kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+    try:
+        with _progress(progress, size) as progress:
+            reader = _StreamReader(stream, progress, limiter, checksum)
+            with tarfile.open(fileobj=reader, mode="r|*") as archive:
+                for member in archive:
+                    archive.extract(member, path, **extract_kwargs)
+            reader.verify(size)
+    except Exception:
+        shutil.rmtree(path)
+        raise
+    os.replace(path, target_path)
+
+
+def extract_url(
+    url: str,
+    target_path: Path,
+    checksum: Optional[str] = None,
+    progress: Optional[tqdm] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> Path:
+    print(f"Downloading and extracting {url} to {target_path}")
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        size = response.headers.get("Content-Length")
+        _extract_stream(
+            response,
+            int(size) if size is not None else None,
+            target_path,
+            checksum,
+            progress,
+            limiter,
+        )
+    return target_path
+
+
+def extract_s3(
+    bucket_name: str,
+    s3_key: str,
+    target_path: Path,
+    checksum: Optional[str] = None,
+    progress: Optional[tqdm] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> Path:
+    s3 = boto3.client("s3")
+    response = s3.get_object(Bucket=bucket_name, Key=s3_key)
+    _extract_stream(
+        response["Body"],
+        response["ContentLength"],
+        target_path,
+        checksum,
+        progress,
+        limiter,
+    )
+    return target_path
+
+
+class DownloadScheduler:
+    """
+    Downloads the files of a dataset with bounded concurrency, sharing a single
+    progress bar and bandwidth limit. Files are started in the order of their
+    priority, so the files needed first are available as soon as possible,
+    while the rest may be still downloading in the background.
+    """
+
+    def __init__(
+        self,
+        max_files: int = DOWNLOAD_PARALLEL_FILES,
+        rate_limit: int = DOWNLOAD_RATE_LIMIT,
+    ):
+        self.max_files = max_files
+        self.limiter = RateLimiter(rate_limit) if rate_limit > 0 else None
+        self.progress = None
+        self._jobs = []
+        self._futures: Dict[Path, Tuple[int, Future]] = {}
+
+    def add(self, path: Path, download: Callable, priority: int = 0):
+        """
+        Schedules the download, which is called with the shared progress bar
+        and rate limiter.
+        """
+        self._jobs.append((priority, Path(path), download))
+
+    def start(self):
+        self.progress = tqdm(total=0, unit="B", unit_scale=True, desc="Downloading")
+        executor = ThreadPoolExecutor(max(self.max_files, 1))
+        # Jobs are started in the order of submission
+        for priority, path, download in sorted(self._jobs, key=lambda job: job[0]):
+            future = executor.submit(download, self.progress, self.limiter)
+            self._futures[path] = (priority, future)
+        # Queued jobs still run, the executor is just released once they finish
+        executor.shutdown(wait=False)
+
+    def wait_for(self, path: Path):
+        if Path(path) in self._futures:
+            self._futures[Path(path)][1].result()
+
+    def wait(self, max_priority: Optional[int] = None):
+        for priority, future in self._futures.values():
+            if max_priority is None or priority <= max_priority:
+                future.result()
+        if max_priority is None and self.progress is not None:
+            self.progress.close()
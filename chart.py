@@ -22,6 +22,39 @@ y_metrics = {
     },
 }
 
+
+def plot_timeline(results_dir: str, dataset: str, output_file: str):
+    """
+    Plots the throughput over time of every upload and search result which
+    contains a timeline.
+    """
+    fig, ax = plt.subplots()
+    for filename in sorted(os.listdir(results_dir)):
+        if dataset not in filename:
+            continue
+        with open(os.path.join(results_dir, filename), "r") as fd:
+            try:
+                json_res = json.load(fd)
+            except json.decoder.JSONDecodeError:
+                continue
+        timeline = json_res.get("results", {}).get("timeline")
+        if not timeline:
+            continue
+        ax.plot(
+            [bucket["time"] for bucket in timeline],
+            [bucket["vectors_per_second"] for bucket in timeline],
+            label=filename.rsplit(".", 1)[0],
+        )
+
+    ax.legend(fontsize="x-small")
+    ax.grid(True)
+    plt.xlabel("Time since the start of the phase (seconds)")
+    plt.ylabel("Vectors per second")
+    plt.title(f"Throughput over time.\ndataset={dataset}")
+    print(f"writing output to {output_file}")
+    plt.savefig(output_file)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--dataset", default="glove-100-angular")
@@ -78,7 +111,19 @@ if __name__ == "__main__":
     parser.add_argument(
         "--clients", type=int, help="consider results from this client count", default=1
     )
+    parser.add_argument(
+        "--timeline",
+        action="store_true",
+        help="plot the throughput over time of the uploads and searches",
+    )
     args = parser.parse_args()
+    if args.timeline:
+        plot_timeline(
+            args.results,
+            args.dataset,
+            args.output if args.output is not None else "timeline.png",
+        )
+        exit(0)
     final_results_map = {}
     x_axis = []
     y_axis = []
@@ -101,6 +146,9 @@ if __name__ == "__main__":
                         f"skipping {filename} given here as an error while processing the file {error_str})"
                     )
                     continue
+                if "results" not in json_res:
+                    # repetition summaries are not plotted
+                    continue
                 parallel = 1
                 if "parallel" in json_res["params"]:
                     parallel = json_res["params"]["parallel"]
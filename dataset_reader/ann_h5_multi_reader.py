@@ -1,4 +1,5 @@
-from typing import Iterator, List
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
 import h5py
 import numpy as np
 import os
@@ -14,18 +15,22 @@ class AnnH5MultiReader(BaseReader):
         normalize: bool = False,
         skip_upload: bool = False,
         skip_search: bool = False,
+        wait_for_file: Optional[Callable] = None,
     ):
         """
         Args:
             data_dir (str): Directory containing the HDF5 data files.
             query_file (str): Path to the HDF5 query file.
             normalize (bool): Whether to normalize the vectors.
+            wait_for_file (Callable): Blocks until the file, which may be still
+                downloading, is ready.
         """
         self.data_files = data_files
         self.query_file = query_file
         self.normalize = normalize
         self.skip_upload = skip_upload
         self.skip_search = skip_search
+        self.wait_for_file = wait_for_file
 
         # # Load the list of data files (assumes they're named in a consistent format)
         # self.data_files = sorted(
@@ -36,8 +41,40 @@ class AnnH5MultiReader(BaseReader):
         #     ]
         # )
 
+    @staticmethod
+    @contextmanager
+    def _open_part(data_file: dict):
+        """
+        Vectors of a part, stored as HDF5 (default), NPY or raw vectors written
+        by the splitter.
+        """
+        file_format = data_file.get("format", "hdf5")
+        path = data_file["path"]
+        if file_format == "hdf5":
+            with h5py.File(path, "r") as data:
+                yield data["train"]
+        elif file_format == "npy":
+            yield np.load(path, mmap_mode="r")
+        elif file_format == "raw":
+            yield np.memmap(path, dtype=data_file["dtype"], mode="r").reshape(
+                -1, data_file["vector_size"]
+            )
+        else:
+            raise ValueError(f"Unknown data file format: <{file_format}>")
+
+    def _wait_for_file(self, path):
+        if self.wait_for_file is not None:
+            self.wait_for_file(path)
+
+    def __getstate__(self):
+        # The download threads stay in the parent process
+        state = self.__dict__.copy()
+        state["wait_for_file"] = None
+        return state
+
     def read_queries(self) -> Iterator[Query]:
         """Reads the queries from the query file."""
+        self._wait_for_file(self.query_file)
         with h5py.File(self.query_file, "r") as data:
             for vector, expected_result, expected_scores in zip(
                 data["test"], data["neighbors"], data["distances"]
@@ -81,8 +118,8 @@ class AnnH5MultiReader(BaseReader):
 
             # Only read the file if it overlaps with the requested range
             if file_start < end_idx and file_end > start_idx:
-                with h5py.File(path, "r") as data:
-                    train_vectors = data["train"]
+                self._wait_for_file(path)
+                with self._open_part(data_file) as train_vectors:
                     # Determine the slice to read from the current file
                     file_data_start = max(file_start, start_idx) - file_start
                     file_data_end = min(file_end, end_idx) - file_start
@@ -93,6 +130,9 @@ class AnnH5MultiReader(BaseReader):
                     ):
                         chunk_end = min(chunk_start + chunk_size, file_data_end)
                         vectors_chunk = train_vectors[chunk_start:chunk_end]
+                        if not vectors_chunk.flags.writeable:
+                            # Memory-mapped parts are opened read-only
+                            vectors_chunk = vectors_chunk.copy()
 
                         for vector in vectors_chunk:
                             if self.normalize:
@@ -1,14 +1,46 @@
 import os
+import json
 import h5py
 import numpy as np
+from multiprocessing import Pool
+from pathlib import Path
 from tqdm import tqdm
 import argparse
 
+from dataset_reader.verify import file_checksum
+
 CHUNK_SIZE = 20000  # Number of records to process at a time
+DEFAULT_NAME_TEMPLATE = "{name}-data-part{part}-{start}_to_{end}.{ext}"
+FORMAT_EXTENSIONS = {"hdf5": "hdf5", "npy": "npy", "raw": "bin"}
+
+
+def _create_output(path, output_format, shape, dtype):
+    """
+    Creates the output file and returns the array to write the vectors to,
+    together with the handle to close once the part is written.
+    """
+    if output_format == "hdf5":
+        output = h5py.File(path, "w")
+        return output.create_dataset("train", shape=shape, dtype=dtype), output
+    if output_format == "npy":
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        return array, None
+    if output_format == "raw":
+        array = np.memmap(path, mode="w+", dtype=dtype, shape=shape)
+        return array, None
+    raise ValueError(f"Unknown output format: <{output_format}>")
 
 
 def split_hdf5_file(
-    input_path, data_output_dir, start_idx, end_idx, part, normalize=False
+    input_path,
+    data_output_dir,
+    start_idx,
+    end_idx,
+    part,
+    normalize=False,
+    name_template=DEFAULT_NAME_TEMPLATE,
+    output_format="hdf5",
+    checksum=None,
 ):
     """
     Split a specified range of the 'train' dataset from the HDF5 file into a single file.
@@ -20,40 +52,141 @@ def split_hdf5_file(
         end_idx (int): End index of the dataset.
         part (int): Part number for the output file naming.
         normalize (bool): Whether to normalize the dataset or not.
+        name_template (str): Name of the output file, with {name}, {part},
+            {start}, {end} and {ext} placeholders.
+        output_format (str): One of hdf5, npy or raw (row-major vectors without
+            any header).
+        checksum (str): Hash algorithm of the output file checksum, e.g. sha256.
+
+    Returns:
+        dict: Manifest entry of the part.
     """
     with h5py.File(input_path, "r") as data_file:
         train_shape = data_file["train"].shape
+        dtype = data_file["train"].dtype
         print(f"Processing train data part {part}: elements {start_idx} to {end_idx}")
 
         # Define the output path for this part
         data_output_path = os.path.join(
             data_output_dir,
-            f"laion-img-emb-768d-1Billion-cosine-data-part{part}-{start_idx}_to_{end_idx}.hdf5",
+            name_template.format(
+                name=Path(input_path).stem,
+                part=part,
+                start=start_idx,
+                end=end_idx,
+                ext=FORMAT_EXTENSIONS[output_format],
+            ),
         )
 
-        with h5py.File(data_output_path, "w") as data_output:
-            train_dset = data_output.create_dataset(
-                "train",
-                shape=(end_idx - start_idx, train_shape[1]),
-                dtype=data_file["train"].dtype,
-            )
-
+        train_dset, output = _create_output(
+            data_output_path,
+            output_format,
+            (end_idx - start_idx, train_shape[1]),
+            dtype,
+        )
+        try:
             # Create a progress bar for the data splitting process
             with tqdm(
                 total=end_idx - start_idx,
                 unit="vectors",
                 desc=f"Processing train data part {part}",
+                position=part,
+                leave=False,
             ) as pbar:
                 for i in range(start_idx, end_idx, CHUNK_SIZE):
                     chunk_end = min(i + CHUNK_SIZE, end_idx)
-                    train_dset[i - start_idx : chunk_end - start_idx] = data_file[
-                        "train"
-                    ][i:chunk_end]
+                    chunk = data_file["train"][i:chunk_end]
+                    if normalize:
+                        chunk = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+                    train_dset[i - start_idx : chunk_end - start_idx] = chunk
                     pbar.update(chunk_end - i)
+        finally:
+            if output is not None:
+                output.close()
+            else:
+                train_dset.flush()
+                del train_dset
 
     print(
         f"Train data part {part} (elements {start_idx} to {end_idx}) saved to {data_output_path}"
     )
+    entry = {
+        "file_number": str(part),
+        "path": data_output_path,
+        "start_idx": start_idx,
+        "end_idx": end_idx,
+        "format": output_format,
+        "dtype": np.dtype(dtype).name,
+        "vector_size": train_shape[1],
+    }
+    if checksum is not None:
+        entry["checksum"] = file_checksum(data_output_path, checksum)
+    return entry
+
+
+def _split_part(kwargs):
+    return split_hdf5_file(**kwargs)
+
+
+def split_dataset(
+    input_path,
+    data_output_dir,
+    parts,
+    processes=None,
+    normalize=False,
+    name_template=DEFAULT_NAME_TEMPLATE,
+    output_format="hdf5",
+    checksum=None,
+    start_idx=0,
+    end_idx=None,
+):
+    """
+    Splits the [start_idx, end_idx) range of the 'train' dataset into parts of
+    equal size, written by a pool of processes at the same time.
+
+    Returns:
+        list: Manifest entries of all the parts, ordered by the start index.
+    """
+    if end_idx is None:
+        with h5py.File(input_path, "r") as data_file:
+            end_idx = data_file["train"].shape[0]
+    part_size = -(-(end_idx - start_idx) // parts)
+    tasks = [
+        dict(
+            input_path=input_path,
+            data_output_dir=data_output_dir,
+            start_idx=part_start,
+            end_idx=min(part_start + part_size, end_idx),
+            part=part,
+            normalize=normalize,
+            name_template=name_template,
+            output_format=output_format,
+            checksum=checksum,
+        )
+        for part, part_start in enumerate(range(start_idx, end_idx, part_size), 1)
+    ]
+    with Pool(processes=processes or min(len(tasks), os.cpu_count())) as pool:
+        entries = list(pool.imap_unordered(_split_part, tasks))
+    return sorted(entries, key=lambda entry: entry["start_idx"])
+
+
+def write_manifest(entries, manifest_path, path_prefix="", link_prefix=None):
+    """
+    Writes the manifest, whose `data` may be used as `path.data` of an h5-multi
+    entry in datasets.json. Paths are made relative to the datasets directory
+    with the given prefix, and links are built from the link prefix. Without
+    it, the parts must be already stored in the datasets directory.
+    """
+    data = []
+    for entry in entries:
+        file_name = os.path.basename(entry["path"])
+        data_entry = {**entry, "path": os.path.join(path_prefix, file_name)}
+        if link_prefix is not None:
+            data_entry["link"] = f"{link_prefix.rstrip('/')}/{file_name}"
+        data.append(data_entry)
+    with open(manifest_path, "w") as fd:
+        json.dump({"data": data}, fd, indent=2)
+    print(f"Manifest of {len(data)} parts saved to {manifest_path}")
 
 
 if __name__ == "__main__":
@@ -82,13 +215,72 @@ if __name__ == "__main__":
         "--end_idx", type=int, help="End index for the dataset range to process"
     )
     parser.add_argument("--part", type=int, help="Part number for the output file")
+    parser.add_argument(
+        "--parts",
+        type=int,
+        help="Split the range into that many parts, written concurrently",
+    )
+    parser.add_argument(
+        "--processes", type=int, help="Number of parts written at the same time"
+    )
+    parser.add_argument(
+        "--name_template",
+        type=str,
+        default=DEFAULT_NAME_TEMPLATE,
+        help="Name of the parts, with {name}, {part}, {start}, {end} and {ext}",
+    )
+    parser.add_argument(
+        "--format", type=str, default="hdf5", choices=list(FORMAT_EXTENSIONS)
+    )
+    parser.add_argument("--normalize", action="store_true")
+    parser.add_argument(
+        "--checksum", type=str, help="Hash algorithm of the part checksums, e.g. sha256"
+    )
+    parser.add_argument(
+        "--manifest", type=str, help="Path of the manifest of the written parts"
+    )
+    parser.add_argument(
+        "--path_prefix",
+        type=str,
+        default="",
+        help="Directory of the parts in the manifest, relative to datasets/",
+    )
+    parser.add_argument(
+        "--link_prefix", type=str, help="URL the parts will be downloaded from"
+    )
 
     args = parser.parse_args()
 
     # Ensure the output directory exists
     os.makedirs(args.data_output_dir, exist_ok=True)
 
-    # Split the dataset into the specified range
-    split_hdf5_file(
-        args.input_path, args.data_output_dir, args.start_idx, args.end_idx, args.part
-    )
+    if args.parts is not None:
+        entries = split_dataset(
+            args.input_path,
+            args.data_output_dir,
+            args.parts,
+            processes=args.processes,
+            normalize=args.normalize,
+            name_template=args.name_template,
+            output_format=args.format,
+            checksum=args.checksum,
+            start_idx=args.start_idx or 0,
+            end_idx=args.end_idx,
+        )
+    else:
+        # Split the dataset into the specified range
+        entries = [
+            split_hdf5_file(
+                args.input_path,
+                args.data_output_dir,
+                args.start_idx,
+                args.end_idx,
+                args.part,
+                normalize=args.normalize,
+                name_template=args.name_template,
+                output_format=args.format,
+                checksum=args.checksum,
+            )
+        ]
+    if args.manifest is not None:
+        write_manifest(entries, args.manifest, args.path_prefix, args.link_prefix)
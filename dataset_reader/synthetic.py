@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from dataset_reader.ann_compound_reader import AnnCompoundReader
+
+DISTRIBUTIONS = ["gaussian", "clustered", "normalized"]
+PAYLOAD_TYPES = ["keyword", "int", "float"]
+# Number of vectors generated, and compared with the queries, at a time
+BLOCK_SIZE = 20_000
+
+
+@dataclass
+class SyntheticConfig:
+    """
+    Parameters of a synthetic dataset. Stored under the `synthetic` key of the
+    dataset entry in datasets.json, so the dataset may be generated instead of
+    downloaded.
+    """
+
+    size: int
+    distribution: str = "gaussian"
+    dtype: str = "float32"
+    queries: int = 1000
+    top: int = 100
+    clusters: int = 100
+    # field name -> {"type": keyword/int/float, "cardinality": number of values}
+    payload: Dict[str, dict] = field(default_factory=dict)
+    # Keyword or int field, every query is filtered by a random value of
+    filter_field: Optional[str] = None
+    seed: int = 42
+
+
+class SyntheticGenerator:
+    """
+    Generates a dataset in the layout of AnnCompoundReader: vectors.npy,
+    written block by block through a memory map, payloads.jsonl and
+    tests.jsonl with the queries and their exact neighbours.
+    """
+
+    def __init__(self, config: SyntheticConfig, vector_size: int, distance: str):
+        if config.distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution: <{config.distribution}>")
+        for name, schema in config.payload.items():
+            if schema["type"] not in PAYLOAD_TYPES:
+                raise ValueError(f"Unknown type of payload field {name}")
+        if config.filter_field is not None:
+            if config.payload.get(config.filter_field, {}).get("type") == "float":
+                raise ValueError("Queries may be filtered by keyword or int only")
+        self.config = config
+        self.vector_size = vector_size
+        self.distance = distance
+        rng = np.random.default_rng(config.seed)
+        self.centers = rng.normal(size=(config.clusters, vector_size)) * 4
+
+    def _vectors(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        vectors = rng.normal(size=(count, self.vector_size))
+        if self.config.distribution == "clustered":
+            vectors += self.centers[rng.integers(len(self.centers), size=count)]
+        elif self.config.distribution == "normalized":
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.astype(self.config.dtype)
+
+    def _payload_values(self, rng: np.random.Generator, count: int) -> dict:
+        values = {}
+        for name, schema in self.config.payload.items():
+            cardinality = int(schema.get("cardinality", 100))
+            if schema["type"] == "float":
+                values[name] = rng.random(count)
+            else:
+                values[name] = rng.integers(cardinality, size=count)
+        return values
+
+    def _payload(self, name: str, value):
+        if self.config.payload[name]["type"] == "keyword":
+            return f"{name}-{value}"
+        if self.config.payload[name]["type"] == "int":
+            return int(value)
+        return float(value)
+
+    def _scores(self, queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """
+        Scores of all the vectors for all the queries, lower is closer.
+        """
+        vectors = vectors.astype(np.float32)
+        if self.distance == "l2":
+            return (
+                (queries**2).sum(axis=1, keepdims=True)
+                - 2 * queries @ vectors.T
+                + (vectors**2).sum(axis=1)
+            )
+        if self.distance == "cosine":
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return -(queries @ vectors.T)
+
+    def _merge(
+        self,
+        top: Tuple[np.ndarray, np.ndarray],
+        scores: np.ndarray,
+        offset: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.concatenate(
+            [
+                top[0],
+                np.broadcast_to(np.arange(scores.shape[1]) + offset, scores.shape),
+            ],
+            axis=1,
+        )
+        scores = np.concatenate([top[1], scores], axis=1)
+        k = min(self.config.top, scores.shape[1])
+        best = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        return (
+            np.take_along_axis(ids, best, axis=1),
+            np.take_along_axis(scores, best, axis=1),
+        )
+
+    def generate(self, target_path: Path):
+        """
+        Writes the dataset into a `.partial` directory, renamed to the target
+        once complete, so an interrupted run is never mistaken for a dataset.
+        """
+        config = self.config
+        target_path = Path(target_path)
+        path = target_path.parent / f"{target_path.name}.partial"
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True)
+        data_rng = np.random.default_rng(config.seed + 1)
+        query_rng = np.random.default_rng(config.seed + 2)
+
+        queries = self._vectors(query_rng, config.queries).astype(np.float32)
+        gt_queries = queries
+        if self.distance == "cosine":
+            gt_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        query_filters = None
+        if config.filter_field is not None:
+            query_filters = self._payload_values(query_rng, config.queries)[
+                config.filter_field
+            ]
+
+        top = (
+            np.zeros((config.queries, 0), dtype=np.int64),
+            np.zeros((config.queries, 0), dtype=np.float32),
+        )
+        vectors_file = np.lib.format.open_memmap(
+            path / AnnCompoundReader.VECTORS_FILE,
+            mode="w+",
+            dtype=config.dtype,
+            shape=(config.size, self.vector_size),
+        )
+        payloads_fp = None
+        if config.payload:
+            payloads_fp = open(path / AnnCompoundReader.PAYLOADS_FILE, "w")
+        try:
+            with tqdm(
+                total=config.size, unit="vectors", desc=str(target_path)
+            ) as progress:
+                for start in range(0, config.size, BLOCK_SIZE):
+                    count = min(BLOCK_SIZE, config.size - start)
+                    vectors = self._vectors(data_rng, count)
+                    vectors_file[start : start + count] = vectors
+                    values = self._payload_values(data_rng, count)
+                    if payloads_fp is not None:
+                        for i in range(count):
+                            payload = {
+                                name: self._payload(name, column[i])
+                                for name, column in values.items()
+                            }
+                            payloads_fp.write(json.dumps(payload) + "\n")
+
+                    scores = self._scores(gt_queries, vectors)
+                    if query_filters is not None:
+                        matches = query_filters[:, None] == values[config.filter_field]
+                        scores[~matches] = np.inf
+                    top = self._merge(top, scores, start)
+                    progress.update(count)
+        finally:
+            vectors_file.flush()
+            del vectors_file
+            if payloads_fp is not None:
+                payloads_fp.close()
+
+        order = np.argsort(top[1], axis=1)
+        ids = np.take_along_axis(top[0], order, axis=1)
+        scores = np.take_along_axis(top[1], order, axis=1)
+        with open(path / AnnCompoundReader.QUERIES_FILE, "w") as tests_fp:
+            for i, query in enumerate(queries):
+                found = np.isfinite(scores[i])
+                conditions = None
+                if query_filters is not None:
+                    value = self._payload(config.filter_field, query_filters[i])
+                    conditions = {
+                        "and": [{config.filter_field: {"match": {"value": value}}}]
+                    }
+                tests_fp.write(
+                    json.dumps(
+                        {
+                            "query": query.tolist(),
+                            "conditions": conditions,
+                            "closest_ids": ids[i][found].tolist(),
+                            # Similarity for cosine and dot, distance for l2
+                            "closest_scores": (
+                                np.sqrt(np.maximum(scores[i][found], 0))
+                                if self.distance == "l2"
+                                else -scores[i][found]
+                            ).tolist(),
+                        }
+                    )
+                    + "\n"
+                )
+        os.replace(path, target_path)
+
+
+def dataset_entry(
+    name: str, vector_size: int, distance: str, config: SyntheticConfig
+) -> dict:
+    return {
+        "name": name,
+        "vector_size": vector_size,
+        "distance": distance,
+        "type": "tar",
+        "path": name,
+        "schema": {
+            field_name: schema["type"] for field_name, schema in config.payload.items()
+        },
+        "synthetic": asdict(config),
+    }
+
+
+def register_dataset(entry: dict, datasets_path: Path):
+    """
+    Adds the entry to datasets.json. A new entry is appended to the end of the
+    file as is, an existing dataset of the same name is replaced.
+    """
+    with open(datasets_path, "r") as fd:
+        content = fd.read()
+    datasets = json.loads(content)
+    if any(dataset["name"] == entry["name"] for dataset in datasets):
+        datasets = [
+            entry if dataset["name"] == entry["name"] else dataset
+            for dataset in datasets
+        ]
+        content = json.dumps(datasets, indent=2) + "\n"
+    else:
+        entry_json = json.dumps(entry, indent=2).replace("\n", "\n  ")
+        content = content.rstrip()[:-1].rstrip() + f",\n  {entry_json}\n]\n"
+    with open(datasets_path, "w") as fd:
+        fd.write(content)
+
+
+def parse_payload(definitions: List[str]) -> Dict[str, dict]:
+    """
+    Parses `name:type[:cardinality]` definitions of the payload fields.
+    """
+    payload = {}
+    for definition in definitions:
+        name, field_type, *cardinality = definition.split(":")
+        payload[name] = {"type": field_type}
+        if cardinality:
+            payload[name]["cardinality"] = int(cardinality[0])
+    return payload
+
+
+if __name__ == "__main__":
+    from benchmark import DATASETS_DIR
+
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic dataset with exact ground truth."
+    )
+    parser.add_argument("--name", type=str, help="Name, synthetic-<...> by default")
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--dim", type=int, required=True)
+    parser.add_argument(
+        "--distance", type=str, default="cosine", choices=["cosine", "dot", "l2"]
+    )
+    parser.add_argument(
+        "--distribution", type=str, default="gaussian", choices=DISTRIBUTIONS
+    )
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--dtype", type=str, default="float32")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top", type=int, default=100)
+    parser.add_argument(
+        "--payload",
+        type=str,
+        action="append",
+        default=[],
+        help="Payload field as name:type[:cardinality], e.g. color:keyword:10",
+    )
+    parser.add_argument("--filter_field", type=str)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--register",
+        action="store_true",
+        help="Add the dataset to datasets/datasets.json",
+    )
+    args = parser.parse_args()
+
+    config = SyntheticConfig(
+        size=args.size,
+        distribution=args.distribution,
+        dtype=args.dtype,
+        queries=args.queries,
+        top=args.top,
+        clusters=args.clusters,
+        payload=parse_payload(args.payload),
+        filter_field=args.filter_field,
+        seed=args.seed,
+    )
+    name = (
+        args.name
+        or f"synthetic-{args.distribution}-{args.dim}-{args.size}-{args.distance}"
+    )
+    SyntheticGenerator(config, args.dim, args.distance).generate(DATASETS_DIR / name)
+    if args.register:
+        register_dataset(
+            dataset_entry(name, args.dim, args.distance, config),
+            DATASETS_DIR / "datasets.json",
+        )
+        print(f"Dataset {name} registered in datasets.json")
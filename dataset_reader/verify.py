@@ -1,53 +1,180 @@
 import os
+import json
+import hashlib
 import h5py
+import numpy as np
+from multiprocessing import Pool
+import argparse
 
 EXPECTED_VECTORS = 10_000_000  # Expected number of vectors per file
+READ_BUFFER_SIZE = 1024 * 1024
 
 
-def verify_hdf5_files(directory):
+def file_checksum(path, algorithm="sha256"):
     """
-    Verifies that each HDF5 file in the given directory contains 10 million vectors in the 'train' dataset.
+    Checksum of the file content, in the `<algorithm>:<hex digest>` format used
+    by the dataset downloads.
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as fd:
+        for block in iter(lambda: fd.read(READ_BUFFER_SIZE), b""):
+            digest.update(block)
+    return f"{algorithm}:{digest.hexdigest()}"
+
+
+def count_vectors(path, file_format="hdf5", dtype=None, vector_size=None):
+    if file_format == "hdf5":
+        with h5py.File(path, "r") as data_file:
+            if "train" not in data_file:
+                return None
+            return data_file["train"].shape[0]
+    if file_format == "npy":
+        return np.load(path, mmap_mode="r").shape[0]
+    if file_format == "raw":
+        row_size = np.dtype(dtype).itemsize * vector_size
+        return os.path.getsize(path) // row_size
+    raise ValueError(f"Unknown file format: <{file_format}>")
+
+
+def verify_file(entry):
+    """
+    Checks the number of vectors of a single part and, if requested, its
+    checksum.
+
+    Args:
+        entry (dict): Manifest entry with the `path` and optionally the
+            `format`, `start_idx`/`end_idx` or `expected_vectors` and
+            `checksum`. `checksum` may be an algorithm name only, in which
+            case the checksum is calculated but not compared.
+
+    Returns:
+        list: Errors found in the file.
+    """
+    path = entry["path"]
+    errors = []
+    num_vectors = count_vectors(
+        path,
+        entry.get("format", "hdf5"),
+        entry.get("dtype"),
+        entry.get("vector_size"),
+    )
+    print(f"Checking {path}: contains {num_vectors} vectors.")
+    if num_vectors is None:
+        errors.append(f"'train' dataset not found in {path}.")
+    expected = entry.get("expected_vectors")
+    if "start_idx" in entry and "end_idx" in entry:
+        expected = entry["end_idx"] - entry["start_idx"]
+    if num_vectors is not None and expected is not None and num_vectors != expected:
+        errors.append(f"{path} contains {num_vectors} vectors, expected {expected}.")
+
+    checksum = entry.get("checksum")
+    if checksum is not None:
+        algorithm = checksum.split(":", 1)[0]
+        actual = file_checksum(path, algorithm)
+        if ":" in checksum and actual != checksum:
+            errors.append(f"Checksum of {path} is {actual}, expected {checksum}.")
+        else:
+            print(f"Checksum of {path}: {actual}")
+    return errors
+
+
+def verify_files(entries, processes=None):
+    """
+    Verifies the files concurrently.
+
+    Returns:
+        bool: Whether all the files were verified successfully.
+    """
+    if not entries:
+        print("No files to verify.")
+        return False
+
+    with Pool(processes=processes or min(len(entries), os.cpu_count())) as pool:
+        errors = [
+            error for result in pool.map(verify_file, entries) for error in result
+        ]
+
+    for error in errors:
+        print(f"ERROR: {error}")
+    if errors:
+        print("Some files contain discrepancies. Please check the log above.")
+        return False
+    print(f"All {len(entries)} files verified successfully.")
+    return True
+
+
+def verify_hdf5_files(
+    directory, expected_vectors=EXPECTED_VECTORS, checksum=None, processes=None
+):
+    """
+    Verifies that each HDF5 file in the given directory contains the expected number of vectors in the 'train' dataset.
 
     Args:
         directory (str): Directory containing the HDF5 files to check.
+        expected_vectors (int): Expected number of vectors per file.
+        checksum (str): Hash algorithm to calculate the checksums with.
     """
     hdf_files = [f for f in os.listdir(directory) if f.endswith(".hdf5")]
+    return verify_files(
+        [
+            {
+                "path": os.path.join(directory, hdf_file),
+                "expected_vectors": expected_vectors,
+                "checksum": checksum,
+            }
+            for hdf_file in sorted(hdf_files)
+        ],
+        processes,
+    )
 
-    if not hdf_files:
-        print("No HDF5 files found in the directory.")
-        return
-
-    all_verified = True
-
-    for hdf_file in sorted(hdf_files):
-        file_path = os.path.join(directory, hdf_file)
-
-        with h5py.File(file_path, "r") as data_file:
-            if "train" in data_file:
-                train_shape = data_file["train"].shape
-                num_vectors = train_shape[0]
-                print(f"Checking {hdf_file}: contains {num_vectors} vectors.")
-
-                if num_vectors != EXPECTED_VECTORS:
-                    print(
-                        f"ERROR: {hdf_file} contains {num_vectors} vectors, expected {EXPECTED_VECTORS}."
-                    )
-                    all_verified = False
-            else:
-                print(f"ERROR: 'train' dataset not found in {hdf_file}.")
-                all_verified = False
-
-    if all_verified:
-        print(
-            "All HDF5 files verified successfully, each containing 10 million vectors."
-        )
-    else:
-        print("Some files contain discrepancies. Please check the log above.")
+
+def verify_manifest(manifest_path, data_dir=None, checksum=None, processes=None):
+    """
+    Verifies the parts listed in the manifest written by the splitter, or in
+    the `path` of an h5-multi entry of datasets.json.
+    """
+    with open(manifest_path, "r") as fd:
+        entries = json.load(fd)["data"]
+    data_dir = data_dir or os.path.dirname(manifest_path)
+    return verify_files(
+        [
+            {
+                **entry,
+                "path": os.path.join(data_dir, os.path.basename(entry["path"])),
+                "checksum": entry.get("checksum", checksum),
+            }
+            for entry in entries
+        ],
+        processes,
+    )
 
 
 if __name__ == "__main__":
-    # Define the path to the directory containing the HDF5 files
-    directory = "./data"  # Replace with your actual directory
+    parser = argparse.ArgumentParser(description="Verify the split dataset parts.")
+    parser.add_argument(
+        "--directory",
+        type=str,
+        help="Directory containing the parts, ./data or the manifest directory by default",
+    )
+    parser.add_argument(
+        "--manifest", type=str, help="Manifest of the parts written by the splitter"
+    )
+    parser.add_argument("--expected_vectors", type=int, default=EXPECTED_VECTORS)
+    parser.add_argument(
+        "--checksum", type=str, help="Hash algorithm to calculate checksums with"
+    )
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
 
-    # Verify the HDF5 files
-    verify_hdf5_files(directory)
+    if args.manifest is not None:
+        verified = verify_manifest(
+            args.manifest, args.directory, args.checksum, args.processes
+        )
+    else:
+        verified = verify_hdf5_files(
+            args.directory or "./data",
+            args.expected_vectors,
+            args.checksum,
+            args.processes,
+        )
+    exit(0 if verified else 1)
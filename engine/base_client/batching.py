@@ -0,0 +1,50 @@
+import time
+from typing import List
+
+
+class AdaptiveBatchSize:
+    """
+    Chooses the size of the upload batches with AIMD: the size grows by a
+    constant step while the batches are uploaded within the target latency
+    and without errors, and is cut by a factor otherwise. Batches which were
+    already created before a cut do not affect the size again, as they still
+    reflect the previous size.
+    """
+
+    def __init__(self, config: dict, initial_size: int):
+        self.min_size = int(config.get("min_batch_size", 8))
+        self.max_size = int(config.get("max_batch_size", 4096))
+        self.target_latency = float(config.get("target_latency", 1.0))
+        self.increase = int(config.get("increase", 32))
+        self.decrease = float(config.get("decrease", 0.5))
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.created = 0
+        self._first_current = 0
+        self._start = time.perf_counter()
+        self.history: List[dict] = [{"time": 0.0, "batch_size": self.size}]
+
+    def next_size(self) -> int:
+        self.created += 1
+        return self.size
+
+    def feedback(self, batch_number: int, latency: float, size: int, errors: int):
+        """
+        Adjusts the size after the batch_number-th created batch is uploaded.
+        """
+        if batch_number < self._first_current:
+            return
+        if errors > 0 or latency > self.target_latency:
+            new_size = max(int(self.size * self.decrease), self.min_size)
+        elif size >= self.size:
+            new_size = min(self.size + self.increase, self.max_size)
+        else:
+            # The last, incomplete batch
+            return
+        if new_size == self.size:
+            return
+        if new_size < self.size:
+            self._first_current = self.created
+        self.size = new_size
+        self.history.append(
+            {"time": time.perf_counter() - self._start, "batch_size": new_size}
+        )
@@ -0,0 +1,191 @@
+import json
+import multiprocessing as mp
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from engine.base_client.readiness import ReadinessWait, add_rates
+from engine.base_client.upload import (
+    UPLOAD_MAX_RETRIES,
+    UPLOAD_RETRY_BASE_DELAY,
+    UPLOAD_RETRY_MAX_DELAY,
+    BaseUploader,
+)
+
+
+class BulkRetriesExhausted(Exception):
+    """
+    Documents still rejected with a retryable status once the retries of the
+    bulk uploader are used up, the whole batch is sent again by the base
+    uploader.
+    """
+
+
+def parse_doc_id(doc_id: str) -> int:
+    """
+    Documents are indexed with integer ids, the indexes uploaded before used
+    the hex of the UUID made of the id.
+    """
+    if len(doc_id) == 32:
+        return int(doc_id, 16)
+    return int(doc_id)
+
+
+class BaseBulkUploader(BaseUploader):
+    """
+    Uploader of the Elasticsearch and OpenSearch clients, which share the bulk
+    API through different client libraries.
+    """
+
+    client = None
+    # Set by the engine uploaders
+    INDEX: str = None
+    BULK_HELPERS: Dict[str, Callable] = {}
+    BULK_INDEX_ERROR: type = Exception
+    # Passed to every bulk request, before the configured bulk params
+    BULK_REQUEST_PARAMS: dict = {}
+    # Statuses of the rejected documents which are sent again, e.g. when the
+    # queue of the write thread pool is full
+    RETRY_STATUSES = (429, 502, 503, 504)
+    RETRYABLE_EXCEPTIONS = (*BaseUploader.RETRYABLE_EXCEPTIONS, BulkRetriesExhausted)
+    upload_params = {}
+    bulk_helper: Callable = None
+    bulk_params = {}
+    bulk_max_retries = UPLOAD_MAX_RETRIES
+    document_stats: Dict[str, int] = {}
+
+    @classmethod
+    def get_mp_start_method(cls):
+        return "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+
+    @classmethod
+    def init_bulk(cls, upload_params):
+        cls.upload_params = upload_params
+        cls.bulk_params = dict(upload_params.get("bulk", {}))
+        cls.bulk_helper = cls.BULK_HELPERS[cls.bulk_params.pop("helper", "streaming")]
+        cls.bulk_max_retries = cls.bulk_params.pop("max_retries", UPLOAD_MAX_RETRIES)
+        cls.document_stats = {"document_errors": 0, "document_retries": 0}
+
+    @staticmethod
+    def _actions(
+        ids: List[int], vectors: List[list], metadata: List[Optional[dict]]
+    ) -> List[dict]:
+        """
+        Index actions with integer ids. The documents are serialized once, the
+        helpers pass the strings through to the NDJSON body, also on retries.
+        """
+        return [
+            {
+                "_id": idx,
+                "_source": json.dumps(
+                    {"vector": vector, **(payload or {})}, separators=(",", ":")
+                ),
+            }
+            for idx, vector, payload in zip(ids, vectors, metadata)
+        ]
+
+    @classmethod
+    def _bulk(cls, actions: List[dict]) -> List[Tuple[dict, dict]]:
+        """
+        Sends the actions with the configured helper, returns the rejected
+        ones with their items of the bulk response.
+        """
+        by_id = {action["_id"]: action for action in actions}
+        rejected = []
+        for ok, item in cls.bulk_helper(
+            cls.client,
+            actions,
+            index=cls.INDEX,
+            raise_on_error=False,
+            **{**cls.BULK_REQUEST_PARAMS, **cls.bulk_params},
+        ):
+            if not ok:
+                result = item["index"]
+                rejected.append((by_id[int(result["_id"])], result))
+        return rejected
+
+    @classmethod
+    def upload_batch(
+        cls, ids: List[int], vectors: List[list], metadata: Optional[List[dict]]
+    ):
+        if metadata is None:
+            metadata = [{}] * len(vectors)
+        actions = cls._actions(ids, vectors, metadata)
+        retries = 0
+        while True:
+            rejected = cls._bulk(actions)
+            if len(rejected) == 0:
+                return
+            cls.document_stats["document_errors"] += len(rejected)
+            actions = [
+                action
+                for action, result in rejected
+                if result.get("status") in cls.RETRY_STATUSES
+            ]
+            if len(actions) < len(rejected):
+                # Invalid documents, sending the batch again would not help
+                raise cls.BULK_INDEX_ERROR(
+                    f"{len(rejected)} document(s) failed to index",
+                    [result for _, result in rejected],
+                )
+            if retries >= cls.bulk_max_retries:
+                raise BulkRetriesExhausted(
+                    f"{len(rejected)} document(s) still rejected "
+                    f"after {retries} retries"
+                )
+            delay = min(
+                UPLOAD_RETRY_BASE_DELAY * 2**retries, UPLOAD_RETRY_MAX_DELAY
+            ) * random.uniform(0.5, 1.5)
+            retries += 1
+            cls.document_stats["document_retries"] += len(actions)
+            time.sleep(delay)
+
+    @classmethod
+    def pop_batch_stats(cls):
+        stats = cls.document_stats
+        cls.document_stats = {"document_errors": 0, "document_retries": 0}
+        return stats
+
+
+def merge_status(client, task_id, index, transport_errors: Tuple[type, ...]) -> dict:
+    try:
+        # Older versions merge synchronously, without a task
+        task = client.tasks.get(task_id=task_id) if task_id else {"completed": True}
+        stats = client.indices.stats(index=index, metric="segments,store,merge")
+    except transport_errors:
+        return {"completed": False}
+    if "error" in task:
+        raise RuntimeError(f"forcemerge of {index} failed: {task['error']}")
+    primaries = stats["_all"]["primaries"]
+    return {
+        "completed": task["completed"],
+        "segments": primaries["segments"]["count"],
+        "size_in_bytes": primaries["store"]["size_in_bytes"],
+        "merged_bytes": primaries["merges"]["total_size_in_bytes"],
+    }
+
+
+def wait_for_merge(
+    client, task_id, index, transport_errors: Tuple[type, ...] = (), name="forcemerge"
+) -> dict:
+    """
+    Waits for the forcemerge task, recording the segments, the size of the
+    index on disk and the merged bytes on every poll. The transport errors
+    are polled again, the node may be busy merging.
+    """
+    print(f"waiting for forcemerge task {task_id}...")
+    stats = ReadinessWait(
+        lambda: merge_status(client, task_id, index, transport_errors),
+        lambda sample: sample["completed"],
+        name=name,
+    ).wait()
+    timeline = stats["timeline"]
+    add_rates(timeline, "merged_bytes")
+    merged_bytes = [s["merged_bytes"] for s in timeline if "merged_bytes" in s]
+    stats["segments"] = timeline[-1]["segments"]
+    stats["size_in_bytes"] = timeline[-1]["size_in_bytes"]
+    stats["merged_bytes"] = merged_bytes[-1] - merged_bytes[0]
+    stats["merge_throughput"] = stats["merged_bytes"] / max(
+        stats["completion_time"], 1e-9
+    )
+    return stats
@@ -0,0 +1,70 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+UPLOAD_CHECKPOINT_INTERVAL = float(os.getenv("UPLOAD_CHECKPOINT_INTERVAL", 30.0))
+
+
+class UploadCheckpoint:
+    """
+    Persists the id of the last record, for which the record itself and all the
+    records before it were acknowledged by the engine. The upload may then be
+    resumed from the next record.
+    """
+
+    def __init__(self, path: Path, interval: float = UPLOAD_CHECKPOINT_INTERVAL):
+        self.path = Path(path)
+        self.interval = interval
+        self.last_id: Optional[int] = None
+        self.uploaded = 0
+        self.completed = False
+        self._last_save = time.perf_counter()
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        with open(self.path, "r") as fd:
+            state = json.load(fd)
+        self.last_id = state["last_id"]
+        self.uploaded = state["uploaded"]
+        self.completed = state["completed"]
+        return True
+
+    def reset(self):
+        """
+        Starts a fresh upload. The checkpoint of a previous run is overwritten
+        at once, otherwise a crash before the first save would resume from it.
+        """
+        self.last_id = None
+        self.uploaded = 0
+        self.completed = False
+        self.save()
+
+    def update(self, last_id: int, uploaded: int):
+        self.last_id = last_id
+        self.uploaded += uploaded
+        if time.perf_counter() - self._last_save >= self.interval:
+            self.save()
+
+    def complete(self):
+        self.completed = True
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Speculative runs of the same shard may share the checkpoint
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fd:
+            json.dump(
+                {
+                    "last_id": self.last_id,
+                    "uploaded": self.uploaded,
+                    "completed": self.completed,
+                },
+                fd,
+            )
+        # Replacing the file is atomic, so a crash never leaves a broken checkpoint
+        os.replace(tmp_path, self.path)
+        self._last_save = time.perf_counter()
@@ -7,15 +7,26 @@ import warnings
 
 from benchmark import ROOT_DIR
 from benchmark.dataset import Dataset
+from engine.base_client.checkpoint import UploadCheckpoint
 from engine.base_client.configure import BaseConfigurator
+from engine.base_client.mixed import MIXED_INSERT, MixedWorkload
+from engine.base_client.resources import RESOURCE_MONITOR
 from engine.base_client.search import BaseSearcher
+from engine.base_client.stats import aggregate_repetitions
 from engine.base_client.upload import BaseUploader
 
 RESULTS_DIR = ROOT_DIR / "results"
 RESULTS_DIR.mkdir(exist_ok=True)
+CHECKPOINTS_DIR = RESULTS_DIR / "checkpoints"
 
 DETAILED_RESULTS = bool(int(os.getenv("DETAILED_RESULTS", False)))
 REPETITIONS = int(os.getenv("REPETITIONS", 3))
+# Early stopping of the repetitions is enabled by setting the maximum relative
+# width of the rps confidence interval, e.g. 0.05 for 5% of the mean
+REPETITIONS_CI_THRESHOLD = float(os.getenv("REPETITIONS_CI_THRESHOLD", 0))
+REPETITIONS_CONFIDENCE = float(os.getenv("REPETITIONS_CONFIDENCE", 0.95))
+MIN_REPETITIONS = int(os.getenv("MIN_REPETITIONS", 2))
+MAX_REPETITIONS = int(os.getenv("MAX_REPETITIONS", REPETITIONS))
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -61,6 +72,77 @@ class BaseClient:
             )
         return result_path
 
+    def save_search_summary(
+        self, dataset_name: str, summary: dict, search_id: int, search_params: dict
+    ):
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d-%H-%M-%S")
+        experiments_file = (
+            f"{self.name}-{dataset_name}-summary-{search_id}-{timestamp}.json"
+        )
+        result_path = RESULTS_DIR / experiments_file
+        with open(result_path, "w") as out:
+            out.write(
+                json.dumps(
+                    {
+                        "params": {
+                            "dataset": dataset_name,
+                            "experiment": self.name,
+                            "engine": self.engine,
+                            **search_params,
+                        },
+                        "summary": summary,
+                    },
+                    indent=2,
+                )
+            )
+        return result_path
+
+    def save_mixed_results(
+        self, dataset_name: str, results: dict, search_id: int, search_params: dict
+    ):
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d-%H-%M-%S")
+        experiments_file = (
+            f"{self.name}-{dataset_name}-mixed-{search_id}-{timestamp}.json"
+        )
+        result_path = RESULTS_DIR / experiments_file
+        with open(result_path, "w") as out:
+            out.write(
+                json.dumps(
+                    {
+                        "params": {
+                            "dataset": dataset_name,
+                            "experiment": self.name,
+                            "engine": self.engine,
+                            **search_params,
+                        },
+                        "results": results,
+                    },
+                    indent=2,
+                )
+            )
+        return result_path
+
+    def save_resource_usage(self, dataset_name: str, phases: dict):
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d-%H-%M-%S")
+        experiments_file = f"{self.name}-{dataset_name}-resources-{timestamp}.json"
+        with open(RESULTS_DIR / experiments_file, "w") as out:
+            out.write(
+                json.dumps(
+                    {
+                        "params": {
+                            "dataset": dataset_name,
+                            "experiment": self.name,
+                            "engine": self.engine,
+                        },
+                        "results": {"phases": phases},
+                    },
+                    indent=2,
+                )
+            )
+
     def save_upload_results(
         self, dataset_name: str, results: dict, upload_params: dict,upload_start_idx:int,upload_end_idx:int,
     ):
@@ -81,6 +163,14 @@ class BaseClient:
             }
             out.write(json.dumps(upload_stats, indent=2))
 
+    def upload_checkpoint(
+        self, dataset_name: str, upload_start_idx: int, upload_end_idx: int
+    ) -> UploadCheckpoint:
+        return UploadCheckpoint(
+            CHECKPOINTS_DIR
+            / f"{self.name}-{dataset_name}-upload-{upload_start_idx}-{upload_end_idx}.json"
+        )
+
     def run_experiment(
         self,
         dataset: Dataset,
@@ -90,11 +180,17 @@ class BaseClient:
         parallels: [int] = [],
         upload_start_idx: int = 0,
         upload_end_idx: int = -1,
+        resume: bool = False,
     ):
         execution_params = self.configurator.execution_params(
             distance=dataset.config.distance, vector_size=dataset.config.vector_size
         )
         reader = dataset.get_reader(execution_params.get("normalize", False))
+        mixed_workload = None
+        if "mixed_workload" in self.uploader.upload_params:
+            mixed_workload = MixedWorkload(
+                self.uploader, self.uploader.upload_params["mixed_workload"]
+            )
 
         if skip_if_exists:
             glob_pattern = f"{self.name}-{dataset.config.name}-search-*-*.json"
@@ -105,16 +201,43 @@ class BaseClient:
                 )
                 return
 
+        if RESOURCE_MONITOR.enabled:
+            RESOURCE_MONITOR.start()
+
+        checkpoint = self.upload_checkpoint(
+            dataset.config.name, upload_start_idx, upload_end_idx
+        )
+        resumed = resume and checkpoint.load()
+        resumed_after = checkpoint.last_id if resumed else None
+        if resumed and checkpoint.completed:
+            print(f"Upload already completed according to {checkpoint.path}")
+            skip_upload = True
+
         if not skip_upload:
-            print("Experiment stage: Configure")
-            self.configurator.configure(dataset)
+            if resumed:
+                # The collection already exists and holds the uploaded records
+                print(f"Experiment stage: Upload resumed after record {resumed_after}")
+            else:
+                print("Experiment stage: Configure")
+                RESOURCE_MONITOR.set_phase("configure")
+                self.configurator.configure(dataset)
+                checkpoint.reset()
             range_max_str = ":"
             if upload_end_idx > 0:
                 range_max_str += f"{upload_end_idx}"
             print(f"Experiment stage: Upload. Vector range [{upload_start_idx}{range_max_str}]")
+            RESOURCE_MONITOR.set_phase("upload")
+            records = reader.read_data(upload_start_idx, upload_end_idx)
+            if resumed_after is not None:
+                records = (record for record in records if record.id > resumed_after)
+            if mixed_workload is not None:
+                records = mixed_workload.initial_records(records)
             upload_stats = self.uploader.upload(
-                distance=dataset.config.distance, records=reader.read_data(upload_start_idx,upload_end_idx)
+                distance=dataset.config.distance,
+                records=records,
+                checkpoint=checkpoint,
             )
+            upload_stats["resumed_after"] = resumed_after
 
             if not DETAILED_RESULTS:
                 # Remove verbose stats from upload results
@@ -131,8 +254,22 @@ class BaseClient:
                 upload_end_idx=upload_end_idx,
             )
 
+        # The held-out records are written by the mixed workload only, so the
+        # regular searches run on an incomplete collection
+        holdout_every = None
+        if (
+            not skip_upload
+            and mixed_workload is not None
+            and mixed_workload.mode == MIXED_INSERT
+        ):
+            holdout_every = mixed_workload.holdout_every
+
         if not skip_search:
             print("Experiment stage: Search")
+            if holdout_every is not None:
+                print(
+                    f"\tOne in {holdout_every} records is held out for the mixed workload"
+                )
             for search_id, searcher in enumerate(self.searchers):
                 if skip_if_exists:
                     glob_pattern = (
@@ -147,6 +284,8 @@ class BaseClient:
                         continue
 
                 search_params = {**searcher.search_params}
+                if holdout_every is not None:
+                    search_params["holdout_every"] = holdout_every
                 ef = "default"
                 if "search_params" in search_params:
                     ef = search_params["search_params"].get("ef", "default")
@@ -155,7 +294,9 @@ class BaseClient:
                 if filter_client_count and (client_count not in parallels):
                     print(f"\tSkipping ef runtime: {ef}; #clients {client_count}")
                     continue
-                for repetition in range(1, REPETITIONS + 1):
+                RESOURCE_MONITOR.set_phase(f"search-{search_id}")
+                repetitions_stats = []
+                for repetition in range(1, self._max_repetitions() + 1):
                     print(
                         f"\tRunning repetition {repetition} ef runtime: {ef}; #clients {client_count}"
                     )
@@ -173,10 +314,84 @@ class BaseClient:
                     self.save_search_results(
                         dataset.config.name, search_stats, search_id, search_params
                     )
+                    repetitions_stats.append(search_stats)
+                    if self._should_stop_repetitions(repetitions_stats):
+                        print(
+                            f"\tStopping after {repetition} repetitions, "
+                            f"rps confidence interval is below {REPETITIONS_CI_THRESHOLD}"
+                        )
+                        break
+
+                summary = aggregate_repetitions(
+                    repetitions_stats, confidence=REPETITIONS_CONFIDENCE
+                )
+                if len(summary["outliers"]) > 0:
+                    print(f"\tOutlier repetitions: {summary['outliers']}")
+                self.save_search_summary(
+                    dataset.config.name, summary, search_id, search_params
+                )
+
+        if not skip_search and mixed_workload is not None:
+            print(f"Experiment stage: Mixed workload ({mixed_workload.mode})")
+            for search_id, searcher in enumerate(self.searchers):
+                search_params = {**searcher.search_params}
+                client_count = search_params.get("parallel", 1)
+                if len(parallels) > 0 and client_count not in parallels:
+                    continue
+                print(
+                    f"\tRunning search {search_id} under write load; #clients {client_count}"
+                )
+                RESOURCE_MONITOR.set_phase(f"mixed-{search_id}")
+                mixed_workload.start(
+                    dataset.config.distance, reader, upload_start_idx, upload_end_idx
+                )
+                try:
+                    search_stats = searcher.search_all(
+                        dataset.config.distance, reader.read_queries()
+                    )
+                finally:
+                    write_stats = mixed_workload.stop()
+                print(
+                    f"\tWrite throughput: {write_stats['vectors_per_second']:.2f} vectors/s"
+                )
+                search_params["parallel"] = client_count
+                if not DETAILED_RESULTS:
+                    search_stats.pop("latencies", None)
+                    search_stats.pop("precisions", None)
+                self.save_mixed_results(
+                    dataset.config.name,
+                    {"search": search_stats, "write": write_stats},
+                    search_id,
+                    {**search_params, "mixed_workload": mixed_workload.config},
+                )
+
+        if RESOURCE_MONITOR.enabled:
+            self.save_resource_usage(dataset.config.name, RESOURCE_MONITOR.stop())
 
         print("Experiment stage: Done")
         print("Results saved to: ", RESULTS_DIR)
 
+    @staticmethod
+    def _max_repetitions() -> int:
+        if REPETITIONS_CI_THRESHOLD > 0:
+            return max(MAX_REPETITIONS, MIN_REPETITIONS)
+        return REPETITIONS
+
+    @staticmethod
+    def _should_stop_repetitions(repetitions_stats: List[dict]) -> bool:
+        if REPETITIONS_CI_THRESHOLD <= 0 or len(repetitions_stats) < MIN_REPETITIONS:
+            return False
+        summary = aggregate_repetitions(
+            repetitions_stats, confidence=REPETITIONS_CONFIDENCE
+        )
+        if summary["used_repetitions"] < MIN_REPETITIONS:
+            return False
+        rps = summary["metrics"]["rps"]
+        if rps["mean"] == 0:
+            return True
+        ci_width = (rps["ci_high"] - rps["ci_low"]) / rps["mean"]
+        return ci_width <= REPETITIONS_CI_THRESHOLD
+
     def delete_client(self):
         self.uploader.delete_client()
         self.configurator.delete_client()
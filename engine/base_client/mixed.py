@@ -0,0 +1,200 @@
+import os
+import queue
+import time
+from multiprocessing import get_context
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from dataset_reader.base_reader import BaseReader, Record
+from engine.base_client.upload import BaseUploader
+from engine.base_client.utils import iter_batches
+
+MIXED_INSERT = "insert"
+MIXED_REINSERT = "reinsert"
+
+# Seconds to wait for the writer to finish its current batch once stopped
+MIXED_STOP_TIMEOUT = float(os.getenv("MIXED_STOP_TIMEOUT", 600.0))
+
+
+class MixedWorkload:
+    """
+    Runs the upload path of an engine in a separate process, while the searches
+    are executed, so the search performance may be measured under write load.
+
+    Supported modes:
+    - insert: every `holdout_every`-th record is excluded from the initial
+      upload and written during the searches. Once all the held-out records are
+      written, they are written again, which overwrites the existing points.
+      Engines which can't overwrite a record write every held-out one once,
+      over all the searches.
+    - reinsert: already uploaded records are written again (churn). Requires
+      an engine which overwrites the records.
+    """
+
+    def __init__(self, uploader: BaseUploader, config: dict):
+        self.uploader = uploader
+        self.config = config
+        self.mode = config.get("mode", MIXED_INSERT)
+        if self.mode not in (MIXED_INSERT, MIXED_REINSERT):
+            raise ValueError(f"Unknown mixed workload mode: <{self.mode}>")
+        if self.mode == MIXED_REINSERT and not uploader.OVERWRITES_BY_ID:
+            raise ValueError(
+                f"{uploader.__class__.__name__} can't write a record again, "
+                f"use the <{MIXED_INSERT}> mixed workload mode"
+            )
+        self.holdout_every = int(config.get("holdout_every", 10))
+        self.write_rate = config.get("write_rate")
+        self.batch_size = int(
+            config.get("batch_size", uploader.upload_params.get("batch_size", 64))
+        )
+        # The last held-out record written, if the records are written once
+        self.written_until: Optional[int] = None
+        self._process = None
+        self._stop_event = None
+        self._results = None
+
+    def is_held_out(self, record_id: int) -> bool:
+        return self.mode == MIXED_INSERT and record_id % self.holdout_every == 0
+
+    def initial_records(self, records: Iterable[Record]) -> Iterator[Record]:
+        return (record for record in records if not self.is_held_out(record.id))
+
+    def write_records(self, records: Iterable[Record]) -> Iterator[Record]:
+        if self.mode == MIXED_REINSERT:
+            return iter(records)
+        return (
+            record
+            for record in records
+            if self.is_held_out(record.id)
+            and (self.written_until is None or record.id > self.written_until)
+        )
+
+    def start(
+        self, distance, reader: BaseReader, start_idx: int = 0, end_idx: int = -1
+    ):
+        ctx = get_context(self.uploader.get_mp_start_method())
+        self._stop_event = ctx.Event()
+        ready_event = ctx.Event()
+        self._results = ctx.Queue()
+        self._process = ctx.Process(
+            target=_write_loop,
+            args=(
+                self,
+                distance,
+                reader,
+                start_idx,
+                end_idx,
+                ready_event,
+                self._stop_event,
+                self._results,
+            ),
+        )
+        self._process.start()
+        # Searches should not start before the writer is connected
+        while not ready_event.wait(1.0):
+            if not self._process.is_alive():
+                raise RuntimeError("Mixed workload writer failed to start")
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        deadline = time.perf_counter() + MIXED_STOP_TIMEOUT
+        try:
+            stats = self._wait_for_results(deadline)
+        finally:
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process.join()
+            self._process = None
+        if not self.uploader.OVERWRITES_BY_ID and stats["last_written_id"] is not None:
+            self.written_until = stats["last_written_id"]
+        return stats
+
+    def _wait_for_results(self, deadline: float) -> dict:
+        while True:
+            # The results are checked once more after the writer exits, as
+            # they may have been sent right before
+            alive = self._process.is_alive()
+            try:
+                return self._results.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            if not alive:
+                raise RuntimeError(
+                    f"Mixed workload writer exited with code {self._process.exitcode}"
+                )
+            if time.perf_counter() > deadline:
+                raise TimeoutError(
+                    f"Mixed workload writer did not stop in {MIXED_STOP_TIMEOUT}s"
+                )
+
+    def __getstate__(self):
+        # Process handles are not transferred to the writer process
+        state = self.__dict__.copy()
+        state.update(_process=None, _stop_event=None, _results=None)
+        return state
+
+
+def _write_loop(
+    workload: MixedWorkload,
+    distance,
+    reader: BaseReader,
+    start_idx: int,
+    end_idx: int,
+    ready_event,
+    stop_event,
+    results,
+):
+    uploader = workload.uploader
+    uploader.init_client(
+        uploader.host, distance, uploader.connection_params, uploader.upload_params
+    )
+    ready_event.set()
+
+    latencies = []
+    written, errors = 0, 0
+    last_written_id = None
+    start = time.perf_counter()
+    while not stop_event.is_set():
+        records = workload.write_records(reader.read_data(start_idx, end_idx))
+        batches = iter_batches(records, workload.batch_size)
+        for batch in batches:
+            if stop_event.is_set():
+                break
+            try:
+                latency, _, size, _, _ = uploader.__class__._upload_batch(batch)
+                latencies.append(latency)
+                written += size
+                last_written_id = batch[0][-1]
+            except Exception as e:
+                errors += 1
+                print(f"Mixed workload write failed: {e}")
+            if workload.write_rate:
+                # Throttle the writes to the configured number of vectors per second
+                delay = start + written / workload.write_rate - time.perf_counter()
+                if delay > 0:
+                    stop_event.wait(delay)
+        if written == 0 and errors == 0:
+            # Nothing to write, e.g. no records were held out
+            break
+        if not uploader.OVERWRITES_BY_ID:
+            break
+    total_time = time.perf_counter() - start
+
+    uploader.delete_client()
+    results.put(
+        {
+            "mode": workload.mode,
+            "write_rate": workload.write_rate,
+            "batch_size": workload.batch_size,
+            "total_time": total_time,
+            "written_vectors": written,
+            "last_written_id": last_written_id,
+            "errors": errors,
+            "vectors_per_second": written / total_time if total_time > 0 else 0.0,
+            "mean_batch_time": float(np.mean(latencies)) if latencies else None,
+            "p99_batch_time": (
+                float(np.percentile(latencies, 99)) if latencies else None
+            ),
+        }
+    )
@@ -0,0 +1,192 @@
+import cProfile
+import multiprocessing.util
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+import psutil
+
+from benchmark import ROOT_DIR
+
+PROFILES_DIR = ROOT_DIR / "results"
+# Enables cProfile in one of the benchmark worker processes
+CLIENT_PROFILE = bool(int(os.getenv("CLIENT_PROFILE", 0)))
+CLIENT_SAMPLE_INTERVAL = float(os.getenv("CLIENT_SAMPLE_INTERVAL", 0.5))
+# CPU usage of a single core, in percent, above which a worker is considered
+# saturated
+CLIENT_BOUND_CPU_THRESHOLD = float(os.getenv("CLIENT_BOUND_CPU_THRESHOLD", 90.0))
+# Minimal interval between two dumps of the profile, in seconds
+PROFILE_DUMP_INTERVAL = 1.0
+
+_profiler: Optional[cProfile.Profile] = None
+_profile_path: Optional[str] = None
+_last_dump = 0.0
+
+
+class ClientMonitor:
+    """
+    Samples CPU usage of the benchmark process and its worker processes, to
+    detect when the benchmark client itself is the bottleneck. It also tracks
+    the pending tasks, taken from the iterable of the pool but whose results
+    were not consumed yet. The task feeder of `Pool.imap` takes the whole
+    iterable at once, so the number of pending tasks is the remaining backlog
+    of the run, not the depth of the queues of the workers.
+    """
+
+    def __init__(self, interval: float = CLIENT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.dispatched = 0
+        self.completed = 0
+        self._cpu_samples = {}
+        self._pending_tasks = []
+        self._processes = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def track_dispatched(self, iterable: Iterable) -> Iterable:
+        for item in iterable:
+            self.dispatched += 1
+            yield item
+
+    def track_completed(self, iterable: Iterable) -> Iterable:
+        for item in iterable:
+            self.completed += 1
+            yield item
+
+    def start(self, pids: Iterable[int] = ()):
+        """
+        Samples the current process and the worker processes with the given
+        pids. The workers are not looked up in the sampling thread, as
+        multiprocessing.active_children is not thread-safe and also lists the
+        children which are not benchmark workers.
+        """
+        self._processes = {"main": psutil.Process()}
+        for pid in pids:
+            try:
+                self._processes[f"worker-{pid}"] = psutil.Process(pid)
+            except psutil.NoSuchProcess:
+                continue
+        for process in self._processes.values():
+            # The first call of cpu_percent only starts the measurement
+            process.cpu_percent()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        for name, process in self._processes.items():
+            try:
+                cpu_percent = process.cpu_percent()
+            except psutil.NoSuchProcess:
+                continue
+            self._cpu_samples.setdefault(name, []).append(cpu_percent)
+        self._pending_tasks.append(self.dispatched - self.completed)
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        cpu = {
+            name: {"mean": float(np.mean(samples)), "peak": float(np.max(samples))}
+            for name, samples in self._cpu_samples.items()
+            if len(samples) > 0
+        }
+        workers = [usage for name, usage in cpu.items() if name != "main"]
+        if len(workers) == 0:
+            workers = [usage for usage in cpu.values()]
+        mean_worker_cpu = (
+            float(np.mean([usage["mean"] for usage in workers])) if workers else 0.0
+        )
+        total_cpu = sum(usage["mean"] for usage in cpu.values())
+        client_bound = (
+            mean_worker_cpu >= CLIENT_BOUND_CPU_THRESHOLD
+            or total_cpu >= CLIENT_BOUND_CPU_THRESHOLD * psutil.cpu_count()
+        )
+        if client_bound:
+            print(
+                "WARNING: the benchmark client is saturated, the results are client-bound"
+            )
+        return {
+            "cpu_percent": cpu,
+            "mean_worker_cpu_percent": mean_worker_cpu,
+            "total_cpu_percent": total_cpu,
+            "mean_pending_tasks": (
+                float(np.mean(self._pending_tasks)) if self._pending_tasks else 0.0
+            ),
+            "max_pending_tasks": max(self._pending_tasks, default=0),
+            "client_bound": client_bound,
+        }
+
+
+def worker_pids(pool) -> List[int]:
+    # The pool does not expose its worker processes
+    return [process.pid for process in pool._pool]
+
+
+def profile_path(name: str) -> str:
+    timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    return str(PROFILES_DIR / f"{name}-profile-{timestamp}.prof")
+
+
+def init_worker(profile_lock, path: Optional[str], initializer: Callable, *initargs):
+    """
+    Pool initializer, which enables profiling in the first worker that
+    acquires the lock and then runs the regular client initializer. The
+    profile is dumped once more when the worker exits, after the pool is
+    closed and joined.
+    """
+    global _profiler, _profile_path
+    initializer(*initargs)
+    if path is not None and profile_lock.acquire(block=False):
+        _profiler = cProfile.Profile()
+        _profile_path = path
+        multiprocessing.util.Finalize(None, _dump_worker_profile, exitpriority=10)
+
+
+def _dump_worker_profile():
+    if _profiler is not None:
+        _profiler.dump_stats(_profile_path)
+
+
+def run_profiled(func: Callable, *args, **kwargs):
+    """
+    Runs the task, collecting the profile if it is enabled in this process.
+    The profile is also dumped periodically, for pools which are terminated
+    without running the finalizers of the workers.
+    """
+    global _last_dump
+    if _profiler is None:
+        return func(*args, **kwargs)
+    _profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _profiler.disable()
+        now = time.perf_counter()
+        if now - _last_dump >= PROFILE_DUMP_INTERVAL:
+            _profiler.dump_stats(_profile_path)
+            _last_dump = now
+
+
+def enable_local_profile(path: Optional[str]):
+    """
+    Profiles the current process, used if no worker processes are started.
+    """
+    global _profiler, _profile_path
+    _profiler = cProfile.Profile() if path is not None else None
+    _profile_path = path
+
+
+def dump_local_profile():
+    global _profiler
+    if _profiler is not None:
+        _profiler.dump_stats(_profile_path)
+        print(f"Client profile saved to: {_profile_path}")
+        _profiler = None
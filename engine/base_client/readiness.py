@@ -0,0 +1,136 @@
+import os
+import time
+from typing import Callable, List, Optional
+
+READINESS_MIN_INTERVAL = float(os.getenv("READINESS_MIN_INTERVAL", 0.05))
+READINESS_MAX_INTERVAL = float(os.getenv("READINESS_MAX_INTERVAL", 5))
+# Seconds, 0 waits forever
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", 0))
+
+
+class ReadinessWait:
+    """
+    Polls the engine until the index is ready. Each probe returns a sample of
+    the engine state, optionally with its `progress` between 0 and 1. While
+    the progress is known, the next poll is scheduled at half of the estimated
+    remaining time, otherwise the interval grows exponentially. All the samples
+    are kept as a timeline, and the completion time is interpolated between
+    the last two polls, so it does not depend on the polling interval.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], dict],
+        is_ready: Callable[[dict], bool],
+        name: str = "index",
+        confirmations: int = 1,
+        confirm_interval: Optional[float] = None,
+        min_interval: float = READINESS_MIN_INTERVAL,
+        max_interval: float = READINESS_MAX_INTERVAL,
+        backoff: float = 2.0,
+        timeout: float = READINESS_TIMEOUT,
+    ):
+        """
+        Args:
+            probe: returns the current state of the engine
+            is_ready: checks the returned state
+            name: printed in the progress messages
+            confirmations: number of consecutive ready samples required, for
+                engines which may briefly report readiness before the work
+                is scheduled
+            confirm_interval: seconds between the confirmation polls
+        """
+        self.probe = probe
+        self.is_ready = is_ready
+        self.name = name
+        self.confirmations = confirmations
+        self.confirm_interval = confirm_interval or max_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.timeline: List[dict] = []
+
+    def _next_interval(self, interval: float) -> float:
+        samples = [s for s in self.timeline if s.get("progress") is not None]
+        if len(samples) >= 2:
+            first, last = samples[-2], samples[-1]
+            rate = (last["progress"] - first["progress"]) / (
+                last["time"] - first["time"]
+            )
+            if rate > 0:
+                remaining = (1.0 - last["progress"]) / rate
+                return min(max(remaining / 2, self.min_interval), self.max_interval)
+        return min(interval * self.backoff, self.max_interval)
+
+    def completion_time(self) -> float:
+        """
+        Estimated time of the completion, in seconds since the start of the
+        wait, between the last sample which was not ready and the first
+        ready one.
+        """
+        ready_idx = len(self.timeline) - self.confirmations
+        ready = self.timeline[ready_idx]
+        if ready_idx == 0:
+            return ready["time"]
+        before = self.timeline[ready_idx - 1]
+        earlier = self.timeline[ready_idx - 2] if ready_idx >= 2 else {}
+        if None not in (earlier.get("progress"), before.get("progress")):
+            # Extrapolated from the rate of the progress before the completion
+            rate = (before["progress"] - earlier["progress"]) / (
+                before["time"] - earlier["time"]
+            )
+            if rate > 0:
+                estimate = before["time"] + (1.0 - before["progress"]) / rate
+                return min(max(estimate, before["time"]), ready["time"])
+        return (before["time"] + ready["time"]) / 2
+
+    def wait(self) -> dict:
+        start = time.perf_counter()
+        interval = self.min_interval
+        consecutive = 0
+        while True:
+            sample = self.probe()
+            sample["time"] = time.perf_counter() - start
+            self.timeline.append(sample)
+            if self.is_ready(sample):
+                consecutive += 1
+                if consecutive >= self.confirmations:
+                    break
+                time.sleep(self.confirm_interval)
+                continue
+            consecutive = 0
+            if 0 < self.timeout < sample["time"]:
+                raise TimeoutError(
+                    f"{self.name} not ready after {sample['time']:.1f}s: {sample}"
+                )
+            if sample.get("progress") is not None:
+                print(
+                    f"waiting for {self.name}, progress: {sample['progress'] * 100.0:.2f}%"
+                )
+            interval = self._next_interval(interval)
+            time.sleep(interval)
+
+        completion_time = self.completion_time()
+        print(f"{self.name} ready in {completion_time:.3f}s")
+        return {
+            # perf_counter timestamp, see BaseUploader.index_ready_at
+            "completed_at": start + completion_time,
+            "completion_time": completion_time,
+            "ready_time": self.timeline[-self.confirmations]["time"],
+            "polls": len(self.timeline),
+            "timeline": self.timeline,
+        }
+
+
+def add_rates(timeline: List[dict], key: str):
+    """
+    Adds the rate of the counter between every two consecutive samples of the
+    timeline, per second, as `<key>_rate`.
+    """
+    for previous, sample in zip(timeline, timeline[1:]):
+        if previous.get(key) is None or sample.get(key) is None:
+            continue
+        sample[f"{key}_rate"] = (sample[key] - previous[key]) / (
+            sample["time"] - previous["time"]
+        )
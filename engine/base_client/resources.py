@@ -0,0 +1,72 @@
+import os
+from typing import Optional
+
+import requests
+
+# Sidecar started with `python -m monitoring.resource_sampler`, e.g. http://server:8001
+RESOURCE_SAMPLER_URL = os.getenv("RESOURCE_SAMPLER_URL", None)
+# Comma separated names of the processes / containers to sample locally,
+# if no sidecar is used
+RESOURCE_SAMPLER_PROCESSES = os.getenv("RESOURCE_SAMPLER_PROCESSES", "")
+RESOURCE_SAMPLER_CONTAINERS = os.getenv("RESOURCE_SAMPLER_CONTAINERS", "")
+RESOURCE_SAMPLER_INTERVAL = float(os.getenv("RESOURCE_SAMPLER_INTERVAL", 0.2))
+
+
+class ResourceMonitor:
+    """
+    Tags the resource samples with the current benchmark phase, using either
+    the sampler sidecar or a sampler running in the benchmark process.
+    """
+
+    def __init__(self):
+        self.url = RESOURCE_SAMPLER_URL
+        self.sampler = None
+        processes = [name for name in RESOURCE_SAMPLER_PROCESSES.split(",") if name]
+        containers = [name for name in RESOURCE_SAMPLER_CONTAINERS.split(",") if name]
+        if self.url is None and (processes or containers):
+            from monitoring.resource_sampler import ResourceSampler
+
+            self.sampler = ResourceSampler(
+                RESOURCE_SAMPLER_INTERVAL, processes, containers
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.url is not None or self.sampler is not None
+
+    def _request(self, path: str, **params) -> Optional[dict]:
+        try:
+            response = requests.get(f"{self.url}{path}", params=params, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred while querying the resource sampler: {e}")
+            return None
+
+    def start(self):
+        if self.sampler is not None:
+            self.sampler.reset()
+            self.sampler.start()
+        elif self.url is not None:
+            self._request("/reset")
+
+    def set_phase(self, phase: Optional[str]):
+        if self.sampler is not None:
+            self.sampler.set_phase(phase)
+        elif self.url is not None:
+            self._request("/phase", name=phase)
+
+    def stop(self) -> dict:
+        """
+        Stops tagging the samples and returns the usage summary per phase.
+        """
+        self.set_phase(None)
+        if self.sampler is not None:
+            self.sampler.stop()
+            return self.sampler.summary()
+        if self.url is not None:
+            return self._request("/summary") or {}
+        return {}
+
+
+RESOURCE_MONITOR = ResourceMonitor()
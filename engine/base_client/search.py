@@ -1,22 +1,56 @@
 import functools
+import math
 import time
 from multiprocessing import get_context
-from typing import Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import itertools
 
 import numpy as np
 import tqdm
-import os 
+import os
 
 from dataset_reader.base_reader import Query
+from engine.base_client.profiling import (
+    CLIENT_PROFILE,
+    ClientMonitor,
+    dump_local_profile,
+    enable_local_profile,
+    init_worker,
+    profile_path,
+    run_profiled,
+    worker_pids,
+)
+from engine.base_client.timeline import build_timeline
 
 DEFAULT_TOP = 10
 MAX_QUERIES = int(os.getenv("MAX_QUERIES", -1))
 
 
-
 class BaseSearcher:
     MP_CONTEXT = None
+    # Exceptions raised by search_one or search_batch, after which the query is
+    # counted as failed, and reported in the error rate, instead of stopping
+    # the benchmark. Failed queries have no latency and precision.
+    SEARCH_ERRORS: Tuple[type, ...] = ()
+    # Whether every worker searches its share of the queries with a single
+    # `_search_loop` call, also when each query is searched once, instead of
+    # receiving the queries one by one. Searchers which keep many queries in
+    # flight in every worker override the loop.
+    WORKER_LOOP = False
+    # Search params of the benchmark itself, the engines do not receive them
+    BENCHMARK_PARAMS = frozenset(
+        {
+            "parallel",
+            "top",
+            "batch_size",
+            "duration",
+            "min_queries",
+            "warmup_queries",
+            "warmup_duration",
+            "warmup_subset",
+            "holdout_every",
+        }
+    )
 
     def __init__(self, host, connection_params, search_params):
         self.host = host
@@ -33,6 +67,18 @@ class BaseSearcher:
     def get_mp_start_method(cls):
         return None
 
+    @classmethod
+    def engine_params(cls, search_params: dict) -> dict:
+        """
+        The search params without the ones of the benchmark, for engines which
+        pass all of them through to the requests or the index settings.
+        """
+        return {
+            key: value
+            for key, value in search_params.items()
+            if key not in cls.BENCHMARK_PARAMS
+        }
+
     @classmethod
     def search_one(
         cls, vector: List[float], meta_conditions, top: Optional[int]
@@ -40,23 +86,152 @@ class BaseSearcher:
         raise NotImplementedError()
 
     @classmethod
-    def _search_one(cls, query, top: Optional[int] = None):
-        if top is None:
-            top = (
-                len(query.expected_result)
-                if query.expected_result is not None and len(query.expected_result) > 0
-                else DEFAULT_TOP
-            )
+    def search_batch(
+        cls, vectors: List[List[float]], meta_conditions: List, top: Optional[int]
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Searches several queries at once, used with the `batch_size` search
+        param. Engines which support it send all of them in one request, by
+        default they are searched one by one.
+        """
+        return [
+            cls.search_one(vector, conditions, top)
+            for vector, conditions in zip(vectors, meta_conditions)
+        ]
+
+    @classmethod
+    def pop_query_stats(cls) -> Optional[Dict[str, float]]:
+        """
+        Engine specific timings of the last `search_one` call, e.g. its phases,
+        in seconds. They are summarized in the `query_stats` of the results.
+        """
+        return None
+
+    @classmethod
+    def transport_info(cls) -> Optional[dict]:
+        """
+        Settings of the connections to the engine, recorded in the results, so
+        that runs with different transports are not compared by mistake.
+        """
+        return None
+
+    @classmethod
+    def prepare_queries(cls, queries: List[Query], top: Optional[int]) -> list:
+        """
+        Converts the queries before the measurement starts, e.g. the filters
+        into the syntax of the engine. The converted queries are searched by
+        `_search_one` and `_search_batch`, so they keep the fields of `Query`,
+        unless `_search_loop` is overridden as well.
+        """
+        return queries
+
+    @staticmethod
+    def _query_top(query: Query, top: Optional[int]) -> int:
+        if top is not None:
+            return top
+        if query.expected_result is not None and len(query.expected_result) > 0:
+            return len(query.expected_result)
+        return DEFAULT_TOP
+
+    @staticmethod
+    def _precision(query: Query, search_res: List[Tuple[int, float]], top: int):
+        if not query.expected_result:
+            return 1.0
+        ids = set(x[0] for x in search_res[:top])
+        return len(ids.intersection(query.expected_result[:top])) / top
+
+    @classmethod
+    def _search_one(cls, query, top: Optional[int] = None, with_precision=True):
+        top = cls._query_top(query, top)
 
         start = time.perf_counter()
-        search_res = cls.search_one(query.vector, query.meta_conditions, top)
+        try:
+            search_res = cls.search_one(query.vector, query.meta_conditions, top)
+        except cls.SEARCH_ERRORS as e:
+            print(f"Search failed: {e}")
+            return None, None, time.perf_counter(), None
+        end = time.perf_counter()
+        query_stats = cls.pop_query_stats()
+
+        if not with_precision:
+            return None, end - start, end, query_stats
+
+        return cls._precision(query, search_res, top), end - start, end, query_stats
+
+    @classmethod
+    def _search_batch(cls, queries: List[Query], top: Optional[int] = None):
+        """
+        Searches the queries with a single `search_batch` call. The latency of
+        every query is the latency of the whole call, as all of them wait for
+        it, the share of a single query is reported as `amortized_time`.
+        """
+        tops = [cls._query_top(query, top) for query in queries]
+
+        start = time.perf_counter()
+        try:
+            search_res = cls.search_batch(
+                [query.vector for query in queries],
+                [query.meta_conditions for query in queries],
+                max(tops),
+            )
+        except cls.SEARCH_ERRORS as e:
+            print(f"Search of a batch of {len(queries)} queries failed: {e}")
+            return [(None, None, time.perf_counter(), None)] * len(queries)
         end = time.perf_counter()
+        query_stats = {
+            **(cls.pop_query_stats() or {}),
+            "amortized_time": (end - start) / len(queries),
+        }
+
+        return [
+            (cls._precision(query, res, query_top), end - start, end, query_stats)
+            for query, res, query_top in zip(queries, search_res, tops)
+        ]
 
-        precision = 1.0
-        if query.expected_result:
-            ids = set(x[0] for x in search_res)
-            precision = len(ids.intersection(query.expected_result[:top])) / top
-        return precision, end - start
+    @classmethod
+    def _search_loop(
+        cls,
+        worker_id: int,
+        queries: List[Query],
+        workers: int,
+        top: Optional[int] = None,
+        duration: Optional[float] = None,
+        count: Optional[int] = None,
+        batch_size: int = 1,
+    ) -> List[Tuple[int, float, float, float, Optional[dict]]]:
+        """
+        Cycles through the queries, starting from an offset specific to the
+        worker, until all the configured bounds (duration in seconds and number
+        of queries) are reached. Returns the query index, precision, latency,
+        completion timestamp and engine stats of every executed query.
+        Precision is calculated only for the first occurrence of each query and
+        is None for the repeated ones, unless the queries are sent in batches.
+        With `WORKER_LOOP`, it is also called without any bounds, then each
+        query of the share of the worker is searched once.
+        """
+        offset = worker_id * len(queries) // workers
+        results = []
+        seen = set()
+        start = time.perf_counter()
+        while (duration is not None and time.perf_counter() - start < duration) or (
+            count is not None and len(results) < count
+        ):
+            if batch_size > 1:
+                indices = [
+                    (offset + len(results) + i) % len(queries)
+                    for i in range(batch_size)
+                ]
+                batch = cls._search_batch([queries[idx] for idx in indices], top)
+                results.extend((idx, *res) for idx, res in zip(indices, batch))
+                continue
+            idx = (offset + len(results)) % len(queries)
+            precision, latency, end, query_stats = cls._search_one(
+                queries[idx], top, with_precision=idx not in seen
+            )
+            if latency is not None:
+                seen.add(idx)
+            results.append((idx, precision, latency, end, query_stats))
+        return results
 
     def search_all(
         self,
@@ -71,26 +246,115 @@ class BaseSearcher:
         )
         self.setup_search()
 
+        batch_size = self.search_params.get("batch_size", 1)
         search_one = functools.partial(self.__class__._search_one, top=top)
         used_queries = queries
 
-
         if MAX_QUERIES > 0:
             used_queries = itertools.islice(queries, MAX_QUERIES)
             print(f"Limiting queries to [0:{MAX_QUERIES-1}]")
 
+        # Results of the batches are lists of the results of their queries
+        flatten = iter
+        if batch_size > 1:
+            search_one = functools.partial(self.__class__._search_batch, top=top)
+            flatten = itertools.chain.from_iterable
+
+        duration = self.search_params.get("duration")
+        min_queries = self.search_params.get("min_queries")
+        use_loop = duration is not None or min_queries is not None or self.WORKER_LOOP
+        # Converted once, none of the conversions is measured
+        used_queries = self.prepare_queries(list(used_queries), top)
+
+        search_loop = None
+        if use_loop:
+            search_loop = functools.partial(
+                self.__class__._search_loop,
+                queries=used_queries,
+                workers=parallel,
+                top=top,
+                duration=duration,
+                count=(
+                    math.ceil(min_queries / parallel)
+                    if min_queries is not None
+                    else None
+                ),
+                batch_size=batch_size,
+            )
+
+        warmup_queries, warmup_loop = None, None
+        if self._warmup_enabled():
+            warmup_queries = used_queries
+            if "warmup_subset" in self.search_params:
+                subset_start, subset_end = self.search_params["warmup_subset"]
+                warmup_queries = used_queries[subset_start:subset_end]
+                if len(warmup_queries) == 0:
+                    raise ValueError(
+                        f"warmup_subset {self.search_params['warmup_subset']} selects "
+                        f"none of the {len(used_queries)} queries"
+                    )
+            warmup_count = self.search_params.get("warmup_queries")
+            warmup_loop = functools.partial(
+                self.__class__._search_loop,
+                queries=warmup_queries,
+                workers=parallel,
+                top=top,
+                duration=self.search_params.get("warmup_duration"),
+                count=(
+                    math.ceil(warmup_count / parallel)
+                    if warmup_count is not None
+                    else None
+                ),
+                batch_size=batch_size,
+            )
+
+        # The warmup takes the single queries, only the timed ones are batched
+        if search_loop is None and batch_size > 1:
+            used_queries = self._query_batches(used_queries, batch_size)
+
+        warmup_stats = None
+        monitor = ClientMonitor()
+        profile = (
+            profile_path(f"{self.__class__.__name__}-search")
+            if CLIENT_PROFILE
+            else None
+        )
         if parallel == 1:
+            if warmup_loop is not None:
+                warmup_start = time.perf_counter()
+                warmup_results = warmup_loop(0)
+                warmup_stats = self._warmup_stats(
+                    warmup_results, time.perf_counter() - warmup_start
+                )
+            enable_local_profile(profile)
+            monitor.start()
             start = time.perf_counter()
-            precisions, latencies = list(
-                zip(*[search_one(query) for query in tqdm.tqdm(used_queries)])
-            )
+            if search_loop is not None:
+                precisions, latencies, ends, query_stats = self._unique_precisions(
+                    run_profiled(search_loop, 0)
+                )
+            else:
+                precisions, latencies, ends, query_stats = list(
+                    zip(
+                        *flatten(
+                            [
+                                run_profiled(search_one, query)
+                                for query in tqdm.tqdm(used_queries)
+                            ]
+                        )
+                    )
+                )
+            dump_local_profile()
         else:
             ctx = get_context(self.get_mp_start_method())
 
             with ctx.Pool(
                 processes=parallel,
-                initializer=self.__class__.init_client,
+                initializer=init_worker,
                 initargs=(
+                    ctx.Lock(),
+                    profile,
+                    self.__class__.init_client,
                     self.host,
                     distance,
                     self.connection_params,
@@ -99,16 +363,105 @@ class BaseSearcher:
             ) as pool:
                 if parallel > 10:
                     time.sleep(15)  # Wait for all processes to start
+                if warmup_loop is not None:
+                    warmup_start = time.perf_counter()
+                    warmup_results = list(
+                        itertools.chain.from_iterable(
+                            pool.map(warmup_loop, range(parallel), chunksize=1)
+                        )
+                    )
+                    warmup_stats = self._warmup_stats(
+                        warmup_results, time.perf_counter() - warmup_start
+                    )
+                monitor.start(worker_pids(pool))
                 start = time.perf_counter()
-                precisions, latencies = list(
-                    zip(*pool.imap_unordered(search_one, iterable=tqdm.tqdm(used_queries)))
-                )
+                if search_loop is not None:
+                    precisions, latencies, ends, query_stats = self._unique_precisions(
+                        itertools.chain.from_iterable(
+                            pool.map(
+                                functools.partial(run_profiled, search_loop),
+                                range(parallel),
+                                chunksize=1,
+                            )
+                        )
+                    )
+                else:
+                    precisions, latencies, ends, query_stats = list(
+                        zip(
+                            *flatten(
+                                monitor.track_completed(
+                                    pool.imap_unordered(
+                                        functools.partial(run_profiled, search_one),
+                                        iterable=monitor.track_dispatched(
+                                            tqdm.tqdm(used_queries)
+                                        ),
+                                    )
+                                )
+                            )
+                        )
+                    )
+                if profile is not None:
+                    # The profiled worker dumps its whole profile on exit, the
+                    # pool would be terminated otherwise
+                    pool.close()
+                    pool.join()
 
         total_time = time.perf_counter() - start
+        client_stats = monitor.stop()
 
         self.__class__.delete_client()
 
+        return self._search_results(
+            precisions,
+            latencies,
+            ends,
+            query_stats,
+            start,
+            total_time,
+            client_stats,
+            warmup_stats,
+        )
+
+    def _search_results(
+        self,
+        precisions: List[float],
+        latencies: List[float],
+        ends: List[float],
+        query_stats: List[Optional[dict]],
+        start: float,
+        total_time: float,
+        client_stats: dict,
+        warmup_stats: Optional[dict],
+    ) -> dict:
+        if warmup_stats is not None:
+            print(
+                f"Warmup: {warmup_stats['queries']} queries in "
+                f"{warmup_stats['total_time']:.2f}s, p99 {warmup_stats['p99_time']:.4f}s"
+            )
+
+        timeline = build_timeline(
+            (
+                (end, latency, int(latency is not None), int(latency is None))
+                for latency, end in zip(latencies, ends)
+            ),
+            start,
+        )
+        errors = sum(latency is None for latency in latencies)
+        if errors > 0:
+            print(f"{errors} of {len(latencies)} queries failed")
+            precisions = [
+                precision for precision in precisions if precision is not None
+            ]
+            latencies = [latency for latency in latencies if latency is not None]
+        if len(latencies) == 0:
+            raise RuntimeError(f"All the {errors} queries failed")
+
         return {
+            "warmup": warmup_stats,
+            "client": client_stats,
+            "transport": self.transport_info(),
+            "query_stats": self._query_stats(query_stats),
+            "batch_size": self.search_params.get("batch_size", 1),
             "total_time": total_time,
             "mean_time": np.mean(latencies),
             "mean_precisions": np.mean(precisions),
@@ -119,10 +472,85 @@ class BaseSearcher:
             "p50_time": np.percentile(latencies, 50),
             "p95_time": np.percentile(latencies, 95),
             "p99_time": np.percentile(latencies, 99),
+            "errors": errors,
+            "error_rate": errors / (len(latencies) + errors),
+            "timeline": timeline,
             "precisions": precisions,
             "latencies": latencies,
         }
 
+    @staticmethod
+    def _query_batches(queries: Iterable[Query], batch_size: int) -> Iterator[list]:
+        queries = iter(queries)
+        while True:
+            batch = list(itertools.islice(queries, batch_size))
+            if len(batch) == 0:
+                return
+            yield batch
+
+    def _warmup_enabled(self) -> bool:
+        return (
+            self.search_params.get("warmup_queries") is not None
+            or self.search_params.get("warmup_duration") is not None
+        )
+
+    @staticmethod
+    def _unique_precisions(
+        results: Iterable[Tuple[int, Optional[float], float, float, Optional[dict]]]
+    ) -> Tuple[List[float], List[float], List[float], List[Optional[dict]]]:
+        """
+        Splits the results of the search loops into the precisions of the
+        unique queries, and the latencies, completion timestamps and engine
+        stats of all the executed queries.
+        """
+        precisions, latencies, ends, query_stats = {}, [], [], []
+        for idx, precision, latency, end, stats in results:
+            if precision is not None and idx not in precisions:
+                precisions[idx] = precision
+            latencies.append(latency)
+            ends.append(end)
+            query_stats.append(stats)
+        return list(precisions.values()), latencies, ends, query_stats
+
+    @staticmethod
+    def _query_stats(query_stats: Iterable[Optional[Dict[str, float]]]):
+        """
+        Summarizes the engine specific timings of the queries, if any.
+        """
+        timings = {}
+        for stats in query_stats:
+            for name, value in (stats or {}).items():
+                timings.setdefault(name, []).append(value)
+        if len(timings) == 0:
+            return None
+        return {
+            name: {
+                "mean": np.mean(values),
+                "p50": np.percentile(values, 50),
+                "p95": np.percentile(values, 95),
+                "p99": np.percentile(values, 99),
+                "max": np.max(values),
+            }
+            for name, values in timings.items()
+        }
+
+    @staticmethod
+    def _warmup_stats(
+        results: List[Tuple[int, float, float, float, Optional[dict]]],
+        total_time: float,
+    ):
+        latencies = [latency for _, _, latency, _, _ in results if latency is not None]
+        if len(latencies) == 0:
+            return None
+        return {
+            "queries": len(latencies),
+            "total_time": total_time,
+            "mean_time": np.mean(latencies),
+            "p50_time": np.percentile(latencies, 50),
+            "p99_time": np.percentile(latencies, 99),
+            "max_time": np.max(latencies),
+        }
+
     def setup_search(self):
         pass
 
@@ -0,0 +1,180 @@
+import collections
+import json
+import statistics
+import time
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+# A shard is re-run on another worker once it takes that many times longer than
+# the median shard
+STRAGGLER_FACTOR = 2.0
+MAX_SHARD_ATTEMPTS = 3
+# Seconds to wait for a remote worker to upload a shard, before the shard is
+# considered failed and retried on another worker
+DEFAULT_SHARD_TIMEOUT = 6 * 3600.0
+
+
+class RemoteSlot:
+    """
+    Runs the shards on a remote worker started with `upload_coordinator.py serve`.
+    """
+
+    def __init__(self, url: str, index: int, timeout: float = DEFAULT_SHARD_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.name = f"{self.url}#{index}"
+        self.timeout = timeout
+
+    def run(self, engine, dataset, host, start, end, resume) -> dict:
+        request = urllib.request.Request(
+            f"{self.url}/upload",
+            data=json.dumps(
+                {
+                    "engine": engine,
+                    "dataset": dataset,
+                    "host": host,
+                    "start": start,
+                    "end": end,
+                    "resume": resume,
+                }
+            ).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            # The response is sent once the whole shard is uploaded
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                result = json.loads(response.read())
+        except (TimeoutError, urllib.error.URLError) as e:
+            raise RuntimeError(
+                f"Shard [{start}:{end}] failed on {self.url}: {e}"
+            ) from e
+        if "error" in result:
+            raise RuntimeError(f"Shard failed on {self.url}: {result['error']}")
+        return result
+
+
+def split_shards(start: int, end: int, shard_size: int) -> List[Tuple[int, int]]:
+    return [
+        (shard_start, min(shard_start + shard_size, end))
+        for shard_start in range(start, end, shard_size)
+    ]
+
+
+def run_shards(
+    slots: list,
+    shards: List[Tuple[int, int]],
+    args: Tuple[str, str, str],
+    resume: bool,
+    speculative: bool = True,
+) -> Tuple[dict, dict]:
+    """
+    Assigns the shards to the slots as soon as they become free. Once there are
+    no shards left, the stragglers are run again on the idle slots and the first
+    finished attempt is used. The speculative attempt writes the same records
+    again, so it is only enabled for the engines which overwrite the records by
+    id (`BaseUploader.OVERWRITES_BY_ID`), the others would get duplicates.
+    """
+    pending = collections.deque(shards)
+    free_slots = list(slots)
+    running = {}  # future -> (shard, slot, start time)
+    attempts = collections.Counter()
+    failed_on = collections.defaultdict(set)
+    speculated = set()
+    results = {}
+    stats = {"speculative_runs": 0, "failed_attempts": 0}
+    durations = []
+
+    def submit(shard, slot):
+        attempts[shard] += 1
+        future = threads.submit(slot.run, *args, shard[0], shard[1], resume)
+        running[future] = (shard, slot, time.perf_counter())
+
+    def pick_slot(shard):
+        # Failed shards are retried on another worker, if there is one
+        for slot in free_slots:
+            if slot.name not in failed_on[shard]:
+                return slot
+        if len(failed_on[shard]) >= len(slots):
+            return free_slots[0]
+        return None
+
+    def find_straggler() -> Optional[Tuple[int, int]]:
+        if len(durations) == 0:
+            return None
+        threshold = STRAGGLER_FACTOR * statistics.median(durations)
+        now = time.perf_counter()
+        running_shards = collections.Counter(shard for shard, _, _ in running.values())
+        for shard, _, started in running.values():
+            if (
+                shard not in speculated
+                and running_shards[shard] == 1
+                and now - started > threshold
+            ):
+                return shard
+        return None
+
+    with ThreadPoolExecutor(max_workers=len(slots)) as threads:
+        while len(results) < len(shards):
+            for shard in list(pending):
+                if not free_slots:
+                    break
+                slot = pick_slot(shard)
+                if slot is not None:
+                    pending.remove(shard)
+                    free_slots.remove(slot)
+                    submit(shard, slot)
+            while speculative and free_slots and not pending:
+                shard = find_straggler()
+                if shard is None:
+                    break
+                # Every shard is run speculatively at most once
+                speculated.add(shard)
+                slot = pick_slot(shard)
+                if slot is None:
+                    continue
+                print(f"Shard {shard} is a straggler, running it again")
+                stats["speculative_runs"] += 1
+                free_slots.remove(slot)
+                submit(shard, slot)
+
+            finished, _ = wait(list(running), timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                shard, slot, started = running.pop(future)
+                free_slots.append(slot)
+                if shard in results:
+                    continue
+                try:
+                    result = future.result()
+                except Exception:
+                    traceback.print_exc()
+                    stats["failed_attempts"] += 1
+                    failed_on[shard].add(slot.name)
+                    other_attempts = any(s == shard for s, _, _ in running.values())
+                    if other_attempts:
+                        continue
+                    if attempts[shard] >= MAX_SHARD_ATTEMPTS:
+                        raise RuntimeError(
+                            f"Shard {shard} failed {attempts[shard]} times"
+                        )
+                    pending.appendleft(shard)
+                    continue
+                durations.append(time.perf_counter() - started)
+                results[shard] = {
+                    "start_idx": shard[0],
+                    "end_idx": shard[1],
+                    "worker": slot.name,
+                    "attempts": attempts[shard],
+                    **result,
+                }
+                print(
+                    f"Shard {shard} uploaded by {slot.name}, {len(results)}/{len(shards)} done"
+                )
+        upload_finished = time.perf_counter()
+        if running:
+            # Let the speculative attempts finish, before the index is built
+            print(f"Waiting for {len(running)} speculative attempts to finish")
+            wait(list(running))
+    stats["upload_finished"] = upload_finished
+    return results, stats
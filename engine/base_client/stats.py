@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Metrics of a single search run which are combined across repetitions
+AGGREGATED_METRICS = [
+    "rps",
+    "mean_time",
+    "p50_time",
+    "p95_time",
+    "p99_time",
+    "mean_precisions",
+]
+
+
+def bootstrap_ci(
+    values: Sequence[float],
+    confidence: float = 0.95,
+    n_resamples: int = 1000,
+    seed: Optional[int] = 0,
+) -> Tuple[float, float]:
+    """
+    Percentile bootstrap confidence interval for the mean of the values.
+    A single value produces a degenerate interval.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return float(values[0]), float(values[0])
+    rng = np.random.default_rng(seed)
+    samples = rng.choice(values, size=(n_resamples, len(values)), replace=True)
+    means = samples.mean(axis=1)
+    alpha = (1.0 - confidence) / 2.0
+    low, high = np.quantile(means, [alpha, 1.0 - alpha])
+    return float(low), float(high)
+
+
+def detect_outliers(values: Sequence[float], threshold: float = 3.5) -> List[int]:
+    """
+    Returns the indexes of the outliers, based on the modified z-score which
+    uses median absolute deviation and therefore works for a few samples.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 3:
+        return []
+    median = np.median(values)
+    mad = np.median(np.abs(values - median))
+    if mad == 0:
+        return []
+    modified_z_scores = 0.6745 * (values - median) / mad
+    return [int(idx) for idx in np.where(np.abs(modified_z_scores) > threshold)[0]]
+
+
+def aggregate_repetitions(
+    repetitions: List[dict],
+    confidence: float = 0.95,
+    outlier_threshold: float = 3.5,
+) -> Dict[str, dict]:
+    """
+    Combines the stats of several repetitions of the same search configuration.
+    Outliers are detected with the rps values and are excluded from the
+    aggregates, as long as at least two repetitions remain.
+    """
+    rps = [repetition["rps"] for repetition in repetitions]
+    outliers = detect_outliers(rps, outlier_threshold)
+    used = [
+        repetition for idx, repetition in enumerate(repetitions) if idx not in outliers
+    ]
+    if len(used) < 2:
+        used = repetitions
+
+    metrics = {}
+    for metric in AGGREGATED_METRICS:
+        values = [repetition[metric] for repetition in used if metric in repetition]
+        if len(values) == 0:
+            continue
+        ci_low, ci_high = bootstrap_ci(values, confidence)
+        metrics[metric] = {
+            "mean": float(np.mean(values)),
+            "median": float(np.median(values)),
+            "std": float(np.std(values)),
+            "ci_low": ci_low,
+            "ci_high": ci_high,
+        }
+
+    return {
+        "repetitions": len(repetitions),
+        "used_repetitions": len(used),
+        "outliers": outliers,
+        "confidence": confidence,
+        "metrics": metrics,
+    }
@@ -0,0 +1,49 @@
+import os
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# Width of a single timeline bucket, in seconds
+TIMELINE_INTERVAL = float(os.getenv("TIMELINE_INTERVAL", 1.0))
+
+# (end timestamp, latency, number of vectors, number of errors)
+TimelineEvent = Tuple[float, float, int, int]
+
+
+def build_timeline(
+    events: Iterable[TimelineEvent],
+    start: float,
+    interval: float = TIMELINE_INTERVAL,
+) -> List[dict]:
+    """
+    Groups the operations into fixed-width buckets by their completion time,
+    relative to the start of the measured phase. Timestamps come from
+    time.perf_counter, which uses a system-wide monotonic clock on Linux, so
+    the events reported by different worker processes are comparable.
+    """
+    buckets = {}
+    for end, latency, vectors, errors in events:
+        bucket = max(int((end - start) // interval), 0)
+        buckets.setdefault(bucket, []).append((latency, vectors, errors))
+
+    if len(buckets) == 0:
+        return []
+
+    timeline = []
+    for bucket in range(max(buckets) + 1):
+        entries = buckets.get(bucket, [])
+        # Failed operations may have no latency
+        latencies = [latency for latency, _, _ in entries if latency is not None]
+        vectors = sum(vectors for _, vectors, _ in entries)
+        timeline.append(
+            {
+                "time": bucket * interval,
+                "operations": len(entries),
+                "vectors": vectors,
+                "vectors_per_second": vectors / interval,
+                "p50_time": float(np.percentile(latencies, 50)) if latencies else None,
+                "p99_time": float(np.percentile(latencies, 99)) if latencies else None,
+                "errors": sum(errors for _, _, errors in entries),
+            }
+        )
+    return timeline
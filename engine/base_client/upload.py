@@ -1,15 +1,48 @@
+import collections
+import functools
+import os
+import random
 import time
 from multiprocessing import get_context
-from typing import Iterable, List, Optional, Tuple
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import tqdm
 
 from dataset_reader.base_reader import Record
+from engine.base_client.batching import AdaptiveBatchSize
+from engine.base_client.checkpoint import UploadCheckpoint
+from engine.base_client.profiling import (
+    CLIENT_PROFILE,
+    ClientMonitor,
+    dump_local_profile,
+    enable_local_profile,
+    init_worker,
+    profile_path,
+    run_profiled,
+    worker_pids,
+)
+from engine.base_client.resources import RESOURCE_MONITOR
+from engine.base_client.timeline import build_timeline
 from engine.base_client.utils import iter_batches
 
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", 5))
+UPLOAD_RETRY_BASE_DELAY = float(os.getenv("UPLOAD_RETRY_BASE_DELAY", 1.0))
+UPLOAD_RETRY_MAX_DELAY = float(os.getenv("UPLOAD_RETRY_MAX_DELAY", 60.0))
+UPLOAD_RETRY_MAX_TIME = float(os.getenv("UPLOAD_RETRY_MAX_TIME", 600.0))
+
 
 class BaseUploader:
     client = None
+    # Exceptions raised by upload_batch, after which the batch is sent again.
+    # Only transport errors are retried, other ones are bugs or rejections
+    # which fail again. Engines extend the tuple with the errors of their
+    # clients, and empty it when a batch sent twice is not overwritten by id.
+    RETRYABLE_EXCEPTIONS: Tuple[type, ...] = (ConnectionError, TimeoutError)
+    # None means the retries are bounded by UPLOAD_RETRY_MAX_TIME only
+    MAX_RETRIES: Optional[int] = UPLOAD_MAX_RETRIES
+    # Whether a record written again overwrites the stored one, instead of
+    # failing on the duplicate id or being stored twice
+    OVERWRITES_BY_ID: bool = True
 
     def __init__(self, host, connection_params, upload_params):
         self.host = host
@@ -28,77 +61,272 @@ class BaseUploader:
         self,
         distance,
         records: Iterable[Record],
+        checkpoint: Optional[UploadCheckpoint] = None,
+        with_post_upload: bool = True,
     ) -> dict:
-        latencies = []
+        results = []
+        # last ids of the batches sent to the workers, in the order of sending
+        pending_ids = collections.deque()
         start = time.perf_counter()
         parallel = self.upload_params.get("parallel", 1)
         batch_size = self.upload_params.get("batch_size", 64)
+        adaptive = None
+        if self.upload_params.get("adaptive_batch"):
+            adaptive_config = self.upload_params["adaptive_batch"]
+            adaptive = AdaptiveBatchSize(
+                adaptive_config if isinstance(adaptive_config, dict) else {},
+                batch_size,
+            )
 
         self.init_client(
             self.host, distance, self.connection_params, self.upload_params
         )
+        pre_upload_stats = self.pre_upload(distance)
 
+        monitor = ClientMonitor()
+        profile = (
+            profile_path(f"{self.__class__.__name__}-upload")
+            if CLIENT_PROFILE
+            else None
+        )
+        batches = self._track_last_ids(
+            iter_batches(
+                tqdm.tqdm(records),
+                adaptive.next_size if adaptive is not None else batch_size,
+            ),
+            pending_ids,
+        )
         if parallel == 1:
-            for batch in iter_batches(tqdm.tqdm(records), batch_size):
-                latencies.append(self._upload_batch(batch))
+            enable_local_profile(profile)
+            monitor.start()
+            try:
+                for batch in batches:
+                    results.append(run_profiled(self._upload_batch, batch))
+                    self._acknowledge(checkpoint, pending_ids, results[-1])
+                    self._adapt(adaptive, len(results) - 1, results[-1])
+            except Exception as e:
+                if checkpoint is not None:
+                    checkpoint.save()
+                raise e
+            dump_local_profile()
         else:
             ctx = get_context(self.get_mp_start_method())
             with ctx.Pool(
                 processes=int(parallel),
-                initializer=self.__class__.init_client,
+                initializer=init_worker,
                 initargs=(
+                    ctx.Lock(),
+                    profile,
+                    self.__class__.init_client,
                     self.host,
                     distance,
                     self.connection_params,
                     self.upload_params,
                 ),
             ) as pool:
-                try:
-                    latencies = list(
-                        pool.imap(
-                            self.__class__._upload_batch,
-                            iter_batches(tqdm.tqdm(records), batch_size),
-                        )
+                monitor.start(worker_pids(pool))
+                task = functools.partial(run_profiled, self.__class__._upload_batch)
+                if adaptive is None:
+                    batch_results = pool.imap(task, monitor.track_dispatched(batches))
+                else:
+                    # Batches have to be created only when there is a free
+                    # worker, so their size follows the latest feedback
+                    batch_results = self._imap_bounded(
+                        pool,
+                        task,
+                        monitor.track_dispatched(batches),
+                        self.upload_params.get("max_in_flight", 2 * int(parallel)),
                     )
+                try:
+                    # Results keep the order of the batches, so every result
+                    # acknowledges all the batches sent before
+                    for result in monitor.track_completed(batch_results):
+                        results.append(result)
+                        self._acknowledge(checkpoint, pending_ids, result)
+                        self._adapt(adaptive, len(results) - 1, result)
                 except Exception as e:
+                    if checkpoint is not None:
+                        checkpoint.save()
                     raise e
+                if profile is not None:
+                    # The profiled worker dumps its whole profile on exit, the
+                    # pool would be terminated otherwise
+                    pool.close()
+                    pool.join()
 
-        upload_time = time.perf_counter() - start
+        batch_stats = self._batch_stats(stats for *_, stats in results)
+        barrier_stats = self.upload_barrier(
+            sum(size for _, _, size, _, _ in results), batch_stats
+        )
+        upload_end = (barrier_stats or {}).pop("completed_at", None)
+        upload_time = (upload_end or time.perf_counter()) - start
+        client_stats = monitor.stop()
+        latencies = [latency for latency, _, _, _, _ in results]
+        timeline = build_timeline(
+            ((end, latency, size, errors) for latency, end, size, errors, _ in results),
+            start,
+        )
+        if checkpoint is not None:
+            checkpoint.save()
 
         print("Upload time: {}".format(upload_time))
 
-        post_upload_stats = self.post_upload(distance)
+        post_upload_stats = {}
+        if with_post_upload:
+            RESOURCE_MONITOR.set_phase("post_upload")
+            post_upload_stats = self.post_upload(distance)
 
-        total_time = time.perf_counter() - start
+        total_time = self.index_ready_at(post_upload_stats) - start
 
         print(f"Total import time: {total_time}")
+        if checkpoint is not None:
+            checkpoint.complete()
 
         memory_usage = self.get_memory_usage()
         self.delete_client()
 
         return {
+            "pre_upload": pre_upload_stats,
             "post_upload": post_upload_stats,
+            "barrier": barrier_stats,
             "upload_time": upload_time,
             "total_time": total_time,
             "latencies": latencies,
+            "timeline": timeline,
+            "client": client_stats,
+            "retries": sum(errors for _, _, _, errors, _ in results),
+            "batch_stats": batch_stats,
             "parallel": parallel,
-            "batch_size": batch_size,
+            "batch_size": adaptive.size if adaptive is not None else batch_size,
+            "batch_sizes": adaptive.history if adaptive is not None else None,
             "memory_usage": memory_usage,
         }
 
+    @staticmethod
+    def _track_last_ids(
+        batches: Iterable[list], pending_ids: Deque[int]
+    ) -> Iterator[list]:
+        for batch in batches:
+            pending_ids.append(batch[0][-1])
+            yield batch
+
+    @staticmethod
+    def _acknowledge(
+        checkpoint: Optional[UploadCheckpoint], pending_ids: Deque[int], result
+    ):
+        last_id = pending_ids.popleft()
+        if checkpoint is not None:
+            checkpoint.update(last_id, result[2])
+
+    @staticmethod
+    def _adapt(adaptive: Optional[AdaptiveBatchSize], batch_number: int, result):
+        if adaptive is not None:
+            latency, _, size, errors, _ = result
+            adaptive.feedback(batch_number, latency, size, errors)
+
+    @staticmethod
+    def _imap_bounded(pool, func, iterable: Iterable, max_in_flight: int) -> Iterator:
+        """
+        Ordered results of func, with at most max_in_flight items taken from
+        the iterable and not returned yet.
+        """
+        in_flight = collections.deque()
+        for item in iterable:
+            in_flight.append(pool.apply_async(func, (item,)))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().get()
+        while in_flight:
+            yield in_flight.popleft().get()
+
+    @staticmethod
+    def _batch_stats(batch_stats: Iterable[Optional[Dict[str, int]]]):
+        """
+        Sums the engine specific counters of the batches, if any. Lists, e.g.
+        of the ids of the tasks started by the engine, are concatenated.
+        """
+        totals = {}
+        for stats in batch_stats:
+            for name, value in (stats or {}).items():
+                totals[name] = totals[name] + value if name in totals else value
+        return totals or None
+
     @classmethod
     def _upload_batch(
         cls, batch: Tuple[List[int], List[list], List[Optional[dict]]]
-    ) -> float:
+    ) -> Tuple[float, float, int, int, Optional[Dict[str, int]]]:
+        """
+        Returns the latency, the completion timestamp, the size of the batch,
+        the number of failed attempts and the engine counters of the batch.
+        Failed attempts are retried with exponential backoff.
+        """
         ids, vectors, metadata = batch
         start = time.perf_counter()
-        cls.upload_batch(ids, vectors, metadata)
-        return time.perf_counter() - start
+        retries = 0
+        while True:
+            try:
+                cls.upload_batch(ids, vectors, metadata)
+                break
+            except cls.RETRYABLE_EXCEPTIONS as e:
+                elapsed = time.perf_counter() - start
+                if (
+                    cls.MAX_RETRIES is not None and retries >= cls.MAX_RETRIES
+                ) or elapsed >= UPLOAD_RETRY_MAX_TIME:
+                    raise e
+                # Jitter spreads the retries of the workers failed at once
+                delay = min(
+                    UPLOAD_RETRY_BASE_DELAY * 2**retries, UPLOAD_RETRY_MAX_DELAY
+                ) * random.uniform(0.5, 1.5)
+                retries += 1
+                print(
+                    f"Upload of batch failed on try #{retries}, retrying in {delay:.1f}s: {e}"
+                )
+                time.sleep(delay)
+        end = time.perf_counter()
+        return end - start, end, len(ids), retries, cls.pop_batch_stats()
+
+    @classmethod
+    def pop_batch_stats(cls) -> Optional[Dict[str, int]]:
+        """
+        Engine specific counters of the `upload_batch` calls since the last
+        pop, e.g. the documents rejected by the engine. They are summed in the
+        `batch_stats` of the results.
+        """
+        return None
+
+    @classmethod
+    def pre_upload(cls, distance) -> dict:
+        """
+        Prepares the collection for the bulk load, e.g. disables the periodic
+        refreshes. Called before the first batch is sent, the changes are
+        reverted by post_upload.
+        """
+        return {}
+
+    @classmethod
+    def upload_barrier(
+        cls, uploaded: int, batch_stats: Optional[dict] = None
+    ) -> Optional[dict]:
+        """
+        Waits until the uploaded points are stored, for engines which
+        acknowledge the writes before applying them. Called once all the
+        batches are sent, before the upload time is measured, with the number
+        of uploaded points and the summed `pop_batch_stats` of the batches.
+        """
+        return None
 
     @classmethod
     def post_upload(cls, distance):
         return {}
 
+    @staticmethod
+    def index_ready_at(post_upload_stats: dict) -> float:
+        """
+        Timestamp of the index readiness, interpolated by the readiness wait
+        of post_upload if there was any, otherwise the current time.
+        """
+        readiness = post_upload_stats.get("readiness") or {}
+        return readiness.pop("completed_at", None) or time.perf_counter()
+
     @classmethod
     def get_memory_usage(cls):
         return {}
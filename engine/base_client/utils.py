@@ -1,9 +1,16 @@
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, Union
 
 from dataset_reader.base_reader import Record
 
 
-def iter_batches(records: Iterable[Record], n: int) -> Iterable[Any]:
+def iter_batches(
+    records: Iterable[Record], n: Union[int, Callable[[], int]]
+) -> Iterable[Any]:
+    """
+    If n is callable, it is called to get the size of every next batch.
+    """
+    next_size = n if callable(n) else lambda: n
+    size = next_size()
     ids = []
     vectors = []
     metadata = []
@@ -13,8 +20,9 @@ def iter_batches(records: Iterable[Record], n: int) -> Iterable[Any]:
         vectors.append(record.vector)
         metadata.append(record.metadata)
 
-        if len(vectors) >= n:
+        if len(vectors) >= size:
             yield [ids, vectors, metadata]
             ids, vectors, metadata = [], [], []
+            size = next_size()
     if len(ids) > 0:
         yield [ids, vectors, metadata]
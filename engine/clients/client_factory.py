@@ -24,7 +24,12 @@ from engine.clients.pgvector import (
     PgVectorUploader,
 )
 from engine.clients.qdrant import QdrantConfigurator, QdrantSearcher, QdrantUploader
-from engine.clients.redis import RedisConfigurator, RedisSearcher, RedisUploader
+from engine.clients.redis import (
+    RedisAsyncSearcher,
+    RedisConfigurator,
+    RedisSearcher,
+    RedisUploader,
+)
 from engine.clients.weaviate import (
     WeaviateConfigurator,
     WeaviateSearcher,
@@ -38,6 +43,7 @@ ENGINE_CONFIGURATORS = {
     "elasticsearch": ElasticConfigurator,
     "opensearch": OpenSearchConfigurator,
     "redis": RedisConfigurator,
+    "redis-async": RedisConfigurator,
     "pgvector": PgVectorConfigurator,
 }
 
@@ -48,6 +54,7 @@ ENGINE_UPLOADERS = {
     "elasticsearch": ElasticUploader,
     "opensearch": OpenSearchUploader,
     "redis": RedisUploader,
+    "redis-async": RedisUploader,
     "pgvector": PgVectorUploader,
 }
 
@@ -58,6 +65,7 @@ ENGINE_SEARCHERS = {
     "elasticsearch": ElasticSearcher,
     "opensearch": OpenSearchSearcher,
     "redis": RedisSearcher,
+    "redis-async": RedisAsyncSearcher,
     "pgvector": PgVectorSearcher,
 }
 
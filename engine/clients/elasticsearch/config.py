@@ -1,8 +1,10 @@
 import os
+import elastic_transport
 import urllib3
-import time
 from elasticsearch import Elasticsearch
 
+from engine.base_client.readiness import ReadinessWait
+
 ELASTIC_PORT = int(os.getenv("ELASTIC_PORT", 9200))
 ELASTIC_INDEX = os.getenv("ELASTIC_INDEX", "bench")
 ELASTIC_USER = os.getenv("ELASTIC_USER", "elastic")
@@ -46,14 +48,30 @@ def get_es_client(host, connection_params):
     return client
 
 
-def _wait_for_es_status(client, status="yellow"):
+ES_STATUS_RANK = {"red": 0, "yellow": 1, "green": 2}
+
+
+def _es_status(client, index=None) -> dict:
+    try:
+        sample = {"status": client.cluster.health()["status"]}
+    except (ConnectionError, elastic_transport.ConnectionError):
+        return {"status": None}
+    if index is not None:
+        stats = client.indices.stats(index=index, metric="segments")
+        sample["segments"] = stats["_all"]["primaries"]["segments"]["count"]
+    return sample
+
+
+def _wait_for_es_status(client, status="yellow", index=None) -> dict:
+    """
+    Waits for the cluster health status, recording the number of segments of
+    the index, if given, on every poll.
+    """
     print(f"waiting for ES {status} status...")
-    for _ in range(100):
-        try:
-            client.cluster.health(wait_for_status=status)
-            return client
-        except ConnectionError:
-            time.sleep(0.1)
-    else:
-        # timeout
-        raise Exception("Elasticsearch failed to start.")
+    return ReadinessWait(
+        lambda: _es_status(client, index),
+        lambda sample: ES_STATUS_RANK.get(sample["status"], -1)
+        >= ES_STATUS_RANK[status],
+        name=f"ES {status} status",
+        timeout=ELASTIC_TIMEOUT,
+    ).wait()
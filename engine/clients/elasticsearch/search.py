@@ -1,14 +1,22 @@
 import copy
 import multiprocessing as mp
-import uuid
 from typing import List, Tuple
 
 from elasticsearch import Elasticsearch
 
+from engine.base_client.bulk import parse_doc_id
 from engine.base_client.search import BaseSearcher
 from engine.clients.elasticsearch.config import ELASTIC_INDEX, get_es_client
 from engine.clients.elasticsearch.parser import ElasticConditionParser
 
+SEARCH_FILTER_PATH = ["hits.hits._id", "hits.hits._score"]
+# Status keeps the responses without hits in the list
+MSEARCH_FILTER_PATH = [
+    "responses.status",
+    "responses.error",
+    *(f"responses.{path}" for path in SEARCH_FILTER_PATH),
+]
+
 
 class ClosableElastic(Elasticsearch):
     def __del__(self):
@@ -35,12 +43,11 @@ class ElasticSearcher(BaseSearcher):
             **connection_params,
         }
         cls.client = get_es_client(host, connection_params)
-        cls.search_params = copy.deepcopy(search_params)
-        # pop parallel
-        cls.search_params.pop("parallel", "1")
+        # The params which are not of the benchmark are passed to the knn query
+        cls.search_params = copy.deepcopy(cls.engine_params(search_params))
 
     @classmethod
-    def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
+    def _knn(cls, vector, meta_conditions, top) -> dict:
         knn = {
             "field": "vector",
             "query_vector": vector,
@@ -51,13 +58,49 @@ class ElasticSearcher(BaseSearcher):
         meta_conditions = cls.parser.parse(meta_conditions)
         if meta_conditions:
             knn["filter"] = meta_conditions
+        return knn
 
+    @staticmethod
+    def _parse_hits(res) -> List[Tuple[int, float]]:
+        # Queries without any hit have no hits left after the filter_path
+        return [
+            (parse_doc_id(hit["_id"]), hit["_score"])
+            for hit in res.get("hits", {}).get("hits", [])
+        ]
+
+    @classmethod
+    def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
         res = cls.client.search(
             index=ELASTIC_INDEX,
-            knn=knn,
+            knn=cls._knn(vector, meta_conditions, top),
             size=top,
+            source=False,
+            filter_path=SEARCH_FILTER_PATH,
         )
-        return [
-            (uuid.UUID(hex=hit["_id"]).int, hit["_score"])
-            for hit in res["hits"]["hits"]
-        ]
+        return cls._parse_hits(res)
+
+    @classmethod
+    def search_batch(
+        cls, vectors, meta_conditions, top
+    ) -> List[List[Tuple[int, float]]]:
+        searches = []
+        for vector, conditions in zip(vectors, meta_conditions):
+            searches.append({})
+            searches.append(
+                {
+                    "knn": cls._knn(vector, conditions, top),
+                    "size": top,
+                    "_source": False,
+                }
+            )
+        res = cls.client.msearch(
+            index=ELASTIC_INDEX,
+            searches=searches,
+            filter_path=MSEARCH_FILTER_PATH,
+        )
+        results = []
+        for response in res["responses"]:
+            if "error" in response:
+                raise RuntimeError(f"msearch query failed: {response['error']}")
+            results.append(cls._parse_hits(response))
+        return results
@@ -1,13 +1,12 @@
-import multiprocessing as mp
-import uuid
-from typing import List, Optional
+from elasticsearch import ConnectionError as ElasticConnectionError
+from elasticsearch import ConnectionTimeout, Elasticsearch
+from elasticsearch.helpers import BulkIndexError, parallel_bulk, streaming_bulk
 
-import elastic_transport
-from elasticsearch import Elasticsearch, ApiError
-
-from engine.base_client.upload import BaseUploader
+from engine.base_client.bulk import BaseBulkUploader, wait_for_merge
+from engine.base_client.resources import RESOURCE_MONITOR
 from engine.clients.elasticsearch.config import (
     ELASTIC_INDEX,
+    ELASTIC_INDEX_REFRESH_INTERVAL,
     get_es_client,
     _wait_for_es_status,
 )
@@ -18,58 +17,48 @@ class ClosableElastic(Elasticsearch):
         self.close()
 
 
-class ElasticUploader(BaseUploader):
+class ElasticUploader(BaseBulkUploader):
     client: Elasticsearch = None
-    upload_params = {}
-
-    @classmethod
-    def get_mp_start_method(cls):
-        return "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    INDEX = ELASTIC_INDEX
+    BULK_HELPERS = {"streaming": streaming_bulk, "parallel": parallel_bulk}
+    BULK_INDEX_ERROR = BulkIndexError
+    TRANSPORT_ERRORS = (ElasticConnectionError, ConnectionTimeout)
+    RETRYABLE_EXCEPTIONS = (*BaseBulkUploader.RETRYABLE_EXCEPTIONS, *TRANSPORT_ERRORS)
 
     @classmethod
     def init_client(cls, host, distance, connection_params, upload_params):
         cls.client = get_es_client(host, connection_params)
-        cls.upload_params = upload_params
+        cls.init_bulk(upload_params)
 
     @classmethod
-    def upload_batch(
-        cls, ids: List[int], vectors: List[list], metadata: Optional[List[dict]]
-    ):
-        if metadata is None:
-            metadata = [{}] * len(vectors)
-        operations = []
-        for idx, vector, payload in zip(ids, vectors, metadata):
-            vector_id = uuid.UUID(int=idx).hex
-            operations.append({"index": {"_id": vector_id}})
-            if payload:
-                operations.append({"vector": vector, **payload})
-            else:
-                operations.append({"vector": vector})
-
-        cls.client.bulk(
-            index=ELASTIC_INDEX,
-            operations=operations,
+    def pre_upload(cls, _distance):
+        # The documents become searchable at once, with the refresh in post_upload
+        cls.client.indices.put_settings(
+            index=ELASTIC_INDEX, settings={"index": {"refresh_interval": "-1"}}
         )
+        return {}
 
     @classmethod
     def post_upload(cls, _distance):
+        cls.client.indices.put_settings(
+            index=ELASTIC_INDEX,
+            settings={"index": {"refresh_interval": ELASTIC_INDEX_REFRESH_INTERVAL}},
+        )
+        cls.client.indices.refresh(index=ELASTIC_INDEX)
         print("forcing the merge into 1 segment...")
-        tries = 30
-        for i in range(tries + 1):
-            try:
-                cls.client.indices.forcemerge(
-                    index=ELASTIC_INDEX, wait_for_completion=True, max_num_segments=1
-                )
-            except (elastic_transport.TlsError, ApiError) as e:
-                if i < tries:  # i is zero indexed
-                    print(
-                        "Received the following error during retry {}/{} while waiting for ES index to be ready... {}".format(
-                            i, tries, e.__str__()
-                        )
-                    )
-                    continue
-                else:
-                    raise
-            _wait_for_es_status(cls.client)
-            break
-        return {}
+        RESOURCE_MONITOR.set_phase("forcemerge")
+        res = cls.client.indices.forcemerge(
+            index=ELASTIC_INDEX, wait_for_completion=False, max_num_segments=1
+        )
+        merge_stats = wait_for_merge(
+            cls.client,
+            res.get("task"),
+            ELASTIC_INDEX,
+            cls.TRANSPORT_ERRORS,
+            name="ES forcemerge",
+        )
+        RESOURCE_MONITOR.set_phase("post_upload")
+        return {
+            "merge": merge_stats,
+            "readiness": _wait_for_es_status(cls.client, index=ELASTIC_INDEX),
+        }
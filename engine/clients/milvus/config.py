@@ -1,5 +1,8 @@
-from pymilvus import DataType, connections
 import os
+
+import numpy as np
+from pymilvus import DataType, connections
+
 from engine.base_client.distances import Distance
 
 MILVUS_COLLECTION_NAME = "Benchmark"
@@ -8,6 +11,10 @@ MILVUS_DEFAULT_PORT = "19530"
 MILVUS_PASS = os.getenv("MILVUS_PASS", "")
 MILVUS_USER = os.getenv("MILVUS_USER", "")
 MILVUS_PORT = os.getenv("MILVUS_PORT", MILVUS_DEFAULT_PORT)
+# Object storage of Milvus, for the files of the bulk insert
+MILVUS_MINIO_ACCESS_KEY = os.getenv("MILVUS_MINIO_ACCESS_KEY", "minioadmin")
+MILVUS_MINIO_SECRET_KEY = os.getenv("MILVUS_MINIO_SECRET_KEY", "minioadmin")
+MILVUS_MINIO_BUCKET = os.getenv("MILVUS_MINIO_BUCKET", "a-bucket")
 
 DISTANCE_MAPPING = {
     Distance.L2: "L2",
@@ -26,6 +33,15 @@ DTYPE_DEFAULT = {
     DataType.INT64: 0,
     DataType.VARCHAR: "---MILVUS DOES NOT ACCEPT EMPTY STRINGS---",
     DataType.FLOAT: 0.0,
+    DataType.DOUBLE: 0.0,
+}
+
+# Types of the columns written for the bulk insert
+NUMPY_DTYPES = {
+    DataType.INT64: np.int64,
+    DataType.VARCHAR: np.str_,
+    DataType.FLOAT: np.float32,
+    DataType.DOUBLE: np.float64,
 }
 
 
@@ -1,8 +1,11 @@
+import dataclasses
+import functools
 import multiprocessing as mp
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
-from pymilvus import Collection, connections
+from pymilvus import Collection, MilvusException, connections
 
+from dataset_reader.base_reader import Query
 from engine.base_client.search import BaseSearcher
 from engine.clients.milvus.config import (
     DISTANCE_MAPPING,
@@ -19,6 +22,9 @@ class MilvusSearcher(BaseSearcher):
     collection: Collection = None
     distance: str = None
     parser = MilvusConditionParser()
+    # collection.search with all the params of the run bound
+    search: Callable = None
+    SEARCH_ERRORS = (MilvusException,)
 
     @classmethod
     def init_client(cls, host, distance, connection_params: dict, search_params: dict):
@@ -26,28 +32,54 @@ class MilvusSearcher(BaseSearcher):
         cls.collection = Collection(MILVUS_COLLECTION_NAME, using=MILVUS_DEFAULT_ALIAS)
         cls.search_params = search_params
         cls.distance = DISTANCE_MAPPING[distance]
+        consistency = {}
+        if "consistency_level" in search_params:
+            consistency["consistency_level"] = search_params["consistency_level"]
+        cls.search = functools.partial(
+            cls.collection.search,
+            anns_field="vector",
+            param={"metric_type": cls.distance, "params": search_params["params"]},
+            # Only the ids and the distances
+            output_fields=[],
+            **consistency,
+        )
 
     @classmethod
     def get_mp_start_method(cls):
         return "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
 
     @classmethod
-    def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
-        param = {"metric_type": cls.distance, "params": cls.search_params["params"]}
-        try:
-            res = cls.collection.search(
-                data=[vector],
-                anns_field="vector",
-                param=param,
-                limit=top,
-                expr=cls.parser.parse(meta_conditions),
-            )
-        except Exception as e:
-            import ipdb
-
-            ipdb.set_trace()
-            print("param: ", param)
-
-            raise e
+    def _expr(cls, meta_conditions):
+        if meta_conditions is None:
+            return None
+        return cls.parser.parse(meta_conditions)
+
+    @classmethod
+    def prepare_queries(cls, queries: List[Query], top: Optional[int]) -> List[Query]:
+        # The filters are searched as the boolean expressions of Milvus
+        return [
+            dataclasses.replace(query, meta_conditions=cls._expr(query.meta_conditions))
+            for query in queries
+        ]
 
+    @classmethod
+    def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
+        res = cls.search(data=[vector], limit=top, expr=meta_conditions)
         return list(zip(res[0].ids, res[0].distances))
+
+    @classmethod
+    def search_batch(
+        cls, vectors, meta_conditions, top
+    ) -> List[List[Tuple[int, float]]]:
+        # A single search accepts a single filter, so the queries are grouped
+        # by their expressions
+        groups = {}
+        for i, expr in enumerate(meta_conditions):
+            groups.setdefault(expr, []).append(i)
+
+        results = [None] * len(vectors)
+        for expr, indices in groups.items():
+            res = cls.search(data=[vectors[i] for i in indices], limit=top, expr=expr)
+            for i, hits in zip(indices, res):
+                results[i] = list(zip(hits.ids, hits.distances))
+        return results
@@ -1,30 +1,72 @@
-import logging
 import multiprocessing as mp
-from typing import List, Optional
-import backoff
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
 
+import boto3
+import numpy as np
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import BotoCoreError, ClientError
 from pymilvus import (
+    BulkInsertState,
     Collection,
+    FieldSchema,
     MilvusException,
     connections,
+    utility,
     wait_for_index_building_complete,
 )
 
+from engine.base_client.readiness import ReadinessWait
 from engine.base_client.upload import BaseUploader
 from engine.clients.milvus.config import (
     DISTANCE_MAPPING,
     DTYPE_DEFAULT,
     MILVUS_COLLECTION_NAME,
     MILVUS_DEFAULT_ALIAS,
+    MILVUS_MINIO_ACCESS_KEY,
+    MILVUS_MINIO_BUCKET,
+    MILVUS_MINIO_SECRET_KEY,
+    NUMPY_DTYPES,
     get_milvus_client,
 )
 
 
+class BulkInsertRequestError(Exception):
+    """
+    The import request failed, possibly after the import task was created.
+    It is not retried, as a second task would import the same rows again.
+    """
+
+
+class BulkInsertFileError(Exception):
+    """
+    Writing or transferring the files of a batch failed. The batch is retried,
+    its files are overwritten and no import task was requested yet.
+    """
+
+
+# Errors of the local files and of the transfers to the MinIO bucket
+FILE_ERRORS = (OSError, BotoCoreError, ClientError, S3UploadFailedError)
+
+
 class MilvusUploader(BaseUploader):
     client = None
     upload_params = {}
     collection: Collection = None
     distance: str = None
+    # Schema of the payload columns, in the order of the collection
+    payload_fields: List[FieldSchema] = []
+    bulk_insert_params: Optional[dict] = None
+    s3 = None
+    batch_stats: Dict[str, float] = {}
+    RETRYABLE_EXCEPTIONS = (MilvusException, BulkInsertFileError)
+    # Inserts are retried until UPLOAD_RETRY_MAX_TIME is exceeded
+    MAX_RETRIES = None
+    # An insert of an existing primary key adds a duplicate entity
+    OVERWRITES_BY_ID = False
 
     @classmethod
     def get_mp_start_method(cls):
@@ -36,33 +78,172 @@ class MilvusUploader(BaseUploader):
         cls.collection = Collection(MILVUS_COLLECTION_NAME, using=MILVUS_DEFAULT_ALIAS)
         cls.upload_params = upload_params
         cls.distance = DISTANCE_MAPPING[distance]
+        cls.payload_fields = [
+            field_schema
+            for field_schema in cls.collection.schema.fields
+            if field_schema.name not in ["id", "vector"]
+        ]
+        cls.bulk_insert_params = upload_params.get("bulk_insert")
+        if cls.bulk_insert_params is not None and "endpoint" in cls.bulk_insert_params:
+            cls.s3 = boto3.client(
+                "s3",
+                endpoint_url=cls.bulk_insert_params["endpoint"],
+                aws_access_key_id=MILVUS_MINIO_ACCESS_KEY,
+                aws_secret_access_key=MILVUS_MINIO_SECRET_KEY,
+            )
+        cls.batch_stats = {}
+
+    @classmethod
+    def _payload_columns(cls, metadata: Optional[List[dict]]) -> List[list]:
+        if metadata is None:
+            return []
+        return [
+            [
+                payload.get(field_schema.name) or DTYPE_DEFAULT[field_schema.dtype]
+                for payload in metadata
+            ]
+            for field_schema in cls.payload_fields
+        ]
 
     @classmethod
     def upload_batch(
         cls, ids: List[int], vectors: List[list], metadata: Optional[List[dict]]
     ):
-        if metadata is not None:
-            field_values = [
-                [
-                    payload.get(field_schema.name) or DTYPE_DEFAULT[field_schema.dtype]
-                    for payload in metadata
-                ]
-                for field_schema in cls.collection.schema.fields
-                if field_schema.name not in ["id", "vector"]
-            ]
-        else:
-            field_values = []
-        cls.upload_with_backoff(field_values, ids, vectors)
+        if cls.bulk_insert_params is not None:
+            cls._bulk_insert(ids, vectors, metadata)
+            return
+        cls.collection.insert([ids, vectors] + cls._payload_columns(metadata))
+
+    @classmethod
+    def _write_columns(
+        cls,
+        directory: str,
+        ids: List[int],
+        vectors: List[list],
+        metadata: Optional[List[dict]],
+    ) -> List[str]:
+        """
+        Writes the batch as one .npy file per field, named after the field, as
+        expected by the bulk insert. Returns the file names.
+        """
+        columns = {
+            "id": np.asarray(ids, dtype=np.int64),
+            "vector": np.asarray(vectors, dtype=np.float32),
+        }
+        for field_schema, values in zip(
+            cls.payload_fields, cls._payload_columns(metadata)
+        ):
+            columns[field_schema.name] = np.asarray(
+                values, dtype=NUMPY_DTYPES[field_schema.dtype]
+            )
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), column)
+            names.append(f"{name}.npy")
+        return names
 
     @classmethod
-    @backoff.on_exception(
-        backoff.expo, MilvusException, max_time=600, backoff_log_level=logging.WARN
-    )
-    def upload_with_backoff(cls, field_values, ids, vectors):
-        cls.collection.insert([ids, vectors] + field_values)
+    def _bulk_insert(
+        cls, ids: List[int], vectors: List[list], metadata: Optional[List[dict]]
+    ):
+        """
+        Writes the columns of the batch to the storage of Milvus, either a
+        local directory shared with the server or its MinIO bucket, and
+        starts an import task of them. The ids of the tasks are passed in the
+        batch stats to the barrier, which awaits them. Failed writes of the
+        files are retried, they overwrite the same files, unlike the import
+        request.
+        """
+        prefix = f"{cls.bulk_insert_params.get('prefix', 'bulk-insert')}/{ids[0]}"
+        start = time.perf_counter()
+        try:
+            if cls.s3 is None:
+                directory = os.path.join(cls.bulk_insert_params["dir"], prefix)
+            else:
+                directory = tempfile.mkdtemp(prefix="milvus-bulk-")
+            names = cls._write_columns(directory, ids, vectors, metadata)
+            written = time.perf_counter()
+            if cls.s3 is not None:
+                bucket = cls.bulk_insert_params.get("bucket", MILVUS_MINIO_BUCKET)
+                for name in names:
+                    cls.s3.upload_file(
+                        os.path.join(directory, name), bucket, f"{prefix}/{name}"
+                    )
+                shutil.rmtree(directory)
+        except FILE_ERRORS as e:
+            raise BulkInsertFileError(
+                f"Writing the files of {prefix} failed: {e}"
+            ) from e
+        transferred = time.perf_counter()
+        try:
+            task_id = utility.do_bulk_insert(
+                MILVUS_COLLECTION_NAME,
+                files=[f"{prefix}/{name}" for name in names],
+                using=MILVUS_DEFAULT_ALIAS,
+            )
+        except MilvusException as e:
+            raise BulkInsertRequestError(
+                f"Import request of the files in {prefix} failed: {e}"
+            ) from e
+        end = time.perf_counter()
+
+        for name, value in [
+            ("file_write_time", written - start),
+            ("file_transfer_time", transferred - written),
+            ("import_request_time", end - transferred),
+            ("import_tasks", 1),
+        ]:
+            cls.batch_stats[name] = cls.batch_stats.get(name, 0) + value
+        cls.batch_stats.setdefault("import_task_ids", []).append(task_id)
+
+    @classmethod
+    def pop_batch_stats(cls):
+        stats, cls.batch_stats = cls.batch_stats, {}
+        return stats
+
+    @staticmethod
+    def _import_progress(task_ids: List[int], uploaded: int) -> dict:
+        # Only the tasks of this upload, the collection may have older ones
+        tasks = [
+            utility.get_bulk_insert_state(task_id, using=MILVUS_DEFAULT_ALIAS)
+            for task_id in task_ids
+        ]
+        failed = [task for task in tasks if task.state == BulkInsertState.ImportFailed]
+        if len(failed) > 0:
+            raise MilvusException(
+                message=f"{len(failed)} bulk insert task(s) failed: "
+                f"{failed[0].failed_reason}"
+            )
+        completed = [
+            task for task in tasks if task.state == BulkInsertState.ImportCompleted
+        ]
+        imported_rows = sum(task.row_count for task in completed)
+        return {
+            "tasks": len(tasks),
+            "completed_tasks": len(completed),
+            "imported_rows": imported_rows,
+            "progress": min(imported_rows / max(uploaded, 1), 1.0),
+        }
+
+    @classmethod
+    def upload_barrier(
+        cls, uploaded: int, batch_stats: Optional[dict] = None
+    ) -> Optional[dict]:
+        if cls.bulk_insert_params is None:
+            return None
+        # The ids are not kept in the results
+        task_ids = (batch_stats or {}).pop("import_task_ids", [])
+        return ReadinessWait(
+            lambda: cls._import_progress(task_ids, uploaded),
+            lambda sample: sample["completed_tasks"] == sample["tasks"]
+            and sample["imported_rows"] >= uploaded,
+            name="Milvus bulk insert",
+        ).wait()
 
     @classmethod
     def post_upload(cls, distance):
+        start = time.perf_counter()
         index_params = {
             "metric_type": cls.distance,
             "index_type": cls.upload_params.get("index_type", "HNSW"),
@@ -89,5 +270,10 @@ class MilvusUploader(BaseUploader):
                 using=MILVUS_DEFAULT_ALIAS,
             )
 
+        indexed = time.perf_counter()
+
         cls.collection.load()
-        return {}
+        return {
+            "index_build_time": indexed - start,
+            "load_time": time.perf_counter() - indexed,
+        }
@@ -1,13 +1,21 @@
 import multiprocessing as mp
-import uuid
 from typing import List, Tuple
 
 from opensearchpy import OpenSearch
 
+from engine.base_client.bulk import parse_doc_id
 from engine.base_client.search import BaseSearcher
 from engine.clients.opensearch.config import OPENSEARCH_INDEX, get_opensearch_client
 from engine.clients.opensearch.parser import OpenSearchConditionParser
 
+SEARCH_FILTER_PATH = ["hits.hits._id", "hits.hits._score"]
+# Status keeps the responses without hits in the list
+MSEARCH_FILTER_PATH = [
+    "responses.status",
+    "responses.error",
+    *(f"responses.{path}" for path in SEARCH_FILTER_PATH),
+]
+
 
 class ClosableOpenSearch(OpenSearch):
     def __del__(self):
@@ -29,7 +37,7 @@ class OpenSearchSearcher(BaseSearcher):
         cls.search_params = search_params
 
     @classmethod
-    def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
+    def _query(cls, vector, meta_conditions, top) -> dict:
         query = {
             "knn": {
                 "vector": {
@@ -47,25 +55,51 @@ class OpenSearchSearcher(BaseSearcher):
                     "filter": meta_conditions,
                 }
             }
+        return {"query": query, "size": top, "_source": False}
 
+    @staticmethod
+    def _parse_hits(res) -> List[Tuple[int, float]]:
+        # Queries without any hit have no hits left after the filter_path
+        return [
+            (parse_doc_id(hit["_id"]), hit["_score"])
+            for hit in res.get("hits", {}).get("hits", [])
+        ]
+
+    @classmethod
+    def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
         res = cls.client.search(
             index=OPENSEARCH_INDEX,
-            body={
-                "query": query,
-                "size": top,
-            },
+            body=cls._query(vector, meta_conditions, top),
             params={
                 "timeout": 60,
             },
+            filter_path=SEARCH_FILTER_PATH,
         )
-        return [
-            (uuid.UUID(hex=hit["_id"]).int, hit["_score"])
-            for hit in res["hits"]["hits"]
-        ]
+        return cls._parse_hits(res)
+
+    @classmethod
+    def search_batch(
+        cls, vectors, meta_conditions, top
+    ) -> List[List[Tuple[int, float]]]:
+        body = []
+        for vector, conditions in zip(vectors, meta_conditions):
+            body.append({})
+            body.append(cls._query(vector, conditions, top))
+        res = cls.client.msearch(
+            body=body,
+            index=OPENSEARCH_INDEX,
+            filter_path=MSEARCH_FILTER_PATH,
+        )
+        results = []
+        for response in res["responses"]:
+            if "error" in response:
+                raise RuntimeError(f"msearch query failed: {response['error']}")
+            results.append(cls._parse_hits(response))
+        return results
 
     @classmethod
     def setup_search(cls):
-        if cls.search_params:
-            cls.client.indices.put_settings(
-                body=cls.search_params, index=OPENSEARCH_INDEX
-            )
+        # The benchmark params are not index settings
+        settings = cls.engine_params(cls.search_params)
+        if settings:
+            cls.client.indices.put_settings(body=settings, index=OPENSEARCH_INDEX)
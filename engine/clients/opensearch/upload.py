@@ -1,10 +1,9 @@
-import multiprocessing as mp
-import uuid
-from typing import List, Optional
+from opensearchpy import ConnectionError as OpenSearchConnectionError
+from opensearchpy import ConnectionTimeout, OpenSearch
+from opensearchpy.helpers import BulkIndexError, parallel_bulk, streaming_bulk
 
-from opensearchpy import OpenSearch
-
-from engine.base_client.upload import BaseUploader
+from engine.base_client.bulk import BaseBulkUploader, wait_for_merge
+from engine.base_client.resources import RESOURCE_MONITOR
 from engine.clients.opensearch.config import OPENSEARCH_INDEX, get_opensearch_client
 
 
@@ -13,48 +12,52 @@ class ClosableOpenSearch(OpenSearch):
         self.close()
 
 
-class OpenSearchUploader(BaseUploader):
+class OpenSearchUploader(BaseBulkUploader):
     client: OpenSearch = None
-    upload_params = {}
-
-    @classmethod
-    def get_mp_start_method(cls):
-        return "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    INDEX = OPENSEARCH_INDEX
+    BULK_HELPERS = {"streaming": streaming_bulk, "parallel": parallel_bulk}
+    BULK_INDEX_ERROR = BulkIndexError
+    BULK_REQUEST_PARAMS = {
+        "params": {
+            "timeout": 300,
+        },
+    }
+    TRANSPORT_ERRORS = (OpenSearchConnectionError, ConnectionTimeout)
+    RETRYABLE_EXCEPTIONS = (*BaseBulkUploader.RETRYABLE_EXCEPTIONS, *TRANSPORT_ERRORS)
 
     @classmethod
     def init_client(cls, host, distance, connection_params, upload_params):
         cls.client = get_opensearch_client(host, connection_params)
-        cls.upload_params = upload_params
+        cls.init_bulk(upload_params)
 
     @classmethod
-    def upload_batch(
-        cls, ids: List[int], vectors: List[list], metadata: Optional[List[dict]]
-    ):
-        if metadata is None:
-            metadata = [{}] * len(vectors)
-        operations = []
-        for idx, vector, payload in zip(ids, vectors, metadata):
-            vector_id = uuid.UUID(int=idx).hex
-            operations.append({"index": {"_id": vector_id}})
-            if payload:
-                operations.append({"vector": vector, **payload})
-            else:
-                operations.append({"vector": vector})
-
-        cls.client.bulk(
-            index=OPENSEARCH_INDEX,
-            body=operations,
-            params={
-                "timeout": 300,
-            },
+    def pre_upload(cls, _distance):
+        # The documents become searchable at once, with the refresh in post_upload
+        cls.client.indices.put_settings(
+            body={"index": {"refresh_interval": "-1"}}, index=OPENSEARCH_INDEX
         )
+        return {}
 
     @classmethod
     def post_upload(cls, _distance):
-        cls.client.indices.forcemerge(
+        # Back to the default interval
+        cls.client.indices.put_settings(
+            body={"index": {"refresh_interval": None}}, index=OPENSEARCH_INDEX
+        )
+        cls.client.indices.refresh(index=OPENSEARCH_INDEX)
+        RESOURCE_MONITOR.set_phase("forcemerge")
+        res = cls.client.indices.forcemerge(
             index=OPENSEARCH_INDEX,
             params={
-                "timeout": 300,
+                "wait_for_completion": "false",
             },
         )
-        return {}
+        merge_stats = wait_for_merge(
+            cls.client,
+            res.get("task"),
+            OPENSEARCH_INDEX,
+            cls.TRANSPORT_ERRORS,
+            name="OpenSearch forcemerge",
+        )
+        RESOURCE_MONITOR.set_phase("post_upload")
+        return {"merge": merge_stats}
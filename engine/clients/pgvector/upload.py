@@ -12,6 +12,9 @@ class PgVectorUploader(BaseUploader):
     conn = None
     cur = None
     upload_params = {}
+    # COPY has no ON CONFLICT, a batch sent again fails on the duplicate keys
+    RETRYABLE_EXCEPTIONS = ()
+    OVERWRITES_BY_ID = False
 
     @classmethod
     def init_client(cls, host, distance, connection_params, upload_params):
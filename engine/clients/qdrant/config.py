@@ -1,7 +1,10 @@
 import os
 import random
 import time
+from typing import Tuple
 
+import grpc
+import httpx
 import requests
 
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "benchmark")
@@ -12,6 +15,22 @@ QDRANT_CLUSTER_ID = os.getenv("QDRANT_CLUSTER_ID", None)
 QDRANT_AUTH_TOKEN = os.getenv("QDRANT_AUTH_TOKEN", None)
 QDRANT_MAX_OPTIMIZATION_THREADS = os.getenv("QDRANT_MAX_OPTIMIZATION_THREADS", None)
 
+# Transport settings, which may be overridden in the connection_params of the
+# experiment. Idle REST connections are kept alive and reused by default.
+QDRANT_TRANSPORT_DEFAULTS = {
+    "prefer_grpc": True,
+    "http2": False,
+    "max_connections": None,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 5.0,
+    "grpc_options": None,
+    "grpc_compression": None,
+}
+GRPC_COMPRESSION = {
+    "gzip": grpc.Compression.Gzip,
+    "none": grpc.Compression.NoCompression,
+}
+
 
 def get_collection_info(endpoint, collection, api_key):
     result = {}
@@ -63,3 +82,40 @@ def retry_with_exponential_backoff(
                 raise e
             else:
                 print("retrying...")
+
+
+def get_client_params(connection_params: dict) -> Tuple[dict, dict]:
+    """
+    Splits the connection params into the QdrantClient arguments and the
+    transport settings, which are recorded in the results.
+
+    The REST client pools `max_connections` connections, keeping up to
+    `max_keepalive_connections` of them alive for `keepalive_expiry` seconds,
+    optionally over HTTP/2. The gRPC channel is created once per process and
+    configured with `grpc_options`, e.g. {"grpc.keepalive_time_ms": 10000}.
+    """
+    transport = {
+        key: connection_params.get(key, default)
+        for key, default in QDRANT_TRANSPORT_DEFAULTS.items()
+    }
+    client_params = {
+        key: value
+        for key, value in connection_params.items()
+        if key not in QDRANT_TRANSPORT_DEFAULTS
+    }
+    client_params.update(
+        prefer_grpc=transport["prefer_grpc"],
+        http2=transport["http2"],
+        limits=httpx.Limits(
+            max_connections=transport["max_connections"],
+            max_keepalive_connections=transport["max_keepalive_connections"],
+            keepalive_expiry=transport["keepalive_expiry"],
+        ),
+    )
+    if transport["grpc_options"] is not None:
+        client_params["grpc_options"] = transport["grpc_options"]
+    if transport["grpc_compression"] is not None:
+        client_params["grpc_compression"] = GRPC_COMPRESSION[
+            transport["grpc_compression"]
+        ]
+    return client_params, transport
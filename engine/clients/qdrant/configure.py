@@ -8,6 +8,7 @@ from engine.clients.qdrant.config import (
     QDRANT_API_KEY,
     QDRANT_COLLECTION_NAME,
     QDRANT_URL,
+    get_client_params,
     retry_with_exponential_backoff,
 )
 
@@ -28,13 +29,17 @@ class QdrantConfigurator(BaseConfigurator):
 
     def __init__(self, host, collection_params: dict, connection_params: dict):
         super().__init__(host, collection_params, connection_params)
+        # The collection is managed over REST, unless configured otherwise
+        client_params, _ = get_client_params(
+            {"prefer_grpc": False, **connection_params}
+        )
         if QDRANT_URL is None:
             self.client = QdrantClient(
-                host=host, api_key=QDRANT_API_KEY, **connection_params
+                host=host, api_key=QDRANT_API_KEY, **client_params
             )
         else:
             self.client = QdrantClient(
-                url=QDRANT_URL, api_key=QDRANT_API_KEY, **connection_params
+                url=QDRANT_URL, api_key=QDRANT_API_KEY, **client_params
             )
 
     def clean(self):
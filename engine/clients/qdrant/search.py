@@ -2,7 +2,6 @@ import multiprocessing as mp
 import os
 from typing import List, Tuple
 
-import httpx
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 
@@ -11,6 +10,7 @@ from engine.clients.qdrant.config import (
     QDRANT_API_KEY,
     QDRANT_COLLECTION_NAME,
     QDRANT_URL,
+    get_client_params,
 )
 from engine.clients.qdrant.parser import QdrantConditionParser
 
@@ -19,26 +19,20 @@ class QdrantSearcher(BaseSearcher):
     search_params = {}
     client: QdrantClient = None
     parser = QdrantConditionParser()
+    transport = None
 
     @classmethod
     def init_client(cls, host, distance, connection_params: dict, search_params: dict):
         os.environ["GRPC_ENABLE_FORK_SUPPORT"] = "true"
         os.environ["GRPC_POLL_STRATEGY"] = "epoll,poll"
+        client_params, cls.transport = get_client_params(connection_params)
         if QDRANT_URL is None:
             cls.client: QdrantClient = QdrantClient(
-                host,
-                api_key=QDRANT_API_KEY,
-                prefer_grpc=True,
-                limits=httpx.Limits(max_connections=None, max_keepalive_connections=0),
-                **connection_params
+                host, api_key=QDRANT_API_KEY, **client_params
             )
         else:
             cls.client: QdrantClient = QdrantClient(
-                url=QDRANT_URL,
-                api_key=QDRANT_API_KEY,
-                prefer_grpc=True,
-                limits=httpx.Limits(max_connections=None, max_keepalive_connections=0),
-                **connection_params
+                url=QDRANT_URL, api_key=QDRANT_API_KEY, **client_params
             )
 
         cls.search_params = search_params
@@ -60,3 +54,7 @@ class QdrantSearcher(BaseSearcher):
             ),
         )
         return [(hit.id, hit.score) for hit in res]
+
+    @classmethod
+    def transport_info(cls):
+        return cls.transport
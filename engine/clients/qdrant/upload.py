@@ -1,11 +1,14 @@
 import json
 import os
-import time
 from typing import List, Optional
 
+import grpc
+import numpy as np
 from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException
 from qdrant_client.http.models import Batch, CollectionStatus, OptimizersConfigDiff
 
+from engine.base_client.readiness import ReadinessWait
 from engine.base_client.upload import BaseUploader
 from engine.clients.qdrant.config import (
     QDRANT_ACCOUNT_ID,
@@ -15,6 +18,7 @@ from engine.clients.qdrant.config import (
     QDRANT_COLLECTION_NAME,
     QDRANT_MAX_OPTIMIZATION_THREADS,
     QDRANT_URL,
+    get_client_params,
     get_collection_info,
     get_qdrant_cloud_usage,
 )
@@ -23,28 +27,56 @@ from engine.clients.qdrant.config import (
 class QdrantUploader(BaseUploader):
     client = None
     upload_params = {}
+    upload_collection_params = None
+    # Points of the collection before the upload, e.g. of a resumed upload
+    start_count = 0
+    RETRYABLE_EXCEPTIONS = (
+        *BaseUploader.RETRYABLE_EXCEPTIONS,
+        ResponseHandlingException,
+        grpc.RpcError,
+    )
 
     @classmethod
     def init_client(cls, host, distance, connection_params, upload_params):
         os.environ["GRPC_ENABLE_FORK_SUPPORT"] = "true"
         os.environ["GRPC_POLL_STRATEGY"] = "epoll,poll"
+        client_params, _ = get_client_params(connection_params)
         if QDRANT_URL is None:
             cls.client = QdrantClient(
-                host=host, api_key=QDRANT_API_KEY, prefer_grpc=True, **connection_params
+                host=host, api_key=QDRANT_API_KEY, **client_params
             )
         else:
             cls.client = QdrantClient(
-                url=QDRANT_URL,
-                api_key=QDRANT_API_KEY,
-                prefer_grpc=True,
-                **connection_params,
+                url=QDRANT_URL, api_key=QDRANT_API_KEY, **client_params
             )
         cls.upload_params = upload_params
+        # Batches are passed to upload_collection as NumPy arrays, which splits
+        # them into smaller batches and sends them with its own workers
+        cls.upload_collection_params = upload_params.get("upload_collection")
+        if (
+            cls.upload_collection_params is not None
+            and cls.upload_collection_params.get("parallel", 1) > 1
+            and upload_params.get("parallel", 1) > 1
+        ):
+            # The workers of the pool are daemonic and can't start processes
+            raise ValueError(
+                "upload_collection with parallel > 1 requires the upload parallel 1"
+            )
 
     @classmethod
     def upload_batch(
         cls, ids: List[int], vectors: List[list], metadata: Optional[List[dict]]
     ):
+        if cls.upload_collection_params is not None:
+            cls.client.upload_collection(
+                collection_name=QDRANT_COLLECTION_NAME,
+                vectors=np.asarray(vectors, dtype=np.float32),
+                payload=[payload or {} for payload in metadata],
+                ids=ids,
+                wait=False,
+                **cls.upload_collection_params,
+            )
+            return
         cls.client.upsert(
             collection_name=QDRANT_COLLECTION_NAME,
             points=Batch.model_construct(
@@ -55,6 +87,33 @@ class QdrantUploader(BaseUploader):
             wait=False,
         )
 
+    @classmethod
+    def pre_upload(cls, _distance):
+        cls.start_count = cls.client.count(QDRANT_COLLECTION_NAME, exact=True).count
+        return {"points_count": cls.start_count}
+
+    @classmethod
+    def upload_barrier(cls, uploaded: int, batch_stats=None):
+        # Points are upserted without waiting, so the upload is finished once
+        # all of them are counted, in addition to the points stored before.
+        # Shards uploaded at the same time count the points of each other, so
+        # the barrier of a shard may return before its own points are stored.
+        expected = cls.start_count + uploaded
+
+        def probe():
+            points_count = cls.client.count(QDRANT_COLLECTION_NAME, exact=True).count
+            stored = points_count - cls.start_count
+            return {
+                "points_count": points_count,
+                "progress": min(stored / uploaded, 1.0) if uploaded else None,
+            }
+
+        return ReadinessWait(
+            probe,
+            lambda sample: sample["points_count"] >= expected,
+            name="points",
+        ).wait()
+
     @classmethod
     def post_upload(cls, _distance):
         max_optimization_threads = QDRANT_MAX_OPTIMIZATION_THREADS
@@ -68,24 +127,35 @@ class QdrantUploader(BaseUploader):
             ),
         )
 
-        cls.wait_collection_green()
-        return {}
+        return {"readiness": cls.wait_collection_green()}
 
     @classmethod
     def wait_collection_green(cls):
-        wait_time = 5.0
-        total = 0
-        while True:
-            time.sleep(wait_time)
-            total += wait_time
-            collection_info = cls.client.get_collection(QDRANT_COLLECTION_NAME)
-            if collection_info.status != CollectionStatus.GREEN:
-                continue
-            time.sleep(wait_time)
-            collection_info = cls.client.get_collection(QDRANT_COLLECTION_NAME)
-            if collection_info.status == CollectionStatus.GREEN:
-                break
-        return total
+        # The status may be green for a moment before the optimizers start,
+        # so it is confirmed once more
+        return ReadinessWait(
+            cls._collection_progress,
+            lambda sample: sample["status"] == CollectionStatus.GREEN.value,
+            name="collection",
+            confirmations=2,
+        ).wait()
+
+    @classmethod
+    def _collection_progress(cls) -> dict:
+        collection_info = cls.client.get_collection(QDRANT_COLLECTION_NAME)
+        points_count = collection_info.points_count or 0
+        indexed_vectors_count = collection_info.indexed_vectors_count or 0
+        return {
+            "status": collection_info.status.value,
+            "progress": (
+                min(indexed_vectors_count / points_count, 1.0)
+                if points_count > 0
+                else None
+            ),
+            "indexed_vectors_count": indexed_vectors_count,
+            "points_count": points_count,
+            "segments_count": collection_info.segments_count,
+        }
 
     @classmethod
     def delete_client(cls):
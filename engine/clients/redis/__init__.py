@@ -1,3 +1,4 @@
+from engine.clients.redis.async_search import RedisAsyncSearcher
 from engine.clients.redis.configure import RedisConfigurator
 from engine.clients.redis.search import RedisSearcher
 from engine.clients.redis.upload import RedisUploader
@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import tqdm
+from redis.asyncio import Redis as AsyncRedis
+
+from dataset_reader.base_reader import Query
+from engine.base_client.search import DEFAULT_TOP
+from engine.clients.redis.config import (
+    REDIS_AUTH,
+    REDIS_PORT,
+    REDIS_PROTOCOL,
+    REDIS_QUERY_TIMEOUT,
+    REDIS_USER,
+)
+from engine.clients.redis.search import RedisSearcher
+
+# Number of queries in flight in every worker process
+DEFAULT_CONCURRENCY = 64
+INDEX_NAME = "idx"
+
+
+class PreparedQuery:
+    """
+    FT.SEARCH arguments of a query, with the vector already serialized to the
+    data type of the index.
+    """
+
+    __slots__ = ("args", "expected_result", "top")
+
+    def __init__(self, args: tuple, expected_result: Optional[List[int]], top: int):
+        self.args = args
+        self.expected_result = expected_result
+        self.top = top
+
+
+class RedisAsyncSearcher(RedisSearcher):
+    """
+    Searcher multiplexing many queries over a connection pool of a single
+    event loop in every process. The queries are converted to raw FT.SEARCH
+    commands once, before the measurement.
+    """
+
+    WORKER_LOOP = True
+
+    @classmethod
+    def init_client(cls, host, distance, connection_params: dict, search_params: dict):
+        super().init_client(host, distance, connection_params, search_params)
+        cls.concurrency = search_params.get("concurrency", DEFAULT_CONCURRENCY)
+        cls.nodes = [(host, REDIS_PORT)]
+        if cls._is_cluster:
+            cls.nodes = [(node.host, node.port) for node in cls.client.get_primaries()]
+            if not cls._scatter:
+                cls.nodes = [random.choice(cls.nodes)]
+        # The parts of the command shared by all the queries
+        cls.knn_query = (
+            f"=>[KNN $K @vector $vec_param {cls.knn_conditions} AS vector_score]"
+        )
+        cls.return_args = ("RETURN", 1, "vector_score", "SORTBY", "vector_score", "ASC")
+        cls.tail_args = ("TIMEOUT", REDIS_QUERY_TIMEOUT, "DIALECT", 4)
+
+    @classmethod
+    def prepare_queries(
+        cls, queries: List[Query], top: Optional[int]
+    ) -> List[PreparedQuery]:
+        return [
+            cls.prepare_query(query, top)
+            for query in tqdm.tqdm(queries, desc="Preparing queries")
+        ]
+
+    @classmethod
+    def prepare_query(cls, query: Query, top: Optional[int]) -> PreparedQuery:
+        if top is None:
+            top = len(query.expected_result) if query.expected_result else DEFAULT_TOP
+        conditions = cls.parser.parse(query.meta_conditions)
+        prefilter_condition, params = ("*", {}) if conditions is None else conditions
+        params = {
+            "vec_param": np.array(query.vector).astype(cls.np_data_type).tobytes(),
+            "K": top,
+            **params,
+        }
+        if cls.algorithm == "HNSW":
+            params["EF"] = cls.search_params["search_params"]["ef"]
+        args = (
+            "FT.SEARCH",
+            INDEX_NAME,
+            prefilter_condition + cls.knn_query,
+            *cls.return_args,
+            "LIMIT",
+            0,
+            top,
+            "PARAMS",
+            2 * len(params),
+            *itertools.chain.from_iterable(params.items()),
+            *cls.tail_args,
+        )
+        return PreparedQuery(args, query.expected_result, top)
+
+    @staticmethod
+    def parse_reply(reply) -> List[Tuple[int, float]]:
+        """
+        Parses the RESP2 list or the RESP3 map of FT.SEARCH with the
+        vector_score returned only.
+        """
+        if isinstance(reply, dict):
+            results = reply.get(b"results", reply.get("results"))
+            hits = []
+            for result in results:
+                result_id = result.get(b"id", result.get("id"))
+                attributes = result.get(
+                    b"extra_attributes", result.get("extra_attributes")
+                )
+                score = attributes.get(b"vector_score", attributes.get("vector_score"))
+                hits.append((int(result_id), float(score)))
+            return hits
+        return [
+            (int(reply[i]), float(reply[i + 1][1])) for i in range(1, len(reply), 2)
+        ]
+
+    @classmethod
+    async def _search_prepared(cls, clients, query: PreparedQuery, with_precision):
+        start = time.perf_counter()
+        query_stats = None
+        try:
+            if len(clients) == 1:
+                hits = cls.parse_reply(await clients[0].execute_command(*query.args))
+            else:
+                replies = await asyncio.gather(
+                    *(client.execute_command(*query.args) for client in clients)
+                )
+                fanout_end = time.perf_counter()
+                hits = heapq.nsmallest(
+                    query.top,
+                    (hit for reply in replies for hit in cls.parse_reply(reply)),
+                    key=lambda hit: hit[1],
+                )
+                query_stats = {
+                    "fanout_time": fanout_end - start,
+                    "merge_time": time.perf_counter() - fanout_end,
+                }
+        except cls.SEARCH_ERRORS as e:
+            print(f"Search failed: {e}")
+            return None, None, time.perf_counter(), None
+        end = time.perf_counter()
+
+        precision = None
+        if with_precision:
+            precision = 1.0
+            if query.expected_result:
+                ids = set(hit[0] for hit in hits)
+                expected = query.expected_result[: query.top]
+                precision = len(ids.intersection(expected)) / query.top
+        return precision, end - start, end, query_stats
+
+    @classmethod
+    async def _search_prepared_batch(cls, clients, queries: List[PreparedQuery]):
+        """
+        Sends the queries of a batch at once. As in the batches of the base
+        searcher, the latency of every query is the latency of the whole batch
+        and its share is reported as `amortized_time`.
+        """
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(cls._search_prepared(clients, query, True) for query in queries)
+        )
+        end = time.perf_counter()
+        amortized_time = {"amortized_time": (end - start) / len(queries)}
+        return [
+            (precision, None, query_end, None)
+            if latency is None
+            else (precision, end - start, end, {**(stats or {}), **amortized_time})
+            for precision, latency, query_end, stats in results
+        ]
+
+    @classmethod
+    async def _search_async(
+        cls, queries: List[PreparedQuery], indices: Iterator[int], batch_size: int
+    ):
+        clients = [
+            AsyncRedis(
+                host=node_host,
+                port=node_port,
+                password=REDIS_AUTH,
+                username=REDIS_USER,
+                protocol=REDIS_PROTOCOL,
+                max_connections=cls.concurrency,
+            )
+            for node_host, node_port in cls.nodes
+        ]
+        results = []
+        seen = set()
+
+        async def consume():
+            # The iterator is shared, each query is sent by a single consumer
+            if batch_size > 1:
+                for batch in cls._query_batches(indices, batch_size):
+                    batch_results = await cls._search_prepared_batch(
+                        clients, [queries[idx] for idx in batch]
+                    )
+                    results.extend(
+                        (idx, *result) for idx, result in zip(batch, batch_results)
+                    )
+                return
+            for idx in indices:
+                precision, latency, end, query_stats = await cls._search_prepared(
+                    clients, queries[idx], idx not in seen
+                )
+                if latency is not None:
+                    seen.add(idx)
+                results.append((idx, precision, latency, end, query_stats))
+
+        try:
+            await asyncio.gather(*(consume() for _ in range(cls.concurrency)))
+        finally:
+            for client in clients:
+                await client.aclose()
+        return results
+
+    @staticmethod
+    def _indices(
+        worker_id: int,
+        size: int,
+        workers: int,
+        duration: Optional[float],
+        count: Optional[int],
+    ) -> Iterable[int]:
+        """
+        Each query once, split among the workers, or cycling through the
+        queries from an offset specific to the worker until the bounds are
+        reached, as in the search loop of the base searcher.
+        """
+        if duration is None and count is None:
+            yield from range(worker_id, size, workers)
+            return
+        offset = worker_id * size // workers
+        start = time.perf_counter()
+        for i in itertools.count():
+            if not (
+                (duration is not None and time.perf_counter() - start < duration)
+                or (count is not None and i < count)
+            ):
+                return
+            yield (offset + i) % size
+
+    @classmethod
+    def _search_loop(
+        cls,
+        worker_id: int,
+        queries: List[PreparedQuery],
+        workers: int,
+        top: Optional[int] = None,
+        duration: Optional[float] = None,
+        count: Optional[int] = None,
+        batch_size: int = 1,
+    ):
+        # The top is already a part of the prepared queries
+        indices = cls._indices(worker_id, len(queries), workers, duration, count)
+        return asyncio.run(cls._search_async(queries, iter(indices), batch_size))
@@ -13,3 +13,10 @@ GPU_STATS_ENDPOINT = os.getenv("GPU_STATS_ENDPOINT", None)
 
 # 60 seconds timeout
 REDIS_QUERY_TIMEOUT = int(os.getenv("REDIS_QUERY_TIMEOUT", 60 * 1000))
+
+# Search mode of REDIS_CLUSTER: "scatter" sends every query to all the primaries
+# and merges their results, "single" sends it to one randomly selected primary
+REDIS_CLUSTER_SEARCH = os.getenv("REDIS_CLUSTER_SEARCH", "scatter")
+
+# RESP protocol version of the async searcher, 3 returns search replies as maps
+REDIS_PROTOCOL = int(os.getenv("REDIS_PROTOCOL", 2))
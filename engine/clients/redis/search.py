@@ -1,4 +1,7 @@
+import heapq
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
 from ml_dtypes import bfloat16
 import numpy as np
@@ -11,6 +14,7 @@ from engine.clients.redis.config import (
     REDIS_AUTH,
     REDIS_USER,
     REDIS_CLUSTER,
+    REDIS_CLUSTER_SEARCH,
 )
 
 from engine.clients.redis.parser import RedisConditionParser
@@ -20,6 +24,8 @@ class RedisSearcher(BaseSearcher):
     search_params = {}
     client = None
     parser = RedisConditionParser()
+    executor = None
+    query_stats = None
 
     @classmethod
     def init_client(cls, host, distance, connection_params: dict, search_params: dict):
@@ -56,6 +62,13 @@ class RedisSearcher(BaseSearcher):
             ]
         cls._ft = cls.conns[random.randint(0, len(cls.conns)) - 1].ft()
 
+        # Every primary holds an index of its own keys only, so the query is
+        # sent to all of them at the same time and the results are merged
+        cls._scatter = cls._is_cluster and REDIS_CLUSTER_SEARCH == "scatter"
+        if cls._scatter:
+            cls._fts = [conn.ft() for conn in cls.conns]
+            cls.executor = ThreadPoolExecutor(max_workers=len(cls._fts))
+
     @classmethod
     def search_one(cls, vector, meta_conditions, top) -> List[Tuple[int, float]]:
         conditions = cls.parser.parse(meta_conditions)
@@ -84,6 +97,48 @@ class RedisSearcher(BaseSearcher):
         }
         if cls.algorithm == "HNSW":
             params_dict["EF"] = cls.search_params["search_params"]["ef"]
+        if cls._scatter:
+            return cls._scatter_search(q, params_dict, top)
         results = cls._ft.search(q, query_params=params_dict)
 
         return [(int(result.id), float(result.vector_score)) for result in results.docs]
+
+    @classmethod
+    def _shard_search(cls, ft, q, params_dict) -> Tuple[List[Tuple[int, float]], float]:
+        start = time.perf_counter()
+        results = ft.search(q, query_params=params_dict)
+        latency = time.perf_counter() - start
+        return [
+            (int(result.id), float(result.vector_score)) for result in results.docs
+        ], latency
+
+    @classmethod
+    def _scatter_search(cls, q, params_dict, top) -> List[Tuple[int, float]]:
+        start = time.perf_counter()
+        shard_results = list(
+            cls.executor.map(lambda ft: cls._shard_search(ft, q, params_dict), cls._fts)
+        )
+        fanout_end = time.perf_counter()
+        # vector_score is a distance for all the metrics, lower is closer
+        merged = heapq.nsmallest(
+            top,
+            (hit for hits, _ in shard_results for hit in hits),
+            key=lambda hit: hit[1],
+        )
+        cls.query_stats = {
+            "fanout_time": fanout_end - start,
+            "slowest_shard_time": max(latency for _, latency in shard_results),
+            "merge_time": time.perf_counter() - fanout_end,
+        }
+        return merged
+
+    @classmethod
+    def pop_query_stats(cls):
+        query_stats, cls.query_stats = cls.query_stats, None
+        return query_stats
+
+    @classmethod
+    def delete_client(cls):
+        if cls.executor is not None:
+            cls.executor.shutdown()
+            cls.executor = None
@@ -1,4 +1,3 @@
-import time
 from typing import List, Optional
 from ml_dtypes import bfloat16
 import requests
@@ -6,6 +5,9 @@ import json
 import random
 import numpy as np
 from redis import Redis, RedisCluster
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from engine.base_client.readiness import ReadinessWait
 from engine.base_client.upload import BaseUploader
 from engine.clients.redis.config import (
     REDIS_PORT,
@@ -24,6 +26,11 @@ class RedisUploader(BaseUploader):
     host = None
     client_decode = None
     upload_params = {}
+    RETRYABLE_EXCEPTIONS = (
+        *BaseUploader.RETRYABLE_EXCEPTIONS,
+        RedisConnectionError,
+        RedisTimeoutError,
+    )
 
     @classmethod
     def init_client(cls, host, distance, connection_params, upload_params):
@@ -101,27 +108,30 @@ class RedisUploader(BaseUploader):
         index_info = cls.client.ft().info()
         # redisearch / memorystore for redis
         if "percent_index" in index_info:
-            percent_index = float(index_info["percent_index"])
-            while percent_index < 1.0:
-                print(
-                    "waiting for index to be fully processed. current percent index: {}".format(
-                        percent_index * 100.0
-                    )
-                )
-                time.sleep(1)
-                percent_index = float(cls.client.ft().info()["percent_index"])
+            readiness = ReadinessWait(
+                cls._index_progress, lambda sample: sample["progress"] >= 1.0
+            )
         # memorydb
-        if "current_lag" in index_info:
-            current_lag = float(index_info["current_lag"])
-            while current_lag > 0:
-                print(
-                    "waiting for index to be fully processed. current current_lag: {}".format(
-                        current_lag
-                    )
-                )
-                time.sleep(1)
-                current_lag = int(cls.client.ft().info()["current_lag"])
-        return {}
+        elif "current_lag" in index_info:
+            readiness = ReadinessWait(
+                cls._index_lag, lambda sample: sample["current_lag"] <= 0
+            )
+        else:
+            return {}
+        return {"readiness": readiness.wait()}
+
+    @classmethod
+    def _index_progress(cls) -> dict:
+        index_info = cls.client.ft().info()
+        return {
+            "progress": float(index_info["percent_index"]),
+            "num_docs": int(index_info.get("num_docs", 0)),
+            "indexing": int(index_info.get("indexing", 0)),
+        }
+
+    @classmethod
+    def _index_lag(cls) -> dict:
+        return {"current_lag": int(cls.client.ft().info()["current_lag"])}
 
     def get_memory_usage(cls):
         used_memory = []
@@ -0,0 +1,328 @@
+import argparse
+import json
+import subprocess
+import threading
+import time
+from http.server import HTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import psutil
+
+from monitoring.gpu_wrapper import SimpleHTTPRequestHandler
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+METRICS = [
+    "cpu_percent",
+    "rss_bytes",
+    "read_bytes_per_second",
+    "write_bytes_per_second",
+    "rx_bytes_per_second",
+    "tx_bytes_per_second",
+]
+# Counters of a process which only grow while it runs
+PROCESS_COUNTERS = ["cpu_seconds", "read_bytes", "write_bytes"]
+
+
+def _read_net_dev(pid: int) -> Dict[str, int]:
+    """
+    Reads the network counters of the namespace the process belongs to, which
+    for a container are the counters of the container itself.
+    """
+    rx, tx = 0, 0
+    with open(f"/proc/{pid}/net/dev") as fd:
+        for line in fd.readlines()[2:]:
+            interface, counters = line.split(":", 1)
+            if interface.strip() == "lo":
+                continue
+            values = counters.split()
+            rx += int(values[0])
+            tx += int(values[8])
+    return {"rx_bytes": rx, "tx_bytes": tx}
+
+
+class ProcessTarget:
+    """
+    A process matched by name, together with all its children. The counters
+    of the processes which exited are kept, so the totals never decrease when
+    a child exits between two reads.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Last counters of every process, keyed by its pid and creation time
+        self._last: Dict[Tuple[int, float], Dict[str, float]] = {}
+        self._exited = dict.fromkeys(PROCESS_COUNTERS, 0)
+
+    def _processes(self) -> List[psutil.Process]:
+        processes = []
+        for process in psutil.process_iter(["name"]):
+            if self.name in (process.info["name"] or ""):
+                processes.append(process)
+                processes.extend(process.children(recursive=True))
+        return processes
+
+    def read(self) -> Optional[Dict[str, float]]:
+        processes = self._processes()
+        if len(processes) == 0:
+            return None
+        current = {}
+        rss_bytes = 0
+        for process in processes:
+            try:
+                with process.oneshot():
+                    key = (process.pid, process.create_time())
+                    cpu_times = process.cpu_times()
+                    io = process.io_counters()
+                    current[key] = {
+                        "cpu_seconds": cpu_times.user + cpu_times.system,
+                        "read_bytes": io.read_bytes,
+                        "write_bytes": io.write_bytes,
+                    }
+                    rss_bytes += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+            except psutil.AccessDenied:
+                # Still running, its last counters are used
+                current.update(
+                    (key, last)
+                    for key, last in self._last.items()
+                    if key[0] == process.pid
+                )
+        for key, last in self._last.items():
+            if key not in current:
+                for counter in PROCESS_COUNTERS:
+                    self._exited[counter] += last[counter]
+        self._last = current
+        counters = {
+            counter: self._exited[counter]
+            + sum(process[counter] for process in current.values())
+            for counter in PROCESS_COUNTERS
+        }
+        counters["rss_bytes"] = rss_bytes
+        # Processes outside of containers share the host network namespace
+        net = psutil.net_io_counters()
+        counters["rx_bytes"], counters["tx_bytes"] = net.bytes_recv, net.bytes_sent
+        return counters
+
+
+class ContainerTarget:
+    """
+    A docker container, sampled through its cgroup v2 counters. The container
+    is looked up by the sampling thread, on the first read, so creating the
+    target is cheap, e.g. in the worker processes of the benchmark.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pid = None
+        self.cgroup = None
+
+    def _inspect(self) -> bool:
+        try:
+            inspect = subprocess.run(
+                ["docker", "inspect", "--format", "{{.Id}} {{.State.Pid}}", self.name],
+                check=True,
+                text=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            # No docker or no such container yet, it is looked up again later
+            return False
+        container_id, pid = inspect.stdout.split()
+        self.pid = int(pid)
+        self.cgroup = CGROUP_ROOT / "system.slice" / f"docker-{container_id}.scope"
+        return True
+
+    def read(self) -> Optional[Dict[str, float]]:
+        if self.cgroup is None and not self._inspect():
+            return None
+        if not self.cgroup.exists():
+            # The container was removed, a recreated one has another id
+            self.cgroup = None
+            return None
+        counters = {"read_bytes": 0, "write_bytes": 0}
+        with open(self.cgroup / "cpu.stat") as fd:
+            for line in fd:
+                key, value = line.split()
+                if key == "usage_usec":
+                    counters["cpu_seconds"] = int(value) / 1_000_000
+        counters["rss_bytes"] = int((self.cgroup / "memory.current").read_text())
+        with open(self.cgroup / "io.stat") as fd:
+            for line in fd:
+                for entry in line.split()[1:]:
+                    key, value = entry.split("=")
+                    if key == "rbytes":
+                        counters["read_bytes"] += int(value)
+                    elif key == "wbytes":
+                        counters["write_bytes"] += int(value)
+        counters.update(_read_net_dev(self.pid))
+        return counters
+
+
+class ResourceSampler:
+    """
+    Periodically samples CPU, memory, disk and network usage of the selected
+    processes and containers. Every sample is tagged with the current phase of
+    the benchmark, so the usage may be summarized per phase.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.2,
+        processes: List[str] = (),
+        containers: List[str] = (),
+    ):
+        self.interval = interval
+        self.targets = [ProcessTarget(name) for name in processes]
+        self.targets += [ContainerTarget(name) for name in containers]
+        self.phase = None
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def set_phase(self, phase: Optional[str]):
+        with self._lock:
+            self.phase = phase
+
+    def reset(self):
+        with self._lock:
+            self.samples = []
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        previous = {target.name: target.read() for target in self.targets}
+        previous_time = time.time()
+        while not self._stop_event.wait(self.interval):
+            now = time.time()
+            elapsed = now - previous_time
+            values = {}
+            for target in self.targets:
+                current = target.read()
+                last = previous.get(target.name)
+                previous[target.name] = current
+                if current is None or last is None:
+                    continue
+                values[target.name] = {
+                    "cpu_percent": 100.0
+                    * max(current["cpu_seconds"] - last["cpu_seconds"], 0)
+                    / elapsed,
+                    "rss_bytes": current["rss_bytes"],
+                    **{
+                        f"{counter}_per_second": max(
+                            current[counter] - last[counter], 0
+                        )
+                        / elapsed
+                        for counter in [
+                            "read_bytes",
+                            "write_bytes",
+                            "rx_bytes",
+                            "tx_bytes",
+                        ]
+                    },
+                }
+            previous_time = now
+            with self._lock:
+                self.samples.append(
+                    {"time": now, "phase": self.phase, "targets": values}
+                )
+
+    def get_samples(self) -> List[dict]:
+        with self._lock:
+            return list(self.samples)
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Peak and mean usage of every target, for every phase.
+        """
+        per_phase = {}
+        for sample in self.get_samples():
+            if sample["phase"] is None:
+                continue
+            for target, values in sample["targets"].items():
+                target_values = per_phase.setdefault(sample["phase"], {})
+                for metric in METRICS:
+                    target_values.setdefault(target, {}).setdefault(metric, []).append(
+                        values[metric]
+                    )
+
+        return {
+            phase: {
+                target: {
+                    metric: {
+                        "mean": sum(values) / len(values),
+                        "peak": max(values),
+                    }
+                    for metric, values in metrics.items()
+                }
+                for target, metrics in targets.items()
+            }
+            for phase, targets in per_phase.items()
+        }
+
+
+class ResourceSamplerHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the samples collected by the sampler, next to the GPU stats served
+    by the parent handler:
+    - /phase?name=<phase> - tags the following samples with the phase
+    - /samples - all the collected samples
+    - /summary - peak and mean usage per phase
+    - /reset - removes the collected samples
+    """
+
+    sampler: ResourceSampler = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/phase":
+            phase = parse_qs(url.query).get("name", [None])[0]
+            self.sampler.set_phase(phase)
+            self._send_json({"phase": phase})
+        elif url.path == "/samples":
+            self._send_json(self.sampler.get_samples())
+        elif url.path == "/summary":
+            self._send_json(self.sampler.summary())
+        elif url.path == "/reset":
+            self.sampler.reset()
+            self._send_json({})
+        else:
+            super().do_GET()
+
+    def _send_json(self, content):
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(content).encode())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sample the resource usage of the engine processes/containers."
+    )
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--process", action="append", default=[])
+    parser.add_argument("--container", action="append", default=[])
+    args = parser.parse_args()
+
+    ResourceSamplerHandler.sampler = ResourceSampler(
+        args.interval, args.process, args.container
+    )
+    ResourceSamplerHandler.sampler.start()
+    httpd = HTTPServer(("", args.port), ResourceSamplerHandler)
+    print(f"Resource sampler running on port {args.port}...")
+    httpd.serve_forever()
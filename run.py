@@ -26,6 +26,7 @@ def run(
     timeout: float = 86400.0,
     upload_start_idx: int = 0,
     upload_end_idx: int = -1,
+    resume: bool = False,
 ):
     """
     Example:
@@ -67,8 +68,12 @@ def run(
                         parallels,
                         upload_start_idx,
                         upload_end_idx,
+                        resume,
                     )
                 client.delete_client()
+                # Parts which were not read by the experiment may be still
+                # downloading in the background
+                dataset.wait_for_downloads()
 
                 # If the timeout is reached, the server might be still in the
                 # middle of some background processing, like creating the index.
@@ -0,0 +1,32 @@
+import pytest
+
+from benchmark import dataset as dataset_module
+from benchmark.dataset import Dataset
+
+
+def make_dataset(data):
+    config = {
+        "vector_size": 4,
+        "distance": "cosine",
+        "name": "local-parts",
+        "type": "h5-multi",
+        "path": {"data": data, "queries": []},
+    }
+    return Dataset(config, False, True, 0, -1)
+
+
+def test_local_parts_without_link_are_not_downloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_module, "DATASETS_DIR", tmp_path)
+    (tmp_path / "part-0.hdf5").write_bytes(b"")
+    dataset = make_dataset([{"path": "part-0.hdf5", "start_idx": 0, "end_idx": 10}])
+    dataset.download()
+
+    assert {} == dataset.downloads._futures
+
+
+def test_missing_part_without_link_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_module, "DATASETS_DIR", tmp_path)
+    dataset = make_dataset([{"path": "part-0.hdf5", "start_idx": 0, "end_idx": 10}])
+
+    with pytest.raises(FileNotFoundError):
+        dataset.download()
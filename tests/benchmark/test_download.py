@@ -0,0 +1,251 @@
+import hashlib
+import io
+import json
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmark import download as download_module
+from benchmark.download import (
+    DownloadError,
+    DownloadScheduler,
+    RateLimiter,
+    download_s3,
+    download_url,
+    extract_url,
+    partial_path,
+    state_path,
+)
+
+CONTENT = bytes(range(256)) * 1000
+
+
+def make_archive() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in [("vectors.npy", CONTENT), ("tests.jsonl", b"{}\n")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    content = CONTENT
+    accept_ranges = True
+    allow_head = True
+    requested_ranges = []
+    stalled_ranges = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, status, length, start=None, end=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if start is not None:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{end}/{len(self.content)}"
+            )
+        self.end_headers()
+
+    def do_HEAD(self):
+        if not self.allow_head:
+            self.send_error(403)
+            return
+        self._send_headers(200, len(self.content))
+
+    def do_GET(self):
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match is None or not self.accept_ranges:
+            self._send_headers(200, len(self.content))
+            self.wfile.write(self.content)
+            return
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(self.content) - 1
+        self.requested_ranges.append((start, end))
+        self._send_headers(206, end - start + 1, start, end)
+        if RangeHandler.stalled_ranges > 0:
+            RangeHandler.stalled_ranges -= 1
+            time.sleep(1)
+        self.wfile.write(self.content[start : end + 1])
+
+
+@pytest.fixture
+def server():
+    RangeHandler.content = CONTENT
+    RangeHandler.accept_ranges = True
+    RangeHandler.allow_head = True
+    RangeHandler.requested_ranges = []
+    RangeHandler.stalled_ranges = 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/data.bin"
+    httpd.shutdown()
+
+
+def test_download_with_range_requests(server, tmp_path):
+    target = tmp_path / "data.bin"
+    checksum = f"sha256:{hashlib.sha256(CONTENT).hexdigest()}"
+    download_url(server, target, checksum, connections=4, chunk_size=10_000)
+
+    assert CONTENT == target.read_bytes()
+    assert 26 == len(RangeHandler.requested_ranges)
+    assert not partial_path(target).exists()
+    assert not state_path(target).exists()
+
+
+def test_download_resumes_missing_chunks(server, tmp_path):
+    target = tmp_path / "data.bin"
+    partial_path(target).write_bytes(CONTENT[:100_000] + b"\0" * 156_000)
+    with open(state_path(target), "w") as fd:
+        json.dump(
+            {
+                "url": server,
+                "size": len(CONTENT),
+                "etag": None,
+                "chunk_size": 50_000,
+                "done": [0, 1],
+            },
+            fd,
+        )
+    download_url(server, target, connections=2, chunk_size=50_000)
+
+    assert CONTENT == target.read_bytes()
+    assert [
+        (100_000, 149_999),
+        (150_000, 199_999),
+        (200_000, 249_999),
+        (250_000, 255_999),
+    ] == sorted(RangeHandler.requested_ranges)
+
+
+def test_stalled_chunk_is_retried(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_module, "DOWNLOAD_TIMEOUT", 0.2)
+    RangeHandler.stalled_ranges = 1
+    target = tmp_path / "data.bin"
+    download_url(server, target, connections=2, chunk_size=100_000)
+
+    assert CONTENT == target.read_bytes()
+    assert 4 == len(RangeHandler.requested_ranges)
+
+
+def test_download_without_range_support(server, tmp_path):
+    RangeHandler.accept_ranges = False
+    target = tmp_path / "data.bin"
+    download_url(server, target, connections=4, chunk_size=10_000)
+
+    assert CONTENT == target.read_bytes()
+    assert [] == RangeHandler.requested_ranges
+
+
+def test_download_without_head_support(server, tmp_path):
+    RangeHandler.allow_head = False
+    target = tmp_path / "data.bin"
+    download_url(server, target, connections=4, chunk_size=100_000)
+
+    assert CONTENT == target.read_bytes()
+    assert 3 == len(RangeHandler.requested_ranges)
+
+
+def test_checksum_mismatch_removes_partial_file(server, tmp_path):
+    target = tmp_path / "data.bin"
+    with pytest.raises(DownloadError):
+        download_url(server, target, "md5:0000", connections=4, chunk_size=100_000)
+
+    assert not target.exists()
+    assert not partial_path(target).exists()
+
+
+def test_archive_is_extracted_while_downloading(server, tmp_path):
+    RangeHandler.content = make_archive()
+    target = tmp_path / "dataset"
+    checksum = f"sha256:{hashlib.sha256(RangeHandler.content).hexdigest()}"
+    extract_url(server, target, checksum)
+
+    assert CONTENT == (target / "vectors.npy").read_bytes()
+    assert b"{}\n" == (target / "tests.jsonl").read_bytes()
+    assert not partial_path(target).exists()
+
+
+def test_corrupted_archive_is_not_extracted(server, tmp_path):
+    RangeHandler.content = make_archive()
+    target = tmp_path / "dataset"
+    with pytest.raises(DownloadError):
+        extract_url(server, target, "sha256:0000")
+
+    assert not target.exists()
+    assert not partial_path(target).exists()
+
+
+def test_scheduler_downloads_by_priority(server, tmp_path):
+    started = []
+
+    def download(name):
+        def run(progress, limiter):
+            started.append(name)
+            download_url(server, tmp_path / name, progress=progress, limiter=limiter)
+
+        return run
+
+    scheduler = DownloadScheduler(max_files=1)
+    scheduler.add(tmp_path / "part-2", download("part-2"), priority=2)
+    scheduler.add(tmp_path / "part-1", download("part-1"), priority=1)
+    scheduler.add(tmp_path / "queries", download("queries"), priority=0)
+    scheduler.start()
+    scheduler.wait_for(tmp_path / "part-1")
+    assert (tmp_path / "part-1").exists()
+    scheduler.wait()
+
+    assert ["queries", "part-1", "part-2"] == started
+    assert 3 * len(CONTENT) == scheduler.progress.n
+
+
+def test_rate_limiter_throttles_after_burst():
+    limiter = RateLimiter(1000)
+    start = time.perf_counter()
+    limiter.consume(1000)
+    limiter.consume(200)
+    assert time.perf_counter() - start >= 0.15
+
+
+class FakeS3:
+    configs = []
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(CONTENT)}
+
+    def download_file(self, bucket, key, path, Config, Callback):
+        self.configs.append(Config)
+        with open(path, "wb") as fd:
+            for start in range(0, len(CONTENT), 10_000):
+                block = CONTENT[start : start + 10_000]
+                fd.write(block)
+                Callback(len(block))
+
+
+def test_s3_downloads_share_the_rate_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_module.boto3, "client", lambda service: FakeS3())
+    scheduler = DownloadScheduler(max_files=2, rate_limit=len(CONTENT))
+    for name in ["part-1", "part-2"]:
+        scheduler.add(
+            tmp_path / name,
+            lambda progress, limiter, name=name: download_s3(
+                "bucket", name, tmp_path / name, progress=progress, limiter=limiter
+            ),
+        )
+    start = time.perf_counter()
+    scheduler.start()
+    scheduler.wait()
+
+    # The burst covers one file, the other one is throttled by the shared limit
+    assert time.perf_counter() - start >= 0.9
+    assert all(config.max_bandwidth is None for config in FakeS3.configs)
+    assert CONTENT == (tmp_path / "part-2").read_bytes()
@@ -0,0 +1,59 @@
+import json
+
+import h5py
+import numpy as np
+import pytest
+
+from dataset_reader.ann_h5_multi_reader import AnnH5MultiReader
+from dataset_reader.splitter import split_dataset, write_manifest
+from dataset_reader.verify import verify_manifest
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / "random-8.hdf5"
+    with h5py.File(path, "w") as data:
+        data.create_dataset(
+            "train", data=np.arange(100 * 8, dtype=np.float32).reshape(100, 8)
+        )
+    return path
+
+
+@pytest.mark.parametrize("output_format", ["hdf5", "npy", "raw"])
+def test_split_parts_are_readable(input_path, tmp_path, output_format):
+    output_dir = tmp_path / "parts"
+    output_dir.mkdir()
+    entries = split_dataset(
+        str(input_path),
+        str(output_dir),
+        parts=3,
+        processes=2,
+        output_format=output_format,
+        checksum="sha256",
+    )
+
+    assert [(0, 34), (34, 68), (68, 100)] == [
+        (entry["start_idx"], entry["end_idx"]) for entry in entries
+    ]
+    assert all(entry["checksum"].startswith("sha256:") for entry in entries)
+
+    reader = AnnH5MultiReader(entries, query_file=None)
+    vectors = [record.vector for record in reader.read_data(10, 90)]
+    assert 80 == len(vectors)
+    assert list(np.arange(10 * 8, 11 * 8, dtype=np.float32)) == vectors[0]
+
+
+def test_manifest_is_verified(input_path, tmp_path):
+    entries = split_dataset(str(input_path), str(tmp_path), parts=2, checksum="md5")
+    manifest_path = tmp_path / "manifest.json"
+    write_manifest(entries, manifest_path, path_prefix="random-8")
+
+    with open(manifest_path) as fd:
+        manifest = json.load(fd)
+    assert "random-8/random-8-data-part1-0_to_50.hdf5" == manifest["data"][0]["path"]
+    assert verify_manifest(str(manifest_path), processes=1)
+
+    with open(tmp_path / "random-8-data-part2-50_to_100.hdf5", "r+b") as fd:
+        fd.seek(-8, 2)
+        fd.write(b"\1" * 8)
+    assert not verify_manifest(str(manifest_path), processes=1)
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+import dataset_reader.synthetic
+from dataset_reader.ann_compound_reader import AnnCompoundReader
+from dataset_reader.synthetic import (
+    SyntheticConfig,
+    SyntheticGenerator,
+    dataset_entry,
+    register_dataset,
+)
+
+
+def brute_force(vectors, query, distance):
+    if distance == "l2":
+        return np.argsort(((vectors - query) ** 2).sum(axis=1))
+    if distance == "cosine":
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.argsort(-(vectors @ query))
+
+
+@pytest.mark.parametrize("distance", ["cosine", "dot", "l2"])
+def test_ground_truth_is_exact(tmp_path, monkeypatch, distance):
+    # Several blocks, so that the running top is merged
+    monkeypatch.setattr(dataset_reader.synthetic, "BLOCK_SIZE", 70)
+    config = SyntheticConfig(
+        size=300, queries=5, top=10, distribution="clustered", clusters=4
+    )
+    SyntheticGenerator(config, 8, distance).generate(tmp_path / "dataset")
+
+    reader = AnnCompoundReader(tmp_path / "dataset")
+    vectors = np.array([record.vector for record in reader.read_data()])
+    assert (300, 8) == vectors.shape
+    for query in reader.read_queries():
+        expected = brute_force(vectors, np.array(query.vector), distance)[:10]
+        assert expected.tolist() == query.expected_result
+    assert not (tmp_path / "dataset.partial").exists()
+
+
+def test_queries_are_filtered_by_payload(tmp_path):
+    config = SyntheticConfig(
+        size=200,
+        queries=5,
+        top=10,
+        payload={"color": {"type": "keyword", "cardinality": 3}},
+        filter_field="color",
+    )
+    SyntheticGenerator(config, 4, "dot").generate(tmp_path / "dataset")
+
+    reader = AnnCompoundReader(tmp_path / "dataset")
+    payloads = [record.metadata for record in reader.read_data()]
+    for query in reader.read_queries():
+        value = query.meta_conditions["and"][0]["color"]["match"]["value"]
+        assert 10 == len(query.expected_result)
+        assert all(payloads[idx]["color"] == value for idx in query.expected_result)
+
+
+def test_register_dataset(tmp_path):
+    datasets_path = tmp_path / "datasets.json"
+    datasets_path.write_text('[\n  {\n    "name": "random-100"\n  }\n]\n')
+    config = SyntheticConfig(size=100)
+    register_dataset(dataset_entry("synthetic-a", 8, "l2", config), datasets_path)
+    register_dataset(dataset_entry("synthetic-a", 16, "l2", config), datasets_path)
+
+    datasets = json.loads(datasets_path.read_text())
+    assert ["random-100", "synthetic-a"] == [dataset["name"] for dataset in datasets]
+    assert 16 == datasets[1]["vector_size"]
+    assert config == SyntheticConfig(**datasets[1]["synthetic"])
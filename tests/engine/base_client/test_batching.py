@@ -0,0 +1,40 @@
+from engine.base_client.batching import AdaptiveBatchSize
+
+
+def test_batch_size_grows_additively_and_shrinks_multiplicatively():
+    adaptive = AdaptiveBatchSize(
+        {"target_latency": 1.0, "increase": 10, "decrease": 0.5}, initial_size=100
+    )
+    size = adaptive.next_size()
+    adaptive.feedback(0, latency=0.5, size=size, errors=0)
+    assert 110 == adaptive.size
+
+    size = adaptive.next_size()
+    adaptive.feedback(1, latency=0.5, size=size, errors=1)
+    assert 55 == adaptive.size
+    assert [100, 110, 55] == [entry["batch_size"] for entry in adaptive.history]
+
+
+def test_batches_created_before_decrease_are_ignored():
+    adaptive = AdaptiveBatchSize({"target_latency": 1.0}, initial_size=64)
+    sizes = [adaptive.next_size() for _ in range(3)]
+    adaptive.feedback(0, latency=2.0, size=sizes[0], errors=0)
+    assert 32 == adaptive.size
+
+    # Batches 1 and 2 still have the previous size
+    adaptive.feedback(1, latency=2.0, size=sizes[1], errors=0)
+    adaptive.feedback(2, latency=0.1, size=sizes[2], errors=0)
+    assert 32 == adaptive.size
+
+
+def test_batch_size_is_bounded():
+    adaptive = AdaptiveBatchSize(
+        {"min_batch_size": 16, "max_batch_size": 128, "increase": 100}, 120
+    )
+    adaptive.feedback(0, latency=0.1, size=adaptive.next_size(), errors=0)
+    assert 128 == adaptive.size
+
+    for batch_number in range(1, 10):
+        size = adaptive.next_size()
+        adaptive.feedback(batch_number, latency=5.0, size=size, errors=0)
+    assert 16 == adaptive.size
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from engine.base_client.bulk import parse_doc_id, wait_for_merge
+
+
+class FakeMerge:
+    """
+    Merges 100 bytes into one segment on every poll, completed after 3 polls.
+    """
+
+    def __init__(self):
+        self.polls = 0
+        self.tasks = SimpleNamespace(get=self.get_task)
+        self.indices = SimpleNamespace(stats=self.stats)
+
+    def get_task(self, task_id):
+        self.polls += 1
+        return {"completed": self.polls >= 3, "task": {"id": task_id}}
+
+    def stats(self, index, metric):
+        return {
+            "_all": {
+                "primaries": {
+                    "segments": {"count": 4 - self.polls},
+                    "store": {"size_in_bytes": 1000 - 10 * self.polls},
+                    "merges": {"total_size_in_bytes": 500 + 100 * self.polls},
+                }
+            }
+        }
+
+
+def test_merge_is_tracked_until_the_task_completes():
+    stats = wait_for_merge(FakeMerge(), "node:1", "bench")
+
+    assert 3 == stats["polls"]
+    assert 1 == stats["segments"]
+    assert 970 == stats["size_in_bytes"]
+    assert 200 == stats["merged_bytes"]
+    assert stats["merge_throughput"] > 0
+    assert "merged_bytes_rate" not in stats["timeline"][0]
+    assert all(s["merged_bytes_rate"] > 0 for s in stats["timeline"][1:])
+
+
+def test_parse_doc_id():
+    assert 16 == parse_doc_id("00000000000000000000000000000010")
+    assert 10 == parse_doc_id("10")
@@ -0,0 +1,37 @@
+from engine.base_client.checkpoint import UploadCheckpoint
+
+
+def test_checkpoint_is_restored_after_save(tmp_path):
+    path = tmp_path / "checkpoints" / "upload.json"
+    checkpoint = UploadCheckpoint(path, interval=3600)
+    checkpoint.update(63, 64)
+    checkpoint.update(127, 64)
+    assert not path.exists()
+
+    checkpoint.save()
+    restored = UploadCheckpoint(path)
+    assert restored.load()
+    assert 127 == restored.last_id
+    assert 128 == restored.uploaded
+    assert not restored.completed
+
+
+def test_missing_checkpoint_is_not_loaded(tmp_path):
+    checkpoint = UploadCheckpoint(tmp_path / "upload.json")
+    assert not checkpoint.load()
+    assert checkpoint.last_id is None
+
+
+def test_reset_overwrites_the_previous_run(tmp_path):
+    path = tmp_path / "upload.json"
+    previous = UploadCheckpoint(path)
+    previous.update(127, 128)
+    previous.complete()
+
+    checkpoint = UploadCheckpoint(path, interval=3600)
+    checkpoint.reset()
+    restored = UploadCheckpoint(path)
+    assert restored.load()
+    assert restored.last_id is None
+    assert 0 == restored.uploaded
+    assert not restored.completed
@@ -0,0 +1,127 @@
+import json
+import os
+
+import pytest
+
+import engine.base_client.mixed as mixed_module
+from dataset_reader.base_reader import BaseReader, Record
+from engine.base_client.mixed import MixedWorkload
+from engine.base_client.upload import BaseUploader
+
+
+class FakeReader(BaseReader):
+    def __init__(self, n):
+        self.n = n
+
+    def read_data(self, start_idx=0, end_idx=-1):
+        for i in range(self.n):
+            yield Record(id=i, vector=[float(i)], metadata=None)
+
+
+class FileUploader(BaseUploader):
+    """
+    Appends the ids of every written batch to a file, as the batches are
+    written by the writer process.
+    """
+
+    path = None
+
+    @classmethod
+    def init_client(cls, host, distance, connection_params, upload_params):
+        cls.path = connection_params["path"]
+
+    @classmethod
+    def upload_batch(cls, ids, vectors, metadata):
+        with open(cls.path, "a") as out:
+            out.write(json.dumps(ids) + "\n")
+
+    @classmethod
+    def delete_client(cls):
+        pass
+
+
+class CopyUploader(FileUploader):
+    OVERWRITES_BY_ID = False
+
+
+class CrashingReader(FakeReader):
+    def read_data(self, start_idx=0, end_idx=-1):
+        os._exit(3)
+
+
+def make_workload(uploader_class, path, config):
+    uploader = uploader_class(None, {"path": str(path)}, {"batch_size": 2})
+    return MixedWorkload(uploader, config)
+
+
+def written_ids(path):
+    with open(path) as f:
+        return [idx for line in f for idx in json.loads(line)]
+
+
+def test_held_out_records_are_written_by_the_workload(tmp_path):
+    workload = make_workload(FileUploader, tmp_path / "ids", {"holdout_every": 3})
+    reader = FakeReader(10)
+    assert [1, 2, 4, 5, 7, 8] == [
+        record.id for record in workload.initial_records(reader.read_data())
+    ]
+    assert [0, 3, 6, 9] == [
+        record.id for record in workload.write_records(reader.read_data())
+    ]
+
+
+def test_records_are_written_once_without_overwrites(tmp_path):
+    path = tmp_path / "ids"
+    workload = make_workload(CopyUploader, path, {"holdout_every": 3})
+    for _ in range(2):
+        workload.start(None, FakeReader(10))
+        # The writer exits once all the held-out records are written
+        workload._process.join()
+        stats = workload.stop()
+    # The second search has nothing left to write
+    assert 0 == stats["written_vectors"]
+    assert [0, 3, 6, 9] == written_ids(path)
+
+
+def test_records_are_rewritten_with_overwrites(tmp_path):
+    path = tmp_path / "ids"
+    workload = make_workload(FileUploader, path, {"mode": "reinsert"})
+    workload.start(None, FakeReader(4))
+    # The writer keeps rewriting the records until it is stopped
+    while not path.exists() or len(written_ids(path)) <= 4:
+        pass
+    stats = workload.stop()
+    assert stats["written_vectors"] >= 4
+    assert [0, 1, 2, 3] == written_ids(path)[:4]
+
+
+def test_reinsert_requires_overwrites(tmp_path):
+    with pytest.raises(ValueError):
+        make_workload(CopyUploader, tmp_path / "ids", {"mode": "reinsert"})
+
+
+def test_stop_fails_when_the_writer_exits(tmp_path):
+    workload = make_workload(FileUploader, tmp_path / "ids", {})
+    workload.start(None, CrashingReader(10))
+    workload._process.join()
+    with pytest.raises(RuntimeError, match="code 3"):
+        workload.stop()
+
+
+def test_stop_times_out(tmp_path, monkeypatch):
+    class SlowUploader(FileUploader):
+        @classmethod
+        def upload_batch(cls, ids, vectors, metadata):
+            super().upload_batch(ids, vectors, metadata)
+            while True:
+                pass
+
+    monkeypatch.setattr(mixed_module, "MIXED_STOP_TIMEOUT", 0.5)
+    path = tmp_path / "ids"
+    workload = make_workload(SlowUploader, path, {"mode": "reinsert"})
+    workload.start(None, FakeReader(10))
+    while not path.exists():
+        pass
+    with pytest.raises(TimeoutError):
+        workload.stop()
+    assert workload._process is None
@@ -0,0 +1,111 @@
+import functools
+import multiprocessing
+import os
+import pstats
+import time
+
+import engine.base_client.profiling as profiling_module
+from engine.base_client.profiling import (
+    ClientMonitor,
+    dump_local_profile,
+    enable_local_profile,
+    init_worker,
+    run_profiled,
+    worker_pids,
+)
+
+
+def current_pid(_):
+    return os.getpid()
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_only_the_given_workers_are_sampled():
+    ctx = multiprocessing.get_context("spawn")
+    worker = ctx.Process(target=busy_loop, args=(2.0,))
+    other = ctx.Process(target=busy_loop, args=(2.0,))
+    worker.start()
+    other.start()
+    try:
+        monitor = ClientMonitor(interval=0.05)
+        monitor.start([worker.pid])
+        time.sleep(0.5)
+        stats = monitor.stop()
+    finally:
+        worker.join()
+        other.join()
+
+    assert {"main", f"worker-{worker.pid}"} == set(stats["cpu_percent"])
+    assert stats["cpu_percent"][f"worker-{worker.pid}"]["peak"] > 0
+
+
+def test_exited_workers_are_skipped():
+    ctx = multiprocessing.get_context("spawn")
+    worker = ctx.Process(target=busy_loop, args=(0.0,))
+    worker.start()
+    worker.join()
+
+    monitor = ClientMonitor(interval=0.05)
+    monitor.start([worker.pid])
+    time.sleep(0.2)
+    stats = monitor.stop()
+
+    assert ["main"] == list(stats["cpu_percent"])
+
+
+def test_pending_tasks_and_saturation(monkeypatch):
+    monkeypatch.setattr(profiling_module, "CLIENT_BOUND_CPU_THRESHOLD", 0.0)
+    monitor = ClientMonitor(interval=0.05)
+    monitor.start()
+    # Two tasks are dispatched, their results are consumed later
+    pending = list(monitor.track_dispatched(range(2)))
+    time.sleep(0.2)
+    list(monitor.track_completed(pending))
+    stats = monitor.stop()
+
+    assert 2 == monitor.dispatched == monitor.completed
+    assert 2 == stats["max_pending_tasks"]
+    assert stats["client_bound"]
+
+
+def test_worker_pids():
+    with multiprocessing.get_context("spawn").Pool(processes=2) as pool:
+        pids = worker_pids(pool)
+        assert 2 == len(pids)
+        assert set(pool.map(current_pid, range(20), chunksize=1)) <= set(pids)
+
+
+def test_local_profile(tmp_path):
+    path = tmp_path / "client.prof"
+    assert 3 == run_profiled(sum, [1, 2])
+
+    enable_local_profile(str(path))
+    assert 3 == run_profiled(sum, [1, 2])
+    dump_local_profile()
+
+    assert any("sum" in str(func) for func in pstats.Stats(str(path)).stats)
+
+
+def test_worker_profile_is_dumped_on_exit(tmp_path):
+    path = tmp_path / "worker.prof"
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(
+        processes=1,
+        initializer=init_worker,
+        initargs=(ctx.Lock(), str(path), int, 0),
+    ) as pool:
+        # The periodic dump is done after the first task only
+        pool.map(functools.partial(run_profiled, busy_loop), [0.01] * 5)
+        pool.close()
+        pool.join()
+
+    stats = pstats.Stats(str(path)).stats
+    (calls,) = [
+        stat[1] for func, stat in stats.items() if func[2] == busy_loop.__name__
+    ]
+    assert 5 == calls
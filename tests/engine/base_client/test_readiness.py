@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from engine.base_client.readiness import ReadinessWait
+
+
+class FakeIndex:
+    """
+    Indexes at a constant rate, completed after `duration` seconds.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.start = time.perf_counter()
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.start
+        return {"progress": min(elapsed / self.duration, 1.0)}
+
+
+def test_completion_time_is_interpolated():
+    index = FakeIndex(0.3)
+    stats = ReadinessWait(
+        index.progress,
+        lambda sample: sample["progress"] >= 1.0,
+        min_interval=0.01,
+        max_interval=0.2,
+    ).wait()
+
+    assert stats["completion_time"] == pytest.approx(0.3, abs=0.03)
+    assert stats["completion_time"] <= stats["ready_time"]
+    assert stats["polls"] == len(stats["timeline"])
+    assert 1.0 == stats["timeline"][-1]["progress"]
+
+
+def test_interval_grows_without_progress():
+    samples = iter([False] * 5 + [True])
+    stats = ReadinessWait(
+        lambda: {"ready": next(samples)},
+        lambda sample: sample["ready"],
+        min_interval=0.01,
+        max_interval=0.04,
+    ).wait()
+
+    times = [sample["time"] for sample in stats["timeline"]]
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    assert intervals[0] < intervals[-1]
+    assert (times[-2] + times[-1]) / 2 == stats["completion_time"]
+
+
+def test_readiness_is_confirmed():
+    samples = iter([True, False, True, True])
+    stats = ReadinessWait(
+        lambda: {"ready": next(samples)},
+        lambda sample: sample["ready"],
+        confirmations=2,
+        confirm_interval=0.01,
+        min_interval=0.01,
+    ).wait()
+
+    assert 4 == stats["polls"]
+    assert stats["timeline"][2]["time"] == stats["ready_time"]
+
+
+def test_timeout():
+    with pytest.raises(TimeoutError):
+        ReadinessWait(
+            lambda: {}, lambda sample: False, min_interval=0.01, timeout=0.05
+        ).wait()
@@ -0,0 +1,230 @@
+import pytest
+
+import engine.base_client.search as search_module
+from dataset_reader.base_reader import Query
+from engine.base_client.search import BaseSearcher
+
+
+class FakeSearcher(BaseSearcher):
+    """
+    Returns the first vector component as the only hit, records the batches.
+    """
+
+    batches = []
+
+    @classmethod
+    def init_client(cls, host, distance, connection_params, search_params):
+        cls.batches = []
+
+    @classmethod
+    def search_batch(cls, vectors, meta_conditions, top):
+        cls.batches.append(len(vectors))
+        return [[(int(vector[0]), 1.0)] for vector in vectors]
+
+
+def make_queries(n):
+    return [
+        Query(vector=[float(i)], meta_conditions=None, expected_result=[i])
+        for i in range(n)
+    ]
+
+
+def test_queries_are_searched_in_batches():
+    searcher = FakeSearcher("localhost", {}, {"batch_size": 3})
+    results = searcher.search_all("cosine", make_queries(7))
+
+    assert [3, 3, 1] == FakeSearcher.batches
+    assert 1.0 == results["mean_precisions"]
+    assert 7 == len(results["latencies"])
+    assert 3 == results["batch_size"]
+    # All the queries of a batch wait for the whole request
+    assert results["latencies"][0] == results["latencies"][2]
+    amortized = results["query_stats"]["amortized_time"]
+    assert amortized["max"] <= results["max_time"]
+
+
+def test_engine_params_exclude_the_benchmark_params():
+    params = {
+        "parallel": 4,
+        "top": 10,
+        "batch_size": 8,
+        "duration": 60,
+        "min_queries": 1000,
+        "warmup_queries": 100,
+        "warmup_duration": 5,
+        "warmup_subset": [0, 100],
+        "num_candidates": 200,
+    }
+
+    assert {"num_candidates": 200} == FakeSearcher.engine_params(params)
+
+
+def test_search_loop_in_batches():
+    results = FakeSearcher._search_loop(
+        0, make_queries(5), workers=1, count=6, batch_size=4
+    )
+
+    assert [4, 4] == FakeSearcher.batches[-2:]
+    assert [0, 1, 2, 3, 4, 0, 1, 2] == [idx for idx, *_ in results]
+    precisions, _, _, _ = FakeSearcher._unique_precisions(results)
+    assert 5 == len(precisions)
+
+
+class FlakySearcher(FakeSearcher):
+    """
+    Fails the queries with a negative vector.
+    """
+
+    SEARCH_ERRORS = (ValueError,)
+
+    @classmethod
+    def search_one(cls, vector, meta_conditions, top):
+        if vector[0] < 0:
+            raise ValueError("invalid vector")
+        return [(int(vector[0]), 1.0)]
+
+
+def test_failed_queries_are_counted():
+    queries = make_queries(3) + [
+        Query(vector=[-1.0], meta_conditions=None, expected_result=[1])
+    ]
+    results = FlakySearcher("localhost", {}, {}).search_all("cosine", queries)
+
+    assert 1 == results["errors"]
+    assert 0.25 == results["error_rate"]
+    assert 3 == len(results["latencies"])
+    assert 1.0 == results["mean_precisions"]
+    assert 1 == sum(bucket["errors"] for bucket in results["timeline"])
+
+
+def test_warmup_with_batches():
+    searcher = FakeSearcher(
+        "localhost", {}, {"batch_size": 4, "warmup_queries": 8, "warmup_subset": [0, 5]}
+    )
+    results = searcher.search_all("cosine", make_queries(10))
+
+    # Two warmup batches of the subset, then the timed batches
+    assert [4, 4, 4, 4, 2] == FakeSearcher.batches
+    assert 8 == results["warmup"]["queries"]
+    assert 10 == len(results["latencies"])
+    assert 1.0 == results["mean_precisions"]
+
+
+def test_empty_warmup_subset_is_rejected():
+    searcher = FakeSearcher(
+        "localhost", {}, {"warmup_queries": 8, "warmup_subset": [0, 0]}
+    )
+    with pytest.raises(ValueError):
+        searcher.search_all("cosine", make_queries(10))
+
+
+class RecordingSearcher(BaseSearcher):
+    """
+    Searches single queries, records their vectors, misses the query 3.
+    """
+
+    searched = []
+
+    @classmethod
+    def init_client(cls, host, distance, connection_params, search_params):
+        cls.searched = []
+
+    @classmethod
+    def search_one(cls, vector, meta_conditions, top):
+        cls.searched.append(int(vector[0]))
+        if vector[0] == 3:
+            return [(-1, 1.0)]
+        return [(int(vector[0]), 1.0)]
+
+
+def test_warmup_queries_are_not_timed():
+    searcher = RecordingSearcher(
+        "localhost", {}, {"warmup_queries": 4, "warmup_subset": [6, 8]}
+    )
+    results = searcher.search_all("cosine", make_queries(10))
+
+    # The warmup cycles through the subset, then all the queries are timed
+    assert [6, 7, 6, 7] + list(range(10)) == RecordingSearcher.searched
+    assert 4 == results["warmup"]["queries"]
+    assert results["warmup"]["p99_time"] <= results["warmup"]["max_time"]
+    assert 10 == len(results["latencies"])
+    assert 0.9 == results["mean_precisions"]
+
+
+def test_warmup_duration():
+    searcher = RecordingSearcher("localhost", {}, {"warmup_duration": 0.05})
+    results = searcher.search_all("cosine", make_queries(10))
+
+    assert results["warmup"]["total_time"] >= 0.05
+    assert results["warmup"]["queries"] == len(RecordingSearcher.searched) - 10
+
+
+def test_no_warmup_by_default():
+    results = RecordingSearcher("localhost", {}, {}).search_all(
+        "cosine", make_queries(3)
+    )
+
+    assert results["warmup"] is None
+    assert [0, 1, 2] == RecordingSearcher.searched
+
+
+def test_search_loop_starts_at_the_worker_offset():
+    results = RecordingSearcher._search_loop(1, make_queries(10), workers=2, count=7)
+
+    assert [5, 6, 7, 8, 9, 0, 1] == [idx for idx, *_ in results]
+
+
+def test_search_loop_measures_precision_of_first_occurrences():
+    results = RecordingSearcher._search_loop(0, make_queries(4), workers=1, count=10)
+
+    assert 10 == len(results)
+    assert [1.0, 1.0, 1.0, 0.0] == [precision for _, precision, *_ in results[:4]]
+    assert all(precision is None for _, precision, *_ in results[4:])
+    precisions, latencies, ends, _ = RecordingSearcher._unique_precisions(results)
+    assert [1.0, 1.0, 1.0, 0.0] == precisions
+    assert 10 == len(latencies) == len(ends)
+
+
+class FakeClock:
+    """
+    Advances by 1ms on every reading, so the loop bounds do not depend on the
+    scheduling of the test.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        self.now += 0.001
+        return self.now
+
+
+def test_search_loop_duration(monkeypatch):
+    monkeypatch.setattr(search_module, "time", FakeClock())
+    results = RecordingSearcher._search_loop(
+        0, make_queries(4), workers=1, duration=0.05
+    )
+
+    assert len(results) > 4
+    # No query is started after the deadline
+    first_start = results[0][3] - results[0][2]
+    last_start = results[-1][3] - results[-1][2]
+    assert last_start < first_start + 0.05
+
+
+def test_search_loop_runs_until_min_queries():
+    results = RecordingSearcher._search_loop(
+        0, make_queries(4), workers=1, duration=0.001, count=50
+    )
+
+    assert len(results) >= 50
+
+
+def test_min_queries_repeats_the_queries():
+    searcher = RecordingSearcher("localhost", {}, {"min_queries": 10})
+    results = searcher.search_all("cosine", make_queries(4))
+
+    assert 10 == len(results["latencies"])
+    # Precision of the unique queries only
+    assert 4 == len(results["precisions"])
+    assert 0.75 == results["mean_precisions"]
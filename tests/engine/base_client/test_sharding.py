@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from engine.base_client.sharding import (
+    MAX_SHARD_ATTEMPTS,
+    RemoteSlot,
+    run_shards,
+    split_shards,
+)
+
+ARGS = ("engine", "dataset", "localhost")
+
+
+class FakeSlot:
+    """
+    Uploads a shard in `duration` seconds, or fails the shards in `fails`.
+    """
+
+    def __init__(self, name, duration=0.01, fails=(), slow=()):
+        self.name = name
+        self.duration = duration
+        self.fails = set(fails)
+        self.slow = set(slow)
+        self.runs = []
+
+    def run(self, engine, dataset, host, start, end, resume):
+        self.runs.append((start, end))
+        time.sleep(2.0 if (start, end) in self.slow else self.duration)
+        if (start, end) in self.fails:
+            raise RuntimeError(f"{self.name} failed")
+        return {"uploaded_vectors": end - start}
+
+
+def test_split_shards():
+    assert [(0, 4), (4, 8), (8, 10)] == split_shards(0, 10, 4)
+    assert [(5, 10)] == split_shards(5, 10, 100)
+
+
+def test_all_shards_are_uploaded_once():
+    slots = [FakeSlot("a"), FakeSlot("b")]
+    shards = split_shards(0, 10, 2)
+    results, stats = run_shards(slots, shards, ARGS, resume=False)
+
+    assert set(shards) == set(results)
+    assert 10 == sum(result["uploaded_vectors"] for result in results.values())
+    assert 5 == sum(len(slot.runs) for slot in slots)
+    assert 0 == stats["failed_attempts"]
+
+
+def test_failed_shard_is_retried_on_another_slot():
+    slots = [FakeSlot("a", fails=[(0, 1)]), FakeSlot("b")]
+    results, stats = run_shards(slots, [(0, 1)], ARGS, resume=False)
+
+    assert "b" == results[(0, 1)]["worker"]
+    assert 2 == results[(0, 1)]["attempts"]
+    assert 1 == stats["failed_attempts"]
+
+
+def test_shard_fails_after_max_attempts():
+    slots = [FakeSlot("a", fails=[(0, 1)])]
+    with pytest.raises(RuntimeError, match=f"failed {MAX_SHARD_ATTEMPTS} times"):
+        run_shards(slots, [(0, 1)], ARGS, resume=False)
+    assert MAX_SHARD_ATTEMPTS == len(slots[0].runs)
+
+
+def test_straggler_is_run_again():
+    fast, slow = FakeSlot("fast"), FakeSlot("slow", slow=[(1, 2)])
+    results, stats = run_shards(
+        [fast, slow], [(0, 1), (1, 2), (2, 3)], ARGS, resume=False
+    )
+
+    assert 1 == stats["speculative_runs"]
+    assert "fast" == results[(1, 2)]["worker"]
+    assert [(1, 2)] == slow.runs
+
+
+def test_stragglers_are_not_run_again_without_overwrites():
+    fast, slow = FakeSlot("fast"), FakeSlot("slow", slow=[(1, 2)])
+    results, stats = run_shards(
+        [fast, slow], [(0, 1), (1, 2), (2, 3)], ARGS, resume=False, speculative=False
+    )
+
+    assert 0 == stats["speculative_runs"]
+    assert "slow" == results[(1, 2)]["worker"]
+    assert (1, 2) not in fast.runs
+
+
+@pytest.fixture
+def worker():
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if request["start"] < 0:
+                result = {"error": "ValueError()"}
+            else:
+                time.sleep(request["start"])
+                result = {"uploaded_vectors": request["end"] - request["start"]}
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps(result).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://localhost:{server.server_address[1]}/"
+    server.shutdown()
+
+
+def test_remote_slot(worker):
+    slot = RemoteSlot(worker, 0, timeout=5.0)
+    assert {"uploaded_vectors": 10} == slot.run(*ARGS, 0, 10, False)
+    with pytest.raises(RuntimeError, match="ValueError"):
+        slot.run(*ARGS, -1, 10, False)
+
+
+def test_remote_slot_timeout(worker):
+    slot = RemoteSlot(worker, 0, timeout=0.2)
+    with pytest.raises(RuntimeError, match=r"Shard \[1:10\] failed"):
+        slot.run(*ARGS, 1, 10, False)
@@ -0,0 +1,38 @@
+from engine.base_client.stats import (
+    aggregate_repetitions,
+    bootstrap_ci,
+    detect_outliers,
+)
+
+
+def test_bootstrap_ci_contains_mean():
+    values = [100.0, 102.0, 98.0, 101.0, 99.0]
+    low, high = bootstrap_ci(values)
+    assert low <= 100.0 <= high
+
+
+def test_bootstrap_ci_single_value_is_degenerate():
+    assert (5.0, 5.0) == bootstrap_ci([5.0])
+
+
+def test_detect_outliers_flags_cold_run():
+    assert [0] == detect_outliers([50.0, 100.0, 101.0, 99.0, 100.5])
+
+
+def test_detect_outliers_ignores_identical_values():
+    assert [] == detect_outliers([100.0, 100.0, 100.0])
+
+
+def test_aggregate_repetitions_excludes_outliers():
+    repetitions = [
+        {"rps": 50.0, "p99_time": 0.5},
+        {"rps": 100.0, "p99_time": 0.1},
+        {"rps": 101.0, "p99_time": 0.1},
+        {"rps": 99.0, "p99_time": 0.1},
+    ]
+    summary = aggregate_repetitions(repetitions)
+
+    assert [0] == summary["outliers"]
+    assert 3 == summary["used_repetitions"]
+    assert 100.0 == summary["metrics"]["rps"]["median"]
+    assert "mean_precisions" not in summary["metrics"]
@@ -0,0 +1,22 @@
+from engine.base_client.timeline import build_timeline
+
+
+def test_build_timeline_groups_events_into_buckets():
+    events = [
+        (10.2, 0.1, 64, 0),
+        (10.9, 0.3, 64, 0),
+        (12.5, 0.2, 32, 1),
+    ]
+    timeline = build_timeline(events, start=10.0, interval=1.0)
+
+    assert 3 == len(timeline)
+    assert 2 == timeline[0]["operations"]
+    assert 128 == timeline[0]["vectors"]
+    assert 128.0 == timeline[0]["vectors_per_second"]
+    assert 0 == timeline[1]["operations"]
+    assert timeline[1]["p50_time"] is None
+    assert 1 == timeline[2]["errors"]
+
+
+def test_build_timeline_handles_no_events():
+    assert [] == build_timeline([], start=0.0)
@@ -0,0 +1,46 @@
+import pytest
+
+import engine.base_client.upload as upload_module
+from engine.base_client.upload import BaseUploader
+
+
+class FlakyUploader(BaseUploader):
+    failures = []
+    calls = 0
+
+    @classmethod
+    def upload_batch(cls, ids, vectors, metadata):
+        cls.calls += 1
+        if cls.failures:
+            raise cls.failures.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload_module, "UPLOAD_RETRY_BASE_DELAY", 0.0)
+    FlakyUploader.calls = 0
+
+
+def test_transport_errors_are_retried():
+    FlakyUploader.failures = [ConnectionError("reset"), TimeoutError("timed out")]
+    _, _, size, retries, _ = FlakyUploader._upload_batch(
+        ([1, 2], [[0.1], [0.2]], [None, None])
+    )
+    assert 2 == size
+    assert 2 == retries
+    assert 3 == FlakyUploader.calls
+
+
+def test_other_errors_are_not_retried():
+    FlakyUploader.failures = [KeyError("id")]
+    with pytest.raises(KeyError):
+        FlakyUploader._upload_batch(([1], [[0.1]], [None]))
+    assert 1 == FlakyUploader.calls
+
+
+def test_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(FlakyUploader, "MAX_RETRIES", 2)
+    FlakyUploader.failures = [ConnectionError("reset")] * 3
+    with pytest.raises(ConnectionError):
+        FlakyUploader._upload_batch(([1], [[0.1]], [None]))
+    assert 3 == FlakyUploader.calls
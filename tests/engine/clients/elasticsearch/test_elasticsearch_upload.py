@@ -0,0 +1,92 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import BulkIndexError
+
+import engine.base_client.bulk as bulk_module
+import engine.base_client.upload as upload_module
+from engine.base_client.bulk import BulkRetriesExhausted
+from engine.clients.elasticsearch import upload
+from engine.clients.elasticsearch.upload import ElasticUploader
+
+
+class FakeBulk:
+    """
+    Rejects the given documents with the given statuses on their first tries.
+    """
+
+    def __init__(self, rejections, tries=1):
+        self.rejections = {doc_id: [s] * tries for doc_id, s in rejections.items()}
+        self.documents = {}
+        self.requests = 0
+
+    def __call__(self, operations, index, **kwargs):
+        self.requests += 1
+        items = []
+        for header, body in zip(operations[::2], operations[1::2]):
+            doc_id = json.loads(header)["index"]["_id"]
+            statuses = self.rejections.get(doc_id)
+            status = statuses.pop() if statuses else 201
+            if status == 201:
+                self.documents[doc_id] = json.loads(body)
+            items.append({"index": {"_id": str(doc_id), "status": status}})
+        return SimpleNamespace(body={"errors": True, "items": items})
+
+
+@pytest.fixture
+def uploader(monkeypatch):
+    monkeypatch.setattr(
+        upload,
+        "get_es_client",
+        lambda host, connection_params: Elasticsearch(f"http://{host}:9200"),
+    )
+    monkeypatch.setattr(bulk_module, "UPLOAD_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(upload_module, "UPLOAD_RETRY_BASE_DELAY", 0.0)
+    ElasticUploader.init_client(
+        "localhost", "cosine", {}, {"bulk": {"chunk_size": 2, "max_retries": 1}}
+    )
+    return ElasticUploader
+
+
+def test_rejected_documents_are_retried(uploader, monkeypatch):
+    bulk = FakeBulk({1: 429, 2: 503})
+    monkeypatch.setattr(Elasticsearch, "bulk", bulk)
+
+    uploader.upload_batch([0, 1, 2], [[0.0], [1.0], [2.0]], [{"a": 0}, None, None])
+
+    assert {0: {"vector": [0.0], "a": 0}, 1: {"vector": [1.0]}} == {
+        doc_id: bulk.documents[doc_id] for doc_id in (0, 1)
+    }
+    assert 3 == len(bulk.documents)
+    # Two chunks, then a single chunk of the two rejected documents
+    assert 3 == bulk.requests
+    assert {"document_errors": 2, "document_retries": 2} == uploader.pop_batch_stats()
+    assert {"document_errors": 0, "document_retries": 0} == uploader.pop_batch_stats()
+
+
+def test_invalid_documents_are_not_retried(uploader, monkeypatch):
+    bulk = FakeBulk({1: 400, 2: 429})
+    monkeypatch.setattr(Elasticsearch, "bulk", bulk)
+
+    # Not sent again by the base uploader either
+    with pytest.raises(BulkIndexError):
+        uploader._upload_batch(([0, 1, 2], [[0.0], [1.0], [2.0]], [None] * 3))
+    assert 2 == bulk.requests
+
+
+def test_exhausted_retries_resend_the_batch(uploader, monkeypatch):
+    # Rejected until the third batch, each retried once in the bulk uploader
+    bulk = FakeBulk({1: 429}, tries=4)
+    monkeypatch.setattr(Elasticsearch, "bulk", bulk)
+
+    with pytest.raises(BulkRetriesExhausted):
+        uploader.upload_batch([0, 1], [[0.0], [1.0]], None)
+    assert 2 == bulk.requests
+
+    _, _, size, retries, _ = uploader._upload_batch(([0, 1], [[0.0], [1.0]], None))
+    assert 2 == size
+    assert 1 == retries
+    assert 5 == bulk.requests
+    assert {0, 1} == set(bulk.documents)
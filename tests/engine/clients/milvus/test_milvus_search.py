@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from dataset_reader.base_reader import Query
+from engine.clients.milvus.parser import MilvusConditionParser
+from engine.clients.milvus.search import MilvusSearcher
+
+
+class FakeSearch:
+    """
+    Returns the first vector component as the only hit, records the filters
+    and the number of the filters parsed so far.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.exprs = []
+        self.parsed = []
+
+    def __call__(self, data, limit, expr):
+        self.exprs.append(expr)
+        self.parsed.append(self.parser.calls)
+        return [
+            SimpleNamespace(ids=[int(vector[0])], distances=[1.0]) for vector in data
+        ]
+
+
+class CountingParser(MilvusConditionParser):
+    calls = 0
+
+    def parse(self, meta_conditions):
+        self.calls += 1
+        return super().parse(meta_conditions)
+
+
+def make_queries(n):
+    return [
+        Query(
+            vector=[float(i)],
+            meta_conditions={"and": [{"color": {"match": {"value": f"c{i % 2}"}}}]},
+            expected_result=[i],
+        )
+        for i in range(n)
+    ]
+
+
+def test_filters_are_converted_before_the_search(monkeypatch):
+    parser = CountingParser()
+    search = FakeSearch(parser)
+    monkeypatch.setattr(MilvusSearcher, "parser", parser)
+    monkeypatch.setattr(
+        MilvusSearcher,
+        "init_client",
+        classmethod(lambda cls, *args: setattr(cls, "search", search)),
+    )
+    searcher = MilvusSearcher("localhost", {}, {"batch_size": 4})
+    results = searcher.search_all("cosine", make_queries(8))
+
+    # All of them before the first search, once per query
+    assert [8, 8, 8, 8] == search.parsed
+    assert 1.0 == results["mean_precisions"]
+    assert {'(color == "c0")', '(color == "c1")'} == set(search.exprs)
+    # Every batch is searched in one request per filter
+    assert 4 == len(search.exprs)
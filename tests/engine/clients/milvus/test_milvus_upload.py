@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+from pymilvus import BulkInsertState, DataType, FieldSchema, MilvusException
+
+import engine.base_client.upload as base_upload
+from engine.base_client.mixed import MixedWorkload
+from engine.clients.milvus import upload as milvus_upload
+from engine.clients.milvus.upload import BulkInsertRequestError, MilvusUploader
+
+PAYLOAD_FIELDS = [
+    FieldSchema("color", DataType.VARCHAR, max_length=500),
+    FieldSchema("price", DataType.DOUBLE),
+]
+
+
+class FakeTask:
+    def __init__(self, state, row_count=0, failed_reason=""):
+        self.state = state
+        self.row_count = row_count
+        self.failed_reason = failed_reason
+
+
+class FakeUtility:
+    """
+    Bulk insert tasks, which are completed on their second state request. The
+    collection has a task of an earlier run, which never completes.
+    """
+
+    def __init__(self, rows_per_task=2, fail_request=False):
+        self.rows_per_task = rows_per_task
+        self.fail_request = fail_request
+        self.requests = []
+        self.tasks = {0: FakeTask(BulkInsertState.ImportPending)}
+        self.polled = set()
+
+    def do_bulk_insert(self, collection_name, files, using):
+        self.requests.append(files)
+        if self.fail_request:
+            raise MilvusException(message="connection reset")
+        task_id = len(self.tasks)
+        self.tasks[task_id] = FakeTask(BulkInsertState.ImportStarted)
+        return task_id
+
+    def get_bulk_insert_state(self, task_id, using):
+        task = self.tasks[task_id]
+        if task_id in self.polled and task.state == BulkInsertState.ImportStarted:
+            task.state = BulkInsertState.ImportCompleted
+            task.row_count = self.rows_per_task
+        self.polled.add(task_id)
+        return task
+
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch):
+    fake_utility = FakeUtility()
+    monkeypatch.setattr(milvus_upload, "utility", fake_utility)
+    monkeypatch.setattr(MilvusUploader, "payload_fields", PAYLOAD_FIELDS)
+    monkeypatch.setattr(MilvusUploader, "bulk_insert_params", {"dir": str(tmp_path)})
+    monkeypatch.setattr(MilvusUploader, "s3", None)
+    monkeypatch.setattr(MilvusUploader, "batch_stats", {})
+    return fake_utility
+
+
+def test_payload_columns_follow_the_schema(uploader):
+    columns = MilvusUploader._payload_columns([{"price": 1.5}, {"color": "red"}])
+
+    assert [["---MILVUS DOES NOT ACCEPT EMPTY STRINGS---", "red"], [1.5, 0.0]] == (
+        columns
+    )
+    assert [] == MilvusUploader._payload_columns(None)
+
+
+def test_columns_are_written_as_npy_files(uploader, tmp_path):
+    names = MilvusUploader._write_columns(
+        str(tmp_path / "batch"),
+        [1, 2],
+        [[0.1, 0.2], [0.3, 0.4]],
+        [{"color": "red", "price": 2.0}, {"color": "blue"}],
+    )
+
+    assert ["id.npy", "vector.npy", "color.npy", "price.npy"] == names
+    ids = np.load(tmp_path / "batch" / "id.npy")
+    vectors = np.load(tmp_path / "batch" / "vector.npy")
+    colors = np.load(tmp_path / "batch" / "color.npy")
+    prices = np.load(tmp_path / "batch" / "price.npy")
+    assert np.int64 == ids.dtype and [1, 2] == ids.tolist()
+    assert np.float32 == vectors.dtype and (2, 2) == vectors.shape
+    assert ["red", "blue"] == colors.tolist()
+    assert np.float64 == prices.dtype and [2.0, 0.0] == prices.tolist()
+
+
+def test_batches_are_imported_and_awaited(uploader, tmp_path):
+    for start in [0, 2]:
+        MilvusUploader.upload_batch(
+            [start, start + 1], [[0.1, 0.2], [0.3, 0.4]], [{}, {}]
+        )
+
+    assert [
+        [
+            f"bulk-insert/{start}/{name}.npy"
+            for name in ["id", "vector", "color", "price"]
+        ]
+        for start in [0, 2]
+    ] == uploader.requests
+    assert (tmp_path / "bulk-insert" / "2" / "vector.npy").exists()
+    batch_stats = MilvusUploader.pop_batch_stats()
+    assert 2 == batch_stats["import_tasks"]
+    assert [1, 2] == batch_stats["import_task_ids"]
+
+    readiness = MilvusUploader.upload_barrier(4, batch_stats)
+    assert "import_task_ids" not in batch_stats
+    last = readiness["timeline"][-1]
+    assert 2 == last["completed_tasks"]
+    assert 4 == last["imported_rows"]
+    assert 1.0 == last["progress"]
+
+
+def test_failed_import_task_fails_the_barrier(uploader):
+    uploader.tasks[1] = FakeTask(
+        BulkInsertState.ImportFailed, failed_reason="bad vector.npy"
+    )
+    with pytest.raises(MilvusException, match="bad vector.npy"):
+        MilvusUploader._import_progress([1], 2)
+
+
+def test_failed_import_request_is_not_retried(uploader, monkeypatch):
+    monkeypatch.setattr(base_upload, "UPLOAD_RETRY_BASE_DELAY", 0.0)
+    uploader.fail_request = True
+    with pytest.raises(BulkInsertRequestError):
+        MilvusUploader._upload_batch(([0, 1], [[0.1, 0.2], [0.3, 0.4]], [{}, {}]))
+    assert 1 == len(uploader.requests)
+
+
+def test_failed_file_write_is_retried(uploader, monkeypatch):
+    monkeypatch.setattr(base_upload, "UPLOAD_RETRY_BASE_DELAY", 0.0)
+    write_columns = MilvusUploader._write_columns.__func__
+    failures = [OSError("disk full")]
+
+    def flaky_write_columns(cls, *args):
+        if failures:
+            raise failures.pop()
+        return write_columns(cls, *args)
+
+    monkeypatch.setattr(
+        MilvusUploader, "_write_columns", classmethod(flaky_write_columns)
+    )
+    _, _, size, retries, stats = MilvusUploader._upload_batch(
+        ([0, 1], [[0.1, 0.2], [0.3, 0.4]], [{}, {}])
+    )
+
+    assert 2 == size
+    assert 1 == retries
+    # The import is requested once, after the files are written
+    assert 1 == len(uploader.requests)
+    assert [1] == stats["import_task_ids"]
+
+
+def test_reinsert_is_rejected():
+    with pytest.raises(ValueError):
+        MixedWorkload(MilvusUploader(None, {}, {}), {"mode": "reinsert"})
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from opensearchpy import OpenSearch
+from opensearchpy.helpers import BulkIndexError
+
+import engine.base_client.bulk as bulk_module
+import engine.base_client.upload as upload_module
+from engine.clients.opensearch import upload
+from engine.clients.opensearch.upload import OpenSearchUploader
+
+
+class FakeBulk:
+    """
+    Rejects the given documents with the given statuses on their first try.
+    """
+
+    def __init__(self, rejections):
+        self.rejections = dict(rejections)
+        self.documents = {}
+        self.params = []
+
+    def __call__(self, body, index=None, params=None, **kwargs):
+        self.params.append(params)
+        lines = body.splitlines()
+        items = []
+        for header, source in zip(lines[::2], lines[1::2]):
+            doc_id = json.loads(header)["index"]["_id"]
+            status = self.rejections.pop(doc_id, 201)
+            if status == 201:
+                self.documents[doc_id] = json.loads(source)
+            items.append({"index": {"_id": str(doc_id), "status": status}})
+        return {"errors": True, "items": items}
+
+
+@pytest.fixture
+def uploader(monkeypatch):
+    monkeypatch.setattr(
+        upload,
+        "get_opensearch_client",
+        lambda host, connection_params: OpenSearch(f"http://{host}:9200"),
+    )
+    monkeypatch.setattr(bulk_module, "UPLOAD_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(upload_module, "UPLOAD_RETRY_BASE_DELAY", 0.0)
+    OpenSearchUploader.init_client(
+        "localhost", "cosine", {}, {"bulk": {"chunk_size": 2, "max_retries": 1}}
+    )
+    return OpenSearchUploader
+
+
+def test_rejected_documents_are_retried(uploader, monkeypatch):
+    bulk = FakeBulk({1: 429, 2: 503})
+    monkeypatch.setattr(OpenSearch, "bulk", bulk)
+
+    uploader.upload_batch([0, 1, 2], [[0.0], [1.0], [2.0]], [{"a": 0}, None, None])
+
+    assert {
+        0: {"vector": [0.0], "a": 0},
+        1: {"vector": [1.0]},
+        2: {"vector": [2.0]},
+    } == bulk.documents
+    # Two chunks, then a single chunk of the two rejected documents
+    assert 3 == len(bulk.params)
+    assert all(300 == params["timeout"] for params in bulk.params)
+    assert {"document_errors": 2, "document_retries": 2} == uploader.pop_batch_stats()
+
+
+def test_invalid_documents_are_not_retried(uploader, monkeypatch):
+    bulk = FakeBulk({1: 400})
+    monkeypatch.setattr(OpenSearch, "bulk", bulk)
+
+    # Not sent again by the base uploader either
+    with pytest.raises(BulkIndexError):
+        uploader._upload_batch(([0, 1], [[0.0], [1.0]], None))
+    assert 1 == len(bulk.params)
@@ -0,0 +1,72 @@
+import grpc
+import pytest
+from qdrant_client import QdrantClient
+
+from engine.clients.qdrant import configure, search, upload
+from engine.clients.qdrant.config import QDRANT_TRANSPORT_DEFAULTS, get_client_params
+from engine.clients.qdrant.configure import QdrantConfigurator
+from engine.clients.qdrant.search import QdrantSearcher
+from engine.clients.qdrant.upload import QdrantUploader
+
+
+def test_client_params_default_to_keep_alive():
+    client_params, transport = get_client_params({"timeout": 30})
+
+    assert 30 == client_params["timeout"]
+    assert client_params["prefer_grpc"]
+    assert 20 == client_params["limits"].max_keepalive_connections
+    assert "grpc_options" not in client_params
+    assert 20 == transport["max_keepalive_connections"]
+    assert "timeout" not in transport
+
+
+def test_client_params_override_transport():
+    client_params, transport = get_client_params(
+        {
+            "prefer_grpc": False,
+            "http2": True,
+            "max_keepalive_connections": 0,
+            "grpc_options": {"grpc.keepalive_time_ms": 10000},
+            "grpc_compression": "gzip",
+        }
+    )
+
+    assert not client_params["prefer_grpc"]
+    assert client_params["http2"]
+    assert 0 == client_params["limits"].max_keepalive_connections
+    assert {"grpc.keepalive_time_ms": 10000} == client_params["grpc_options"]
+    assert grpc.Compression.Gzip == client_params["grpc_compression"]
+    assert "gzip" == transport["grpc_compression"]
+
+
+@pytest.mark.parametrize(
+    "connection_params",
+    [
+        {},
+        {"prefer_grpc": False, "timeout": 30},
+        {"max_keepalive_connections": 0, "http2": True},
+    ],
+)
+def test_all_clients_accept_the_connection_params(monkeypatch, connection_params):
+    created = []
+
+    class RecordingClient(QdrantClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(kwargs)
+
+    for module in (configure, search, upload):
+        monkeypatch.setattr(module, "QdrantClient", RecordingClient)
+
+    QdrantConfigurator("localhost", {}, connection_params)
+    QdrantSearcher.init_client("localhost", "cosine", connection_params, {})
+    QdrantUploader.init_client("localhost", "cosine", connection_params, {})
+
+    assert 3 == len(created)
+    transport_only = set(QDRANT_TRANSPORT_DEFAULTS) - {"prefer_grpc", "http2"}
+    for kwargs in created:
+        assert not transport_only & set(kwargs)
+    searcher_grpc = connection_params.get("prefer_grpc", True)
+    assert [False, searcher_grpc, searcher_grpc] == [
+        kwargs["prefer_grpc"] for kwargs in created
+    ]
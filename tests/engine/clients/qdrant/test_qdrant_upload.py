@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from dataset_reader.base_reader import Record
+from engine.clients.qdrant import upload
+from engine.clients.qdrant.upload import QdrantUploader
+
+
+class FakeQdrantClient:
+    """
+    Applies the uploaded points with a delay of a few count requests, the
+    collection holds the points of an earlier upload.
+    """
+
+    instance = None
+    stored_before = 200
+
+    def __init__(self, **kwargs):
+        FakeQdrantClient.instance = self
+        self.uploaded = []
+        self.counts = 0
+
+    def upload_collection(self, collection_name, vectors, payload, ids, **kwargs):
+        self.kwargs = kwargs
+        self.uploaded.append((vectors, payload, ids))
+
+    def count(self, collection_name, exact):
+        self.counts += 1
+        points_count = sum(len(ids) for _, _, ids in self.uploaded)
+        if self.counts <= 3:
+            points_count = 0
+        return SimpleNamespace(count=self.stored_before + points_count)
+
+
+@pytest.fixture
+def uploader(monkeypatch):
+    monkeypatch.setattr(upload, "QdrantClient", FakeQdrantClient)
+    monkeypatch.setattr(QdrantUploader, "get_memory_usage", lambda cls: {})
+    return QdrantUploader(
+        "localhost",
+        {},
+        {
+            "batch_size": 40,
+            "upload_collection": {"batch_size": 8, "parallel": 2},
+        },
+    )
+
+
+def test_upload_collection_with_barrier(uploader):
+    records = [
+        Record(id=idx, vector=[float(idx), 1.0], metadata={"a": idx})
+        for idx in range(100)
+    ]
+    stats = uploader.upload("cosine", records, with_post_upload=False)
+
+    client = FakeQdrantClient.instance
+    assert [40, 40, 20] == [len(ids) for _, _, ids in client.uploaded]
+    vectors = client.uploaded[0][0]
+    assert isinstance(vectors, np.ndarray) and np.float32 == vectors.dtype
+    assert {"batch_size": 8, "parallel": 2, "wait": False} == client.kwargs
+    assert 200 == stats["pre_upload"]["points_count"]
+    assert 300 == stats["barrier"]["timeline"][-1]["points_count"]
+    assert 1.0 == stats["barrier"]["timeline"][-1]["progress"]
+    assert stats["barrier"]["polls"] >= 3
+
+
+def test_upload_collection_workers_in_the_pool_are_rejected(monkeypatch):
+    monkeypatch.setattr(upload, "QdrantClient", FakeQdrantClient)
+    with pytest.raises(ValueError):
+        QdrantUploader.init_client(
+            "localhost",
+            "cosine",
+            {},
+            {"parallel": 4, "upload_collection": {"parallel": 2}},
+        )
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from dataset_reader.base_reader import Query
+from engine.clients.redis import async_search
+from engine.clients.redis.async_search import RedisAsyncSearcher
+
+RESP2_REPLY = [2, b"1", [b"vector_score", b"0.1"], b"2", [b"vector_score", b"0.2"]]
+RESP3_REPLY = {
+    b"total_results": 2,
+    b"results": [
+        {b"id": b"1", b"extra_attributes": {b"vector_score": b"0.1"}},
+        {b"id": b"2", b"extra_attributes": {b"vector_score": b"0.2"}},
+    ],
+}
+
+
+class FakeAsyncRedis:
+    commands = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def execute_command(self, *args):
+        self.commands.append(args)
+        return RESP2_REPLY
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def searcher(monkeypatch):
+    monkeypatch.setattr(async_search, "AsyncRedis", FakeAsyncRedis)
+    FakeAsyncRedis.commands = []
+    searcher = RedisAsyncSearcher(
+        "localhost", {}, {"concurrency": 4, "search_params": {"ef": 64}}
+    )
+    searcher.init_client("localhost", "cosine", {}, searcher.search_params)
+    return searcher
+
+
+@pytest.mark.parametrize("reply", [RESP2_REPLY, RESP3_REPLY])
+def test_parse_reply(reply):
+    assert [(1, 0.1), (2, 0.2)] == RedisAsyncSearcher.parse_reply(reply)
+
+
+def test_prepare_query_serializes_vector(searcher):
+    prepared = searcher.prepare_query(
+        Query(vector=[0.5, 1.5], meta_conditions=None, expected_result=[1, 2]), None
+    )
+
+    assert 2 == prepared.top
+    assert ("FT.SEARCH", "idx") == prepared.args[:2]
+    params = prepared.args[prepared.args.index("PARAMS") :]
+    assert 6 == params[1]
+    assert np.array([0.5, 1.5], dtype=np.float32).tobytes() == params[3]
+    assert "EF" in params
+
+
+def test_search_all_runs_each_query_once(searcher):
+    queries = [
+        Query(vector=[float(i), 1.0], meta_conditions=None, expected_result=[1, 2])
+        for i in range(10)
+    ]
+    results = searcher.search_all("cosine", queries)
+
+    assert 10 == len(FakeAsyncRedis.commands)
+    assert 10 == len(results["latencies"])
+    assert 1.0 == results["mean_precisions"]
+
+
+def make_queries(n):
+    return [
+        Query(vector=[float(i), 1.0], meta_conditions=None, expected_result=[1, 2])
+        for i in range(n)
+    ]
+
+
+def test_search_all_in_batches(searcher):
+    searcher.search_params["batch_size"] = 4
+    results = searcher.search_all("cosine", make_queries(10))
+
+    assert 10 == len(FakeAsyncRedis.commands)
+    assert 4 == results["batch_size"]
+    assert 1.0 == results["mean_precisions"]
+    amortized = results["query_stats"]["amortized_time"]
+    assert amortized["max"] <= results["max_time"]
+
+
+def test_search_all_min_queries(searcher):
+    searcher.search_params["min_queries"] = 25
+    results = searcher.search_all("cosine", make_queries(10))
+
+    assert 25 == len(FakeAsyncRedis.commands)
+    assert 25 == len(results["latencies"])
+    # Precision of the repeated queries is not measured again
+    assert 10 == len(results["precisions"])
+
+
+def test_failed_queries_are_counted(searcher, monkeypatch):
+    class FailingRedis(FakeAsyncRedis):
+        async def execute_command(self, *args):
+            if len(self.commands) % 2 == 0:
+                self.commands.append(args)
+                raise ConnectionError("reset")
+            return await super().execute_command(*args)
+
+    monkeypatch.setattr(async_search, "AsyncRedis", FailingRedis)
+    monkeypatch.setattr(RedisAsyncSearcher, "SEARCH_ERRORS", (ConnectionError,))
+    results = searcher.search_all("cosine", make_queries(10))
+
+    assert 5 == results["errors"]
+    assert 0.5 == results["error_rate"]
+    assert 5 == len(results["latencies"])
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from dataset_reader.base_reader import Query
+from engine.clients.redis.search import RedisSearcher
+
+
+class FakeIndex:
+    def __init__(self, hits):
+        self.hits = hits
+
+    def search(self, query, query_params):
+        docs = [
+            SimpleNamespace(id=str(idx), vector_score=str(score))
+            for idx, score in self.hits[: query_params["K"]]
+        ]
+        return SimpleNamespace(docs=docs)
+
+
+def test_scatter_search_merges_shards():
+    RedisSearcher.search_params = {"search_params": {"ef": 10}}
+    RedisSearcher.algorithm = "HNSW"
+    RedisSearcher.knn_conditions = "EF_RUNTIME $EF"
+    RedisSearcher.np_data_type = np.float32
+    RedisSearcher._scatter = True
+    RedisSearcher._fts = [
+        FakeIndex([(1, 0.1), (4, 0.4), (6, 0.6)]),
+        FakeIndex([(2, 0.2), (3, 0.3), (7, 0.7)]),
+        FakeIndex([]),
+    ]
+    RedisSearcher.executor = ThreadPoolExecutor(max_workers=3)
+    try:
+        assert [(1, 0.1), (2, 0.2), (3, 0.3)] == RedisSearcher.search_one(
+            [0.0, 1.0], None, 3
+        )
+        precision, _, _, query_stats = RedisSearcher._search_one(
+            Query(
+                vector=[0.0, 1.0],
+                meta_conditions=None,
+                expected_result=[1, 2, 3, 4],
+            )
+        )
+    finally:
+        RedisSearcher.delete_client()
+
+    assert 1.0 == precision
+    assert {"fanout_time", "slowest_shard_time", "merge_time"} == set(query_stats)
+    assert RedisSearcher.pop_query_stats() is None
@@ -0,0 +1,143 @@
+import contextlib
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from monitoring import resource_sampler
+from monitoring.resource_sampler import (
+    ContainerTarget,
+    ProcessTarget,
+    ResourceSampler,
+)
+
+
+class FakeInspect:
+    def __init__(self, stdout=None):
+        self.stdout = stdout
+        self.calls = 0
+
+    def __call__(self, args, **kwargs):
+        self.calls += 1
+        if self.stdout is None:
+            raise subprocess.CalledProcessError(1, args)
+        return subprocess.CompletedProcess(args, 0, stdout=self.stdout)
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    monkeypatch.setattr(resource_sampler, "CGROUP_ROOT", tmp_path)
+    monkeypatch.setattr(
+        resource_sampler, "_read_net_dev", lambda pid: {"rx_bytes": 1, "tx_bytes": 2}
+    )
+    path = tmp_path / "system.slice" / "docker-abc.scope"
+    path.mkdir(parents=True)
+    (path / "cpu.stat").write_text("usage_usec 2500000\nuser_usec 2000000\n")
+    (path / "memory.current").write_text("1024\n")
+    (path / "io.stat").write_text(
+        "8:0 rbytes=10 wbytes=20 rios=1 wios=2\n8:16 rbytes=5 wbytes=5\n"
+    )
+    return path
+
+
+def test_container_is_looked_up_on_read(cgroup, monkeypatch):
+    inspect = FakeInspect("abc 42\n")
+    monkeypatch.setattr(subprocess, "run", inspect)
+    target = ContainerTarget("engine")
+    assert 0 == inspect.calls
+
+    counters = target.read()
+    target.read()
+    assert 1 == inspect.calls
+    assert 42 == target.pid
+    assert {
+        "read_bytes": 15,
+        "write_bytes": 25,
+        "cpu_seconds": 2.5,
+        "rss_bytes": 1024,
+        "rx_bytes": 1,
+        "tx_bytes": 2,
+    } == counters
+
+
+def test_missing_container_is_looked_up_again(cgroup, monkeypatch):
+    inspect = FakeInspect()
+    monkeypatch.setattr(subprocess, "run", inspect)
+    target = ContainerTarget("engine")
+    assert target.read() is None
+
+    inspect.stdout = "abc 42\n"
+    assert target.read() is not None
+    assert 2 == inspect.calls
+
+
+class FakeTarget:
+    name = "engine"
+
+    def __init__(self):
+        self.cpu_seconds = 0.0
+
+    def read(self):
+        self.cpu_seconds += 0.01
+        return {
+            "cpu_seconds": self.cpu_seconds,
+            "rss_bytes": 100,
+            "read_bytes": 0,
+            "write_bytes": 0,
+            "rx_bytes": 0,
+            "tx_bytes": 0,
+        }
+
+
+class FakeProcess:
+    def __init__(self, pid, cpu_seconds, written_bytes):
+        self.pid = pid
+        self.cpu_seconds = cpu_seconds
+        self.written_bytes = written_bytes
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def create_time(self):
+        return 1.0
+
+    def cpu_times(self):
+        return SimpleNamespace(user=self.cpu_seconds, system=0.0)
+
+    def io_counters(self):
+        return SimpleNamespace(read_bytes=0, write_bytes=self.written_bytes)
+
+    def memory_info(self):
+        return SimpleNamespace(rss=1024)
+
+
+def test_exited_children_are_still_counted():
+    target = ProcessTarget("redis-server")
+    parent, child = FakeProcess(1, 2.0, 10), FakeProcess(2, 3.0, 20)
+    target._processes = lambda: [parent, child]
+    first = target.read()
+    parent.cpu_seconds, parent.written_bytes = 2.5, 15
+    target._processes = lambda: [parent]
+    second = target.read()
+
+    assert 5.0 == first["cpu_seconds"]
+    assert 5.5 == second["cpu_seconds"]
+    assert 35 == second["write_bytes"]
+    assert 1024 == second["rss_bytes"]
+
+
+def test_samples_are_summarized_per_phase():
+    sampler = ResourceSampler(interval=0.01)
+    sampler.targets = [FakeTarget()]
+    sampler.set_phase("upload")
+    sampler.start()
+    while len(sampler.get_samples()) < 3:
+        pass
+    sampler.set_phase(None)
+    sampler.stop()
+
+    summary = sampler.summary()
+    assert ["upload"] == list(summary)
+    usage = summary["upload"]["engine"]
+    assert 100 == usage["rss_bytes"]["peak"]
+    assert usage["cpu_percent"]["mean"] > 0
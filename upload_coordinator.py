@@ -0,0 +1,246 @@
+import json
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import typer
+
+from benchmark.config_read import read_dataset_config, read_engine_configs
+from benchmark.dataset import Dataset
+from engine.base_client.client import DETAILED_RESULTS
+from engine.base_client.resources import RESOURCE_MONITOR
+from engine.base_client.sharding import (
+    DEFAULT_SHARD_TIMEOUT,
+    RemoteSlot,
+    run_shards,
+    split_shards,
+)
+from engine.clients.client_factory import ClientFactory
+
+app = typer.Typer()
+
+
+def upload_shard(
+    engine: str, dataset: str, host: str, start: int, end: int, resume: bool
+) -> dict:
+    """
+    Uploads the records [start, end) of the dataset into an already configured
+    collection. Post upload is left to the coordinator.
+    """
+    engine_config = read_engine_configs()[engine]
+    client = ClientFactory(host).build_client(engine_config)
+    shard_dataset = Dataset(read_dataset_config()[dataset], False, True, start, end)
+    shard_dataset.download(background=False)
+    execution_params = client.configurator.execution_params(
+        distance=shard_dataset.config.distance,
+        vector_size=shard_dataset.config.vector_size,
+    )
+    reader = shard_dataset.get_reader(execution_params.get("normalize", False))
+
+    checkpoint = client.upload_checkpoint(dataset, start, end)
+    resumed_after = checkpoint.last_id if resume and checkpoint.load() else None
+    if resumed_after is not None and checkpoint.completed:
+        print(f"Shard [{start}:{end}] already uploaded")
+        return {"uploaded_vectors": 0, "upload_time": 0.0, "timeline": []}
+
+    records = reader.read_data(start, end)
+    if resumed_after is not None:
+        records = (record for record in records if record.id > resumed_after)
+    started_at = time.time()
+    stats = client.uploader.upload(
+        distance=shard_dataset.config.distance,
+        records=records,
+        checkpoint=checkpoint,
+        with_post_upload=False,
+    )
+    if not DETAILED_RESULTS:
+        stats.pop("latencies", None)
+    stats.pop("post_upload", None)
+    stats["started_at"] = started_at
+    stats["uploaded_vectors"] = sum(bucket["vectors"] for bucket in stats["timeline"])
+    return stats
+
+
+class LocalSlot:
+    """
+    Runs the shards in a process of the local pool.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor, index: int):
+        self.executor = executor
+        self.name = f"local-{index}"
+
+    def run(self, *args) -> dict:
+        return self.executor.submit(upload_shard, *args).result()
+
+
+@app.command()
+def coordinate(
+    engine: str = typer.Option(...),
+    dataset: str = typer.Option(...),
+    host: str = "localhost",
+    upload_start_idx: int = 0,
+    upload_end_idx: int = typer.Option(...),
+    shard_size: int = 1_000_000,
+    local_workers: int = 4,
+    worker_urls: List[str] = typer.Option([]),
+    slots_per_worker: int = 1,
+    shard_timeout: float = DEFAULT_SHARD_TIMEOUT,
+    skip_configure: bool = False,
+    resume: bool = False,
+):
+    """
+    Uploads a range of a dataset in shards, executed by a local process pool
+    and/or remote workers, and saves a single upload result.
+
+    Example:
+        python3 upload_coordinator.py coordinate --engine redis-m-16-ef-64 \\
+            --dataset laion-img-emb-768d-1Billion-cosine --upload-end-idx 1000000000 \\
+            --shard-size 1000000 --local-workers 16
+    """
+    if upload_end_idx <= upload_start_idx:
+        raise typer.BadParameter("--upload-end-idx has to be greater than the start")
+
+    engine_config = read_engine_configs()[engine]
+    dataset_config = read_dataset_config()[dataset]
+    client = ClientFactory(host).build_client(engine_config)
+    full_dataset = Dataset(
+        dataset_config, False, True, upload_start_idx, upload_end_idx
+    )
+    full_dataset.download(background=False)
+
+    if RESOURCE_MONITOR.enabled:
+        RESOURCE_MONITOR.start()
+    if not (skip_configure or resume):
+        print("Experiment stage: Configure")
+        RESOURCE_MONITOR.set_phase("configure")
+        client.configurator.configure(full_dataset)
+
+    shards = split_shards(upload_start_idx, upload_end_idx, shard_size)
+    ctx = multiprocessing.get_context(client.uploader.get_mp_start_method())
+    executor = ProcessPoolExecutor(max_workers=max(local_workers, 1), mp_context=ctx)
+    slots = [LocalSlot(executor, i) for i in range(local_workers)]
+    slots += [
+        RemoteSlot(url, i, shard_timeout)
+        for url in worker_urls
+        for i in range(slots_per_worker)
+    ]
+    if len(slots) == 0:
+        raise typer.BadParameter("No local or remote workers to run the shards")
+    print(
+        f"Experiment stage: Upload. {len(shards)} shards of {shard_size} vectors "
+        f"on {len(slots)} workers"
+    )
+
+    RESOURCE_MONITOR.set_phase("upload")
+    start = time.perf_counter()
+    started_at = time.time()
+    try:
+        shard_results, stats = run_shards(
+            slots,
+            shards,
+            (engine, dataset, host),
+            resume,
+            speculative=client.uploader.OVERWRITES_BY_ID,
+        )
+    finally:
+        executor.shutdown()
+    upload_time = stats.pop("upload_finished") - start
+
+    print("Experiment stage: Post upload")
+    RESOURCE_MONITOR.set_phase("post_upload")
+    uploader = client.uploader
+    uploader.init_client(
+        host,
+        full_dataset.config.distance,
+        uploader.connection_params,
+        uploader.upload_params,
+    )
+    post_upload_stats = uploader.post_upload(full_dataset.config.distance)
+    total_time = uploader.index_ready_at(post_upload_stats) - start
+    memory_usage = uploader.get_memory_usage()
+    uploader.delete_client()
+    print(f"Upload time: {upload_time}, total import time: {total_time}")
+
+    shards_stats = []
+    for shard in shards:
+        shard_stats = shard_results[shard]
+        # Shift the shard timeline to the start of the whole upload
+        shard_stats["offset"] = shard_stats.pop("started_at", started_at) - started_at
+        shards_stats.append(shard_stats)
+    uploaded_vectors = sum(shard["uploaded_vectors"] for shard in shards_stats)
+
+    client.save_upload_results(
+        dataset,
+        {
+            "post_upload": post_upload_stats,
+            "upload_time": upload_time,
+            "total_time": total_time,
+            "uploaded_vectors": uploaded_vectors,
+            "vectors_per_second": uploaded_vectors / upload_time,
+            "memory_usage": memory_usage,
+            "shards": shards_stats,
+            **stats,
+        },
+        upload_params={
+            **uploader.upload_params,
+            **client.configurator.collection_params,
+            "shard_size": shard_size,
+            "workers": [slot.name for slot in slots],
+        },
+        upload_start_idx=upload_start_idx,
+        upload_end_idx=upload_end_idx,
+    )
+    if RESOURCE_MONITOR.enabled:
+        client.save_resource_usage(dataset, RESOURCE_MONITOR.stop())
+
+
+class ShardRequestHandler(BaseHTTPRequestHandler):
+    """
+    Runs the shards requested by the coordinator with a POST to /upload and
+    responds with the upload stats once the shard is done.
+    """
+
+    executor: ProcessPoolExecutor = None
+
+    def do_POST(self):
+        if self.path != "/upload":
+            self.send_response(404)
+            self.end_headers()
+            return
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        try:
+            result = self.executor.submit(
+                upload_shard,
+                request["engine"],
+                request["dataset"],
+                request["host"],
+                request["start"],
+                request["end"],
+                request.get("resume", False),
+            ).result()
+        except Exception as e:
+            traceback.print_exc()
+            result = {"error": repr(e)}
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(result).encode())
+
+
+@app.command()
+def serve(port: int = 8002, slots: int = 1):
+    """
+    Starts a remote worker, which runs up to `slots` shards at the same time.
+    """
+    ShardRequestHandler.executor = ProcessPoolExecutor(max_workers=slots)
+    httpd = ThreadingHTTPServer(("", port), ShardRequestHandler)
+    print(f"Upload worker running on port {port} with {slots} slots...")
+    httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    app()